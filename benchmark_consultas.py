@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de consultas a la base de datos por petición autenticada.
+
+Cuenta las consultas SQL de las vistas más usadas (búsqueda, resultados,
+sugerencias, PDF y vista previa) con dos configuraciones:
+
+- ``anterior``: sesiones en la base de datos y ModelBackend
+- ``actual``: la de settings.py (sesiones ``cached_db`` y usuario en la
+  caché de archivos que comparten los workers)
+
+Muestra las consultas de la primera petición de una sesión que todavía no
+está en la caché y el promedio por petición de cada vista.
+Usa una base de datos de prueba en memoria y el backend 'fake' de Google
+Sheets.
+
+Uso:
+    python benchmark_consultas.py [--peticiones 20]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+# Agregar el directorio de Django al path
+sys.path.insert(0, 'formularios')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
+os.environ.setdefault('SHEETS_BACKEND', 'fake')
+os.environ.setdefault('SHEETS_FAKE_LATENCIA_MS', '0')
+# Caché de sesiones aparte: el benchmark la vacía
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='benchmark-consultas-')
+
+# Configurar Django
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from formatos_eps import auditoria, google_sheets
+
+USUARIO = 'benchmark'
+CLAVE = 'benchmark-consultas'
+
+CONFIGURACIONES = {
+    'anterior': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    },
+    'actual': {},
+}
+
+
+def _vistas(cedula):
+    return {
+        'busqueda': '/formatos/search/',
+        'resultados': f'/formatos/search/results/?cedula={cedula}',
+        'sugerencias': f'/formatos/search/sugerencias/?q={cedula[:4]}',
+        'pdf': f'/formatos/generar-pdf/{cedula}/',
+        'vista_previa': f'/formatos/generar-pdf/{cedula}/preview/',
+    }
+
+
+def _contar(cliente, url):
+    with CaptureQueriesContext(connection) as consultas:
+        respuesta = cliente.get(url)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{url}: HTTP {respuesta.status_code}")
+    return len(consultas)
+
+
+def medir(configuracion, peticiones, cedula):
+    """
+    Consultas SQL por petición con la configuración dada.
+
+    Returns:
+        tuple: (consultas de la primera petición, {vista: promedio por petición})
+    """
+    with override_settings(**CONFIGURACIONES[configuracion]):
+        cache.clear()
+        cliente = Client()
+        if not cliente.login(username=USUARIO, password=CLAVE):
+            raise RuntimeError("No se pudo iniciar sesión")
+        # La sesión recién creada queda en la caché; se vacía para medir la
+        # primera petición con la caché fría (p. ej. tras un despliegue)
+        cache.clear()
+        vistas = _vistas(cedula)
+        primera = _contar(cliente, vistas['busqueda'])
+
+        promedios = {}
+        for vista, url in vistas.items():
+            conteos = [_contar(cliente, url) for _ in range(peticiones)]
+            promedios[vista] = sum(conteos) / len(conteos)
+    return primera, promedios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas SQL por petición autenticada")
+    parser.add_argument('--peticiones', type=int, default=20, help="Peticiones por vista")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK DE CONSULTAS A LA BASE DE DATOS POR PETICIÓN")
+    print("=" * 70)
+
+    setup_test_environment()
+    nombre_original = connection.creation.create_test_db(verbosity=0)
+    try:
+        User.objects.create_user(USUARIO, password=CLAVE)
+        snapshot = google_sheets.get_snapshot()
+        cedula = next(iter(snapshot['indice']))
+
+        tablas = {nombre: medir(nombre, args.peticiones, cedula) for nombre in CONFIGURACIONES}
+    finally:
+        # Los registros de auditoría de las descargas van a la base de prueba
+        auditoria.vaciar()
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        shutil.rmtree(os.environ['CACHE_DIR'], ignore_errors=True)
+
+    print(f"\nConsultas SQL por petición ({args.peticiones} peticiones por vista)\n")
+    print(f"{'':<22}" + ''.join(f"{nombre:>12}" for nombre in tablas))
+    print("-" * 70)
+    print(f"{'primera (caché fría)':<22}" + ''.join(f"{primera:>12}" for primera, _ in tablas.values()))
+    for vista in _vistas(cedula):
+        print(f"{vista:<22}" + ''.join(f"{promedios[vista]:>12.1f}" for _, promedios in tablas.values()))
+    print("\n" + "=" * 70)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark del tiempo de arranque (importaciones) de Django y de la app.
+
+Ejecuta en subprocesos limpios, con ``python -X importtime``:
+
+- ``setup``: lo que hacen los scripts (``django.setup()``)
+- ``urls``: lo que hace un worker al cargar el URLconf (importa views.py)
+
+y reporta el tiempo total de importación, los módulos más costosos y si se
+cargaron las dependencias pesadas (gspread, google-auth, PyMuPDF).
+
+Uso:
+    python benchmark_importtime.py [--repeticiones 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ESCENARIOS = {
+    'setup': "import django; django.setup()",
+    'urls': "import django; django.setup(); import formularios.urls",
+}
+
+MODULOS_PESADOS = ['gspread', 'google.oauth2.service_account', 'fitz', 'pymupdf']
+
+
+def medir(codigo):
+    """
+    Ejecuta el código con -X importtime y parsea la salida.
+
+    Returns:
+        dict: {modulo: (propio_us, acumulado_us)}
+    """
+    entorno = dict(os.environ, DJANGO_SETTINGS_MODULE='formularios.settings')
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd='formularios',
+        env=entorno,
+        capture_output=True,
+        text=True,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr[-2000:])
+
+    modulos = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulos[nombre.strip()] = (int(propio), int(acumulado))
+    return modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tiempo de importación")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK DE TIEMPO DE IMPORTACIÓN")
+    print("=" * 70)
+
+    for escenario, codigo in ESCENARIOS.items():
+        totales = []
+        modulos = {}
+        for _ in range(args.repeticiones):
+            modulos = medir(codigo)
+            totales.append(sum(propio for propio, _ in modulos.values()) / 1000)
+
+        print(f"\n{escenario.upper()}: {codigo}")
+        print("-" * 70)
+        print(f"   Tiempo total de importación: mediana {statistics.median(totales):.1f} ms "
+              f"(min {min(totales):.1f}, max {max(totales):.1f}) - {len(modulos)} módulos")
+
+        cargados = [m for m in MODULOS_PESADOS if m in modulos]
+        print(f"   Dependencias pesadas cargadas: {', '.join(cargados) if cargados else 'ninguna'}")
+
+        print(f"\n   Top {args.top} por tiempo acumulado:")
+        raices = sorted(modulos.items(), key=lambda item: item[1][1], reverse=True)
+        for nombre, (_, acumulado) in raices[:args.top]:
+            print(f"   {acumulado / 1000:8.1f} ms  {nombre}")
+
+    print("\n" + "=" * 70)
+
+
+if __name__ == '__main__':
+    main()
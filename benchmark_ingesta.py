@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de ingesta de hojas grandes: completa vs streaming.
+
+Genera una hoja CSV ancha (las columnas del formulario, un encabezado
+duplicado y columnas de relleno, como las hojas reales), la sirve con un
+servidor HTTP local en lugar de la exportación CSV de Google y compara:
+
+- ``completa``: descarga entera, todas las filas en una lista y
+  normalizar_hoja (lo que hace SHEETS_INGESTA='completa')
+- ``streaming``: filas_csv_http + ingesta.ingerir_hoja
+  (SHEETS_INGESTA='streaming')
+
+Para cada tamaño reporta el tiempo, el pico de memoria (tracemalloc) y la
+memoria retenida por los registros resultantes.
+
+Uso:
+    python benchmark_ingesta.py [--filas 50000 100000 200000] [--columnas 40]
+"""
+import argparse
+import csv
+import gc
+import io
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar el directorio de Django al path
+sys.path.insert(0, 'formularios')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
+
+# Configurar Django
+import django
+django.setup()
+
+import requests
+
+from formatos_eps.ingesta import ingerir_hoja
+from formatos_eps.normalizacion import normalizar_hoja
+from formatos_eps.schema import CAMPOS_FORMULARIO
+from formatos_eps.sheets_backends import filas_csv_http
+
+HOJA = 'Planta'
+
+
+def generar_csv(filas, columnas):
+    """
+    CSV de prueba con ``filas`` registros y ``columnas`` columnas en total.
+
+    Returns:
+        bytes: Contenido en UTF-8
+    """
+    rnd = random.Random(filas)
+    encabezados = list(CAMPOS_FORMULARIO.values())
+    # Encabezado repetido (se renombra a '..._1') y columnas que no se usan
+    encabezados.append('CIUDAD DE NACIMIENTO')
+    encabezados += [f'COLUMNA {i}' for i in range(max(columnas - len(encabezados), 0))]
+
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(encabezados)
+    for i in range(filas):
+        fila = [
+            str(10000000 + i), 'GARCIA', 'LOPEZ', rnd.choice(['MARIA JOSE', 'JUAN', 'ANA LUCIA']),
+            f'19{rnd.randint(50, 99)}0{rnd.randint(1, 9)}1{rnd.randint(0, 9)}', 'COLOMBIA',
+            rnd.choice(['M', 'F']), 'VALLE DEL CAUCA', 'CALI', 'PALMIRA',
+        ]
+        fila += [f'dato {i}-{j}' for j in range(len(encabezados) - len(fila))]
+        escritor.writerow(fila)
+    return salida.getvalue().encode('utf-8')
+
+
+def servir(contenido):
+    """
+    Servidor HTTP local que responde ``contenido`` como CSV.
+
+    Returns:
+        tuple: (servidor, url)
+    """
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(contenido)))
+            self.end_headers()
+            vista = memoryview(contenido)
+            for inicio in range(0, len(vista), 64 * 1024):
+                self.wfile.write(vista[inicio:inicio + 64 * 1024])
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}/{HOJA}.csv'
+
+
+def ingesta_completa(url):
+    respuesta = requests.get(url, timeout=60)
+    respuesta.encoding = 'utf-8-sig'
+    filas = list(csv.reader(io.StringIO(respuesta.text, newline='')))
+    return normalizar_hoja(filas)
+
+
+def ingesta_streaming(url):
+    return ingerir_hoja(filas_csv_http(url), HOJA)
+
+
+def medir(funcion, url):
+    """
+    Returns:
+        tuple: (registros, segundos, pico en bytes, retenido en bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    registros = funcion(url)
+    duracion = time.perf_counter() - inicio
+    gc.collect()
+    retenido, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return registros, duracion, pico, retenido
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta: completa vs streaming")
+    parser.add_argument('--filas', type=int, nargs='+', default=[50000, 100000, 200000])
+    parser.add_argument('--columnas', type=int, default=40, help="Columnas totales de la hoja")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BENCHMARK DE INGESTA DE HOJAS: COMPLETA VS STREAMING")
+    print("=" * 70)
+
+    mb = 1024 * 1024
+    print(f"\n   {'FILAS':>8} {'CSV':>9} {'MODO':<10} {'TIEMPO':>8} {'PICO':>10} "
+          f"{'RETENIDO':>10} {'PICO/RET.':>9}")
+    print("   " + "-" * 70)
+    for filas in args.filas:
+        contenido = generar_csv(filas, args.columnas)
+        servidor, url = servir(contenido)
+        try:
+            referencia = None
+            for modo, funcion in (('completa', ingesta_completa), ('streaming', ingesta_streaming)):
+                registros, duracion, pico, retenido = medir(funcion, url)
+                if referencia is None:
+                    referencia = registros
+                elif registros != referencia:
+                    print(f"   [ERROR] Los registros de '{modo}' no coinciden con 'completa'")
+                    sys.exit(1)
+                print(f"   {filas:>8} {len(contenido) / mb:>6.1f} MB {modo:<10} {duracion:>6.2f} s "
+                      f"{pico / mb:>7.1f} MB {retenido / mb:>7.1f} MB {pico / max(retenido, 1):>8.1f}x")
+                del registros
+            del referencia
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+        del contenido
+
+    print("\n   Los registros de ambos modos son idénticos en todos los tamaños.")
+    print("\n" + "=" * 70)
+
+
+if __name__ == '__main__':
+    main()
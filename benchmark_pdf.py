@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de generación de PDFs: dibujo encima de la página vs widgets.
+
+El template publicado no trae campos de formulario, así que el script crea
+una copia con un widget por campo del layout (en la misma caja que usa el
+dibujo), más la fecha en un solo widget y una casilla por código de sexo.
+Sobre esa copia compara:
+
+- ``overlay``: los campos se dibujan encima de la página (modo actual)
+- ``widgets``: los campos se llenan por nombre
+- ``widgets+aplanar``: widgets convertidos en contenido de la página
+
+y reporta el tiempo de render (mediana, p95) y el tamaño de la salida.
+
+Con ``--salida`` compara además los modos de serialización (PDF_SALIDA) y
+estima el tiempo hasta ver la primera página en un enlace lento: descarga
+completa + dibujo de la página, frente a lo que tardaría un PDF linealizado
+ideal (descargar solo los objetos que usa la primera página).
+
+Uso:
+    python benchmark_pdf.py [--repeticiones 30] [--guardar DIRECTORIO]
+    python benchmark_pdf.py --salida [--kbps 1000]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+# Agregar el directorio de Django al path
+sys.path.insert(0, 'formularios')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
+
+# Configurar Django
+import django
+django.setup()
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from formatos_eps.calibracion import DATOS_MUESTRA
+from formatos_eps.pdf_generator import (
+    OPCIONES_SALIDA, PREFIJO_WIDGET_SEXO, TAMANO_FUENTE_DEFECTO, WIDGET_FECHA, cargar_plantilla,
+    detectar_widgets, generar_pdf_bytes, obtener_layout, plantilla_salida,
+)
+
+_REFERENCIA_RE = re.compile(r'(\d+) 0 R')
+
+
+def plantilla_con_widgets(plantilla, layout):
+    """
+    Copia del template con un widget por campo del layout.
+
+    Returns:
+        bytes: PDF con los widgets
+    """
+    doc = fitz.open(stream=plantilla, filetype='pdf')
+    page = doc[0]
+
+    def agregar(nombre, rect, tipo=fitz.PDF_WIDGET_TYPE_TEXT, fontsize=TAMANO_FUENTE_DEFECTO):
+        widget = fitz.Widget()
+        widget.field_name = nombre
+        widget.field_type = tipo
+        widget.rect = fitz.Rect(rect)
+        widget.text_font = 'Helv'
+        widget.text_fontsize = fontsize
+        widget.border_width = 0
+        page.add_widget(widget)
+
+    for campo, coords in layout['campos'].items():
+        fontsize = coords.get('fontsize', TAMANO_FUENTE_DEFECTO)
+        agregar(campo, (
+            coords['x'] - 2, coords['y'] - fontsize,
+            coords['x'] + coords['ancho'] + 2, coords['y'] + 0.3 * fontsize,
+        ), fontsize=fontsize)
+
+    fecha = layout['fecha_nacimiento']
+    agregar(WIDGET_FECHA, (fecha[0]['x'] - 2, fecha[0]['y'] - 10, fecha[-1]['x'] + 10, fecha[0]['y'] + 3))
+
+    for codigo, coords in layout['sexo'].items():
+        agregar(PREFIJO_WIDGET_SEXO + codigo, (
+            coords['x'] - 4, coords['y'] - 4, coords['x'] + 4, coords['y'] + 4,
+        ), tipo=fitz.PDF_WIDGET_TYPE_CHECKBOX)
+
+    contenido = doc.tobytes(garbage=1, deflate=True)
+    doc.close()
+    return contenido
+
+
+def medir(repeticiones, **kwargs):
+    """
+    Genera el PDF de muestra varias veces.
+
+    Returns:
+        tuple: (tiempos en ms, último PDF)
+    """
+    # La primera generación carga fuentes y detecta widgets: no se cuenta
+    contenido = generar_pdf_bytes(DATOS_MUESTRA, **kwargs)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        contenido = generar_pdf_bytes(DATOS_MUESTRA, **kwargs)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos, contenido
+
+
+def bytes_primera_pagina(contenido):
+    """
+    Bytes de los objetos que se necesitan para dibujar la primera página
+    (la página y todo lo que referencia, recursivamente).
+
+    Es lo mínimo que un PDF linealizado obligaría a descargar antes de
+    mostrarla.
+    """
+    doc = fitz.open(stream=contenido, filetype='pdf')
+    pendientes = [doc[0].xref]
+    vistos = set()
+    total = 0
+    while pendientes:
+        xref = pendientes.pop()
+        if xref in vistos or xref <= 0 or xref >= doc.xref_length():
+            continue
+        vistos.add(xref)
+        objeto = doc.xref_object(xref, compressed=True)
+        total += len(objeto)
+        if doc.xref_is_stream(xref):
+            total += len(doc.xref_stream_raw(xref))
+        # /Parent lleva al árbol de páginas, no es necesario para dibujar
+        objeto = re.sub(r'/Parent \d+ 0 R', '', objeto)
+        pendientes.extend(int(ref) for ref in _REFERENCIA_RE.findall(objeto))
+    doc.close()
+    return total
+
+
+def tiempo_dibujo(contenido):
+    """Milisegundos para abrir el PDF y dibujar la primera página a 96 dpi."""
+    inicio = time.perf_counter()
+    doc = fitz.open(stream=contenido, filetype='pdf')
+    doc[0].get_pixmap(dpi=96)
+    doc.close()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def comparar_salidas(repeticiones, kbps):
+    """Compara los modos de PDF_SALIDA: tamaño, generación y primera página."""
+    print(f"\n   Enlace simulado: {kbps} kbps\n")
+    print(f"   {'SALIDA':<10} {'TAMAÑO':>10} {'GENERAR':>10} {'PÁG. 1':>8} "
+          f"{'PRIMERA VISTA':>14} {'LINEAL IDEAL':>13}")
+    print("   " + "-" * 70)
+
+    modo_original = settings.PDF_SALIDA
+    try:
+        for modo in OPCIONES_SALIDA:
+            settings.PDF_SALIDA = modo
+            plantilla_salida()
+            tiempos, contenido = medir(repeticiones)
+
+            total = len(contenido)
+            pagina = bytes_primera_pagina(contenido)
+            dibujo = tiempo_dibujo(contenido)
+            # Descarga completa (lo que pasa hoy) vs solo la página 1
+            completa = total * 8 / kbps + dibujo
+            lineal = pagina * 8 / kbps + dibujo
+            print(f"   {modo:<10} {total / 1024:>7.1f} KB {statistics.median(tiempos):>7.1f} ms "
+                  f"{pagina / total:>7.0%} {completa / 1000:>12.2f} s {lineal / 1000:>11.2f} s")
+    finally:
+        settings.PDF_SALIDA = modo_original
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de PDFs: overlay vs widgets")
+    parser.add_argument('--repeticiones', type=int, default=30)
+    parser.add_argument('--guardar', metavar='DIRECTORIO', help="Guardar el PDF de cada modo")
+    parser.add_argument('--salida', action='store_true', help="Comparar los modos de PDF_SALIDA")
+    parser.add_argument('--kbps', type=int, default=1000, help="Velocidad del enlace simulado")
+    args = parser.parse_args()
+
+    if args.salida:
+        print("=" * 70)
+        print("BENCHMARK DE SERIALIZACIÓN DEL PDF (PDF_SALIDA)")
+        print("=" * 70)
+        comparar_salidas(args.repeticiones, args.kbps)
+        print("\n" + "=" * 70)
+        return
+
+    print("=" * 70)
+    print("BENCHMARK DE GENERACIÓN DE PDF: OVERLAY VS WIDGETS")
+    print("=" * 70)
+
+    layout = obtener_layout()
+    original = cargar_plantilla()
+    print(f"\nTemplate publicado: {len(original) // 1024} KB, "
+          f"{len(detectar_widgets(original))} widgets")
+
+    plantilla = plantilla_con_widgets(original, layout)
+    print(f"Template de prueba: {len(plantilla) // 1024} KB, "
+          f"{len(detectar_widgets(plantilla))} widgets")
+
+    modos = {
+        'overlay': {'widgets': False},
+        'widgets': {'widgets': True, 'aplanar': False},
+        'widgets+aplanar': {'widgets': True, 'aplanar': True},
+    }
+
+    print(f"\n   {'MODO':<18} {'MEDIANA':>10} {'P95':>10} {'TAMAÑO':>12}")
+    print("   " + "-" * 52)
+    for modo, opciones in modos.items():
+        tiempos, contenido = medir(args.repeticiones, plantilla=plantilla, **opciones)
+        p95 = statistics.quantiles(tiempos, n=20)[-1] if len(tiempos) > 1 else tiempos[0]
+        print(f"   {modo:<18} {statistics.median(tiempos):>7.1f} ms {p95:>7.1f} ms "
+              f"{len(contenido) / 1024:>9.1f} KB")
+
+        if args.guardar:
+            os.makedirs(args.guardar, exist_ok=True)
+            with open(os.path.join(args.guardar, f"benchmark_{modo.replace('+', '_')}.pdf"), 'wb') as f:
+                f.write(contenido)
+
+    print("\n" + "=" * 70)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,15 @@
 # -*- coding: utf-8 -*-
 """
 Script para buscar columnas específicas en las hojas de Google Sheets
+
+Solo lee la fila de encabezados de cada hoja (no descarga los datos).
+
+Uso:
+    python buscar_columnas.py            # muestra columnas y valida el formulario
+    python buscar_columnas.py --guardar  # además guarda el esquema para futuras comparaciones
+    python buscar_columnas.py --diff     # compara con el último esquema guardado
 """
+import argparse
 import sys
 import os
 
@@ -14,7 +22,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
 import django
 django.setup()
 
-from formatos_eps.google_sheets import get_sheet_data
+from formatos_eps.google_sheets import HOJAS
+from formatos_eps.schema import (
+    obtener_esquema, campos_faltantes, guardar_esquemas, cargar_esquemas,
+    diferencias_esquema, ruta_esquema_guardado,
+)
+
+parser = argparse.ArgumentParser(description="Columnas de las hojas de Google Sheets")
+parser.add_argument('--guardar', action='store_true', help="Guardar el esquema actual")
+parser.add_argument('--diff', action='store_true', help="Comparar con el esquema guardado")
+args = parser.parse_args()
 
 print("=" * 80)
 print("BÚSQUEDA DE COLUMNAS EN GOOGLE SHEETS")
@@ -27,84 +44,85 @@ print("\nBuscando columnas relacionadas con:")
 for kw in keywords:
     print(f"  - {kw}")
 
-print("\n" + "-" * 80)
-
-# Buscar en hoja Planta
-print("\n1. HOJA 'PLANTA':")
-print("-" * 80)
-
-try:
-    planta_data = get_sheet_data('Planta')
-    if planta_data:
-        columns = list(planta_data[0].keys())
-        print(f"Total de columnas: {len(columns)}\n")
-
-        # Buscar columnas que contengan las palabras clave
-        found_columns = {}
-        for keyword in keywords:
-            matching = [col for col in columns if keyword.upper() in col.upper()]
-            if matching:
-                found_columns[keyword] = matching
-
-        if found_columns:
-            print("Columnas encontradas:")
-            for keyword, cols in found_columns.items():
-                print(f"\n  {keyword}:")
-                for col in cols:
-                    print(f"    - '{col}'")
-        else:
-            print("No se encontraron columnas con esas palabras clave")
-
-        # Mostrar todas las columnas para referencia
-        print("\n\nTODAS LAS COLUMNAS (primeras 30):")
-        for i, col in enumerate(columns[:30], 1):
-            print(f"  {i:2}. '{col}'")
-
-        if len(columns) > 30:
-            print(f"  ... y {len(columns) - 30} más")
-
-except Exception as e:
-    print(f"Error al leer hoja Planta: {e}")
-
-print("\n" + "-" * 80)
-
-# Buscar en hoja Manipuladoras
-print("\n2. HOJA 'MANIPULADORAS':")
-print("-" * 80)
-
-try:
-    manipuladoras_data = get_sheet_data('Manipuladoras')
-    if manipuladoras_data:
-        columns = list(manipuladoras_data[0].keys())
-        print(f"Total de columnas: {len(columns)}\n")
-
-        # Buscar columnas que contengan las palabras clave
-        found_columns = {}
-        for keyword in keywords:
-            matching = [col for col in columns if keyword.upper() in col.upper()]
-            if matching:
-                found_columns[keyword] = matching
-
-        if found_columns:
-            print("Columnas encontradas:")
-            for keyword, cols in found_columns.items():
-                print(f"\n  {keyword}:")
-                for col in cols:
-                    print(f"    - '{col}'")
-        else:
-            print("No se encontraron columnas con esas palabras clave")
-
-        # Mostrar todas las columnas para referencia
-        print("\n\nTODAS LAS COLUMNAS (primeras 30):")
-        for i, col in enumerate(columns[:30], 1):
-            print(f"  {i:2}. '{col}'")
-
-        if len(columns) > 30:
-            print(f"  ... y {len(columns) - 30} más")
-
-except Exception as e:
-    print(f"Error al leer hoja Manipuladoras: {e}")
+esquemas = {}
+hay_faltantes = False
+
+for numero, sheet_name in enumerate(HOJAS, 1):
+    print("\n" + "-" * 80)
+    print(f"\n{numero}. HOJA '{sheet_name.upper()}':")
+    print("-" * 80)
+
+    try:
+        esquema = obtener_esquema(sheet_name)
+    except Exception as e:
+        print(f"Error al leer hoja {sheet_name}: {e}")
+        continue
+
+    esquemas[sheet_name] = esquema
+    columns = list(esquema.keys())
+    print(f"Total de columnas: {len(columns)}\n")
+
+    # Buscar columnas que contengan las palabras clave
+    found_columns = {}
+    for keyword in keywords:
+        matching = [col for col in columns if keyword.upper() in col.upper()]
+        if matching:
+            found_columns[keyword] = matching
+
+    if found_columns:
+        print("Columnas encontradas:")
+        for keyword, cols in found_columns.items():
+            print(f"\n  {keyword}:")
+            for col in cols:
+                print(f"    - '{col}'")
+    else:
+        print("No se encontraron columnas con esas palabras clave")
+
+    # Validar las columnas que usa el formulario
+    faltantes = campos_faltantes(esquema)
+    if faltantes:
+        hay_faltantes = True
+        print("\n[ERROR] Columnas del formulario que no existen en la hoja:")
+        for campo, encabezado in faltantes:
+            print(f"    - '{encabezado}' (campo {campo})")
+    else:
+        print("\n[OK] Todas las columnas del formulario existen")
+
+    # Mostrar todas las columnas para referencia
+    print("\n\nTODAS LAS COLUMNAS (primeras 30):")
+    for i, col in enumerate(columns[:30], 1):
+        print(f"  {i:2}. '{col}'")
+
+    if len(columns) > 30:
+        print(f"  ... y {len(columns) - 30} más")
+
+if args.diff:
+    print("\n" + "-" * 80)
+    print("\nCOMPARACIÓN CON EL ESQUEMA GUARDADO:")
+    print("-" * 80)
+    anteriores = cargar_esquemas()
+    if anteriores is None:
+        print(f"No hay esquema guardado en {ruta_esquema_guardado()} (use --guardar)")
+    else:
+        for sheet_name, esquema in esquemas.items():
+            cambios = diferencias_esquema(anteriores.get(sheet_name, {}), esquema)
+            if not any(cambios.values()):
+                print(f"\n  {sheet_name}: sin cambios")
+                continue
+            print(f"\n  {sheet_name}:")
+            for col in cambios['agregadas']:
+                print(f"    + '{col}'")
+            for col in cambios['eliminadas']:
+                print(f"    - '{col}'")
+            for col, antes, ahora in cambios['movidas']:
+                print(f"    ~ '{col}' (columna {antes + 1} -> {ahora + 1})")
+
+if args.guardar and esquemas:
+    guardar_esquemas(esquemas)
+    print(f"\nEsquema guardado en: {ruta_esquema_guardado()}")
 
 print("\n" + "=" * 80)
 print("BÚSQUEDA COMPLETADA")
 print("=" * 80)
+
+sys.exit(1 if hay_faltantes else 0)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Envía al webhook de cambios en las hojas la misma petición firmada que el
+trigger onEdit de Apps Script (para probar en local o forzar una
+actualización).
+
+Uso:
+    python enviar_webhook.py HOJA FILA_INICIO [FILA_FIN] [--url URL]
+    python enviar_webhook.py HOJA --completo [--url URL]
+
+Usa SHEETS_WEBHOOK_SECRETO de la configuración.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Agregar el directorio de Django al path
+sys.path.insert(0, 'formularios')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
+
+# Configurar Django
+import django
+django.setup()
+
+import requests
+from django.conf import settings
+
+from formatos_eps.webhook import firmar
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enviar un cambio de filas al webhook")
+    parser.add_argument('hoja')
+    parser.add_argument('fila_inicio', type=int, nargs='?', default=0)
+    parser.add_argument('fila_fin', type=int, nargs='?')
+    parser.add_argument('--completo', action='store_true', help="Pedir un refresco completo")
+    parser.add_argument('--url', default='http://127.0.0.1:8000/formatos/webhook/hojas/')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ENVIAR CAMBIO AL WEBHOOK DE HOJAS")
+    print("=" * 60)
+
+    if not settings.SHEETS_WEBHOOK_SECRETO:
+        print("\n[ERROR] Configure SHEETS_WEBHOOK_SECRETO")
+        sys.exit(1)
+
+    datos = {'hoja': args.hoja, 'ts': int(time.time())}
+    if args.completo:
+        datos['completo'] = True
+    else:
+        datos['fila_inicio'] = args.fila_inicio
+        datos['fila_fin'] = args.fila_fin or args.fila_inicio
+    cuerpo = json.dumps(datos).encode('utf-8')
+
+    print(f"\n{args.url}\n{cuerpo.decode('utf-8')}")
+    inicio = time.perf_counter()
+    respuesta = requests.post(args.url, data=cuerpo, timeout=60, headers={
+        'Content-Type': 'application/json',
+        'X-Webhook-Firma': 'sha256=' + firmar(cuerpo, settings.SHEETS_WEBHOOK_SECRETO),
+    })
+    print(f"\n[{respuesta.status_code}] en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    print(respuesta.text)
+
+    print("\n" + "=" * 60)
+    sys.exit(0 if respuesta.ok else 1)
+
+
+if __name__ == '__main__':
+    main()
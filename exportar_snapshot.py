@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script para descargar las hojas y exportar el snapshot a disco.
+
+Uso:
+    python exportar_snapshot.py [directorio]
+
+Sin argumentos usa SHEETS_SNAPSHOT_DIR. El directorio resultante tiene un
+CSV por hoja y sirve para el arranque rápido de los workers o como fuente
+del backend 'archivo' (SHEETS_BACKEND=archivo SHEETS_ARCHIVO=<directorio>).
+"""
+import sys
+import os
+import time
+
+# Agregar el directorio de Django al path
+sys.path.insert(0, 'formularios')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'formularios.settings')
+
+# Configurar Django
+import django
+django.setup()
+
+from django.conf import settings
+
+if len(sys.argv) > 1:
+    settings.SHEETS_SNAPSHOT_DIR = os.path.abspath(sys.argv[1])
+
+from formatos_eps.google_sheets import refrescar_snapshot
+from formatos_eps.snapshot import cargar_snapshot
+
+print("=" * 60)
+print("EXPORTAR SNAPSHOT DE HOJAS")
+print("=" * 60)
+
+if not settings.SHEETS_SNAPSHOT_DIR:
+    print("\n[ERROR] Indique un directorio o configure SHEETS_SNAPSHOT_DIR")
+    sys.exit(1)
+
+print(f"\n1. Descargando hojas (backend: {settings.SHEETS_BACKEND})...")
+inicio = time.perf_counter()
+try:
+    snapshot = refrescar_snapshot()
+except Exception as e:
+    print(f"   [ERROR] {type(e).__name__}: {e}")
+    sys.exit(1)
+print(f"   [OK] Descarga en {time.perf_counter() - inicio:.2f} s")
+print(f"   Ingesta: {settings.SHEETS_INGESTA}")
+for sheet_name, registros in snapshot['registros'].items():
+    print(f"   - {sheet_name}: {len(registros)} registros")
+
+print(f"\n2. Verificando carga desde disco: {settings.SHEETS_SNAPSHOT_DIR}")
+inicio = time.perf_counter()
+if cargar_snapshot(settings.SHEETS_SNAPSHOT_DIR):
+    print(f"   [OK] Cargado en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+else:
+    print("   [ERROR] No se pudo leer el snapshot guardado")
+    sys.exit(1)
+
+print("\n" + "=" * 60)
+print("[OK] SNAPSHOT EXPORTADO")
+print("=" * 60)
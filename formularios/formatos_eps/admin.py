@@ -1,3 +1,66 @@
+from itertools import chain
+
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .auditoria import generar_csv
+from .models import RegistroGeneracion, TokenAPI, TrabajoLote
+
+
+@admin.register(TrabajoLote)
+class TrabajoLoteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'usuario', 'estado', 'procesados', 'total', 'creado', 'actualizado')
+    list_filter = ('estado',)
+    search_fields = ('id', 'usuario__username')
+    date_hierarchy = 'creado'
+    readonly_fields = ('id', 'creado', 'actualizado', 'latido', 'worker')
+
+
+@admin.register(TokenAPI)
+class TokenAPIAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'usuario', 'prefijo', 'activo', 'creado', 'ultimo_uso')
+    list_filter = ('activo',)
+    search_fields = ('nombre', 'prefijo', 'usuario__username')
+    readonly_fields = ('prefijo', 'clave_hash', 'creado', 'ultimo_uso')
+
+    def has_add_permission(self, request):
+        # La clave solo se puede mostrar al crearla: manage.py crear_token_api
+        return False
+
+
+@admin.register(RegistroGeneracion)
+class RegistroGeneracionAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'nombre_usuario', 'cedula', 'origen')
+    list_filter = ('origen',)
+    # Búsqueda exacta por cédula o por usuario: cada condición del OR usa su
+    # índice ((cedula, fecha) y (nombre_usuario, fecha)) en tablas grandes
+    search_fields = ('=cedula', '=nombre_usuario')
+    date_hierarchy = 'fecha'
+    # Contar toda la tabla en cada página es lento con millones de filas
+    show_full_result_count = False
+    list_per_page = 100
+    actions = ['exportar_csv']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # Registro de cumplimiento: solo lectura
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
-# Register your models here.
+    @admin.action(description="Exportar a CSV")
+    def exportar_csv(self, request, queryset):
+        # Con "seleccionar todos" el queryset es el listado filtrado completo;
+        # se envía por bloques sin cargarlo en memoria
+        response = StreamingHttpResponse(
+            # BOM para que Excel reconozca las tildes
+            chain(['\ufeff'], generar_csv(queryset.order_by('fecha', 'id'))),
+            content_type='text/csv; charset=utf-8',
+        )
+        nombre = f"auditoria_{timezone.localdate():%Y%m%d}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
@@ -0,0 +1,266 @@
+"""
+API JSON para integraciones (por ejemplo, el sistema de nómina).
+
+Los clientes se autentican con la cabecera ``Authorization: Token <clave>``;
+los tokens se crean con ``manage.py crear_token_api``. Todas las consultas
+se resuelven contra el snapshot en memoria, sin acceder a las hojas:
+
+- ``GET  api/empleados/<cedula>/``: registro normalizado de un empleado
+- ``POST api/empleados/``: varias cédulas en una sola pasada, paginado
+- ``GET  api/empleados/<cedula>/pdf/``: PDF del formulario
+
+Con ``?formato=compacto`` la consulta por lotes devuelve los nombres de los
+campos una sola vez y cada registro como una lista de valores.
+
+Si las hojas no se pueden leer (cuota agotada, Google Sheets caído) se
+responde 503 con ``{"error": ...}`` y la cabecera Retry-After.
+"""
+import json
+import logging
+import math
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .auditoria import registrar_descarga
+from .autenticacion import buscar_token, olvidar_token
+from .cuota import CuotaAgotada
+from .descargas import respuesta_descarga
+from .google_sheets import fecha_modificacion, find_row_by_cedula, get_snapshot
+from .lotes import parsear_cedulas
+from .models import RegistroGeneracion, TokenAPI
+from .normalizacion import CAMPOS_DERIVADOS
+from .pdf_cache import obtener_pdf
+from .pdf_generator import calcular_hash_datos, generar_nombre_archivo_pdf
+from .schema import CAMPOS_FORMULARIO
+
+# Campos de cada registro en las respuestas (y orden en el formato compacto)
+CAMPOS_API = list(CAMPOS_FORMULARIO) + CAMPOS_DERIVADOS + ['hash', 'pdf']
+
+# El último uso de un token se guarda como mucho una vez por este intervalo
+INTERVALO_ULTIMO_USO = timedelta(minutes=5)
+
+# Retry-After (segundos) de un 503 cuyo error no indica cuándo reintentar
+REINTENTAR_S = 30
+
+logger = logging.getLogger(__name__)
+
+
+def respuesta_json(datos, status=200):
+    """JsonResponse sin espacios ni escapes de tildes (respuestas más pequeñas)."""
+    return JsonResponse(
+        datos,
+        status=status,
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+def _error(mensaje, status, reintentar_en=None):
+    response = respuesta_json({'error': mensaje}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Token'
+    if reintentar_en is not None:
+        response['Retry-After'] = str(max(math.ceil(reintentar_en), 1))
+    return response
+
+
+def autenticar_token(request):
+    """
+    Token activo de la cabecera Authorization, o None.
+
+    Acepta ``Token <clave>`` y ``Bearer <clave>``.
+    """
+    partes = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(partes) != 2 or partes[0].lower() not in ('token', 'bearer'):
+        return None
+
+    # Con el token en caché, una petición no consulta la base de datos
+    token = buscar_token(partes[1])
+    if token is None:
+        return None
+
+    ahora = timezone.now()
+    if token.ultimo_uso is None or ahora - token.ultimo_uso > INTERVALO_ULTIMO_USO:
+        TokenAPI.objects.filter(pk=token.pk).update(ultimo_uso=ahora)
+        # La copia en caché tiene el ultimo_uso anterior: se recarga en la siguiente petición
+        olvidar_token(token)
+    return token
+
+
+def token_requerido(vista):
+    """
+    Exige un token válido; deja el token en ``request.token_api`` y su
+    usuario en ``request.user``.
+
+    Las vistas de la API no usan cookies de sesión, así que no llevan CSRF.
+    """
+    @csrf_exempt
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        token = autenticar_token(request)
+        if token is None:
+            return _error('Token ausente o inválido', 401)
+        request.token_api = token
+        request.user = token.usuario
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def hojas_requeridas(vista):
+    """
+    Responde 503 (JSON, con Retry-After) si no se pueden leer las hojas:
+    cuota agotada, circuito abierto o error de conexión con Google Sheets.
+
+    Va por fuera de @condition para cubrir también el cálculo del ETag.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        try:
+            return vista(request, *args, **kwargs)
+        except ConnectionError as e:
+            logger.warning(f"API: Google Sheets no disponible en {request.path}: {str(e)}")
+            if isinstance(e, CuotaAgotada):
+                mensaje = 'Google Sheets está recibiendo demasiadas consultas; intente de nuevo más tarde'
+            else:
+                mensaje = 'Google Sheets no está disponible; intente de nuevo más tarde'
+            return _error(mensaje, 503, reintentar_en=getattr(e, 'reintentar_en', None) or REINTENTAR_S)
+    return envoltura
+
+
+def serializar_registro(request, registro):
+    """
+    Registro normalizado con su hash (ETag del PDF) y el enlace al PDF.
+
+    Returns:
+        dict: {campo: valor} con los campos de CAMPOS_API
+    """
+    datos = {campo: registro.get(campo, '') for campo in CAMPOS_FORMULARIO}
+    for campo in CAMPOS_DERIVADOS:
+        datos[campo] = registro.get(campo, '')
+    datos['hash'] = calcular_hash_datos(registro)
+    datos['pdf'] = request.build_absolute_uri(
+        reverse('formatos_eps:api_empleado_pdf', args=[registro['CEDULA']])
+    )
+    return datos
+
+
+def _entero(valor, defecto, minimo, maximo):
+    try:
+        return min(max(int(valor), minimo), maximo)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@require_GET
+@token_requerido
+@hojas_requeridas
+def empleado_view(request, cedula):
+    """Registro normalizado de un empleado."""
+    registro = find_row_by_cedula(cedula)
+    if not registro:
+        return _error(f'No se encontró empleado con cédula {cedula}', 404)
+    return respuesta_json(serializar_registro(request, registro))
+
+
+@require_POST
+@token_requerido
+@hojas_requeridas
+def empleados_lote_view(request):
+    """
+    Resuelve varias cédulas en una sola pasada sobre el snapshot.
+
+    Cuerpo JSON: ``{"cedulas": ["123", "456", ...]}`` (lista o texto separado
+    por comas, espacios o líneas). Parámetros: ``pagina`` (desde 1),
+    ``tamano`` (máximo API_TAMANO_PAGINA) y ``formato=compacto``. Las
+    siguientes páginas se piden repitiendo el mismo cuerpo con otra
+    ``pagina``.
+
+    Returns:
+        JsonResponse: {'total', 'encontradas', 'pagina', 'paginas',
+            'registros' (o 'campos' y 'filas'), 'no_encontradas'}; las dos
+            últimas listas solo de la página pedida
+    """
+    try:
+        cuerpo = json.loads(request.body or b'{}')
+    except ValueError:
+        return _error('El cuerpo debe ser JSON', 400)
+
+    cedulas = cuerpo.get('cedulas') if isinstance(cuerpo, dict) else None
+    if isinstance(cedulas, list):
+        cedulas = parsear_cedulas(' '.join(str(cedula) for cedula in cedulas))
+    elif isinstance(cedulas, str):
+        cedulas = parsear_cedulas(cedulas)
+    else:
+        return _error('Falta la lista "cedulas"', 400)
+
+    maximo = getattr(settings, 'API_MAX_CEDULAS', 5000)
+    if not cedulas:
+        return _error('La lista de cédulas está vacía', 400)
+    if len(cedulas) > maximo:
+        return _error(f'Máximo {maximo} cédulas por consulta (se recibieron {len(cedulas)})', 400)
+
+    # Una sola pasada: todas las cédulas contra el índice del mismo snapshot
+    indice = get_snapshot()['indice']
+    resueltos = [(cedula, indice.get(cedula)) for cedula in cedulas]
+
+    tamano_maximo = getattr(settings, 'API_TAMANO_PAGINA', 200)
+    tamano = _entero(request.GET.get('tamano'), tamano_maximo, 1, tamano_maximo)
+    paginas = math.ceil(len(resueltos) / tamano)
+    pagina = _entero(request.GET.get('pagina'), 1, 1, paginas)
+    inicio = (pagina - 1) * tamano
+
+    registros = []
+    no_encontradas = []
+    for cedula, registro in resueltos[inicio:inicio + tamano]:
+        if registro:
+            registros.append(serializar_registro(request, registro))
+        else:
+            no_encontradas.append(cedula)
+
+    datos = {
+        'total': len(resueltos),
+        'encontradas': sum(1 for _, registro in resueltos if registro),
+        'pagina': pagina,
+        'paginas': paginas,
+        'no_encontradas': no_encontradas,
+    }
+    if request.GET.get('formato') == 'compacto':
+        datos['campos'] = CAMPOS_API
+        datos['filas'] = [[registro[campo] for campo in CAMPOS_API] for registro in registros]
+    else:
+        datos['registros'] = registros
+    return respuesta_json(datos)
+
+
+def _etag_pdf_api(request, cedula):
+    registro = find_row_by_cedula(cedula)
+    return calcular_hash_datos(registro) if registro else None
+
+
+@require_GET
+@token_requerido
+@hojas_requeridas
+@condition(etag_func=_etag_pdf_api)
+def empleado_pdf_view(request, cedula):
+    """PDF del formulario (con ETag y Range, igual que la descarga web)."""
+    registro = find_row_by_cedula(cedula)
+    if not registro:
+        return _error(f'No se encontró empleado con cédula {cedula}', 404)
+
+    contenido, hash_datos = obtener_pdf(registro)
+    respuesta = respuesta_descarga(
+        request,
+        content_type='application/pdf',
+        filename=generar_nombre_archivo_pdf(cedula),
+        contenido=contenido,
+        etag=hash_datos,
+        last_modified=fecha_modificacion(get_snapshot()),
+    )
+    registrar_descarga(request, respuesta, cedula, hash_datos, RegistroGeneracion.API)
+    return respuesta
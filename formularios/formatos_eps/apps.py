@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FormatosEpsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'formatos_eps'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registra los system checks)
+        from . import autenticacion  # noqa: F401 (invalida usuarios y tokens en caché al guardarlos)
+
+        # Con gunicorn el warm-up lo hacen los hooks de gunicorn.conf.py;
+        # esta opción es para otros servidores (ej: runserver)
+        if getattr(settings, 'WARMUP_EN_READY', False):
+            from .warmup import calentar_worker
+            calentar_worker()
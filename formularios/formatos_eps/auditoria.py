@@ -0,0 +1,222 @@
+"""
+Auditoría de formularios generados (modelo RegistroGeneracion).
+
+Escribir una fila dentro de cada descarga añadiría una consulta a la base de
+datos en la petición. ``registrar`` solo agrega el registro a un buffer del
+proceso; un hilo lo guarda con ``bulk_create`` cuando junta
+AUDITORIA_LOTE registros o cada AUDITORIA_INTERVALO_S segundos.
+
+El buffer se vacía también al terminar el proceso (atexit y el hook
+``worker_exit`` de gunicorn), así un reinicio o un reciclaje de workers no
+pierde registros; solo se perderían los del último intervalo si el proceso
+muere sin poder terminar (SIGKILL). Si la base de datos falla, los registros
+vuelven al buffer hasta AUDITORIA_MAX_PENDIENTES; los más antiguos que
+sobren se descartan y se registra el error.
+"""
+import atexit
+import csv
+import io
+import logging
+import os
+import threading
+from datetime import datetime, time as hora, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_CSV = ['fecha', 'usuario', 'cedula', 'origen', 'hash_datos']
+# Filas leídas por consulta al exportar y bytes de CSV por bloque enviado
+CHUNK_EXPORTACION = 2000
+BLOQUE_CSV = 64 * 1024
+
+_pendientes = []
+_lock = threading.Lock()
+# Un solo guardado a la vez (hilo de fondo, atexit o worker_exit)
+_escritura_lock = threading.Lock()
+_despertar = threading.Event()
+_hilo = None
+_pid = None
+_metricas = {'guardados': 0, 'descartados': 0, 'errores': 0}
+
+
+def _tamano_lote():
+    return getattr(settings, 'AUDITORIA_LOTE', 200)
+
+
+def _intervalo():
+    return getattr(settings, 'AUDITORIA_INTERVALO_S', 5)
+
+
+def _max_pendientes():
+    return getattr(settings, 'AUDITORIA_MAX_PENDIENTES', 10000)
+
+
+def _asegurar_hilo():
+    """Arranca el hilo de guardado en este proceso (una vez, y de nuevo tras un fork)."""
+    global _hilo, _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        if _pid is not None:
+            # Proceso hijo: los pendientes heredados los guarda el padre
+            _pendientes.clear()
+        _hilo = threading.Thread(target=_bucle, name='auditoria', daemon=True)
+        _hilo.start()
+        _pid = os.getpid()
+
+
+def _bucle():
+    while True:
+        _despertar.wait(_intervalo())
+        _despertar.clear()
+        vaciar()
+
+
+def registrar(usuario, cedula, origen, hash_datos=''):
+    """
+    Agrega un registro de generación al buffer (no toca la base de datos).
+
+    Args:
+        usuario (User): Usuario que generó el formulario
+        cedula (str): Cédula del empleado
+        origen (str): RegistroGeneracion.WEB, API o LOTE
+        hash_datos (str): Hash de los datos con que se generó el PDF
+    """
+    from .models import RegistroGeneracion
+
+    registro = RegistroGeneracion(
+        fecha=timezone.now(),
+        usuario_id=usuario.pk,
+        nombre_usuario=usuario.get_username(),
+        cedula=cedula,
+        origen=origen,
+        hash_datos=hash_datos or '',
+    )
+    _asegurar_hilo()
+    with _lock:
+        _pendientes.append(registro)
+        lleno = len(_pendientes) >= _tamano_lote()
+    if lleno:
+        _despertar.set()
+
+
+def registrar_descarga(request, respuesta, cedula, hash_datos, origen):
+    """
+    Registra una descarga del PDF si la respuesta lo entrega desde el inicio.
+
+    Una descarga reanudada (Range desde otro byte), un 304 o un 416 no
+    cuentan como una nueva generación.
+    """
+    if respuesta.status_code == 200 or (
+        respuesta.status_code == 206 and respuesta['Content-Range'].startswith('bytes 0-')
+    ):
+        registrar(request.user, cedula, origen, hash_datos)
+
+
+def vaciar():
+    """
+    Guarda en bloque los registros pendientes.
+
+    Returns:
+        int: Registros guardados
+    """
+    from .models import RegistroGeneracion
+
+    with _escritura_lock:
+        with _lock:
+            lote = _pendientes[:]
+            _pendientes.clear()
+        if not lote:
+            return 0
+
+        try:
+            # Descarta la conexión del hilo si venció o quedó inservible
+            close_old_connections()
+            RegistroGeneracion.objects.bulk_create(lote, batch_size=500)
+        except DatabaseError as e:
+            with _lock:
+                _pendientes[:0] = lote
+                sobrantes = len(_pendientes) - _max_pendientes()
+                if sobrantes > 0:
+                    del _pendientes[:sobrantes]
+                _metricas['errores'] += 1
+                _metricas['descartados'] += max(sobrantes, 0)
+            logger.error(
+                f"No se pudieron guardar {len(lote)} registros de auditoría: {str(e)}"
+                + (f" ({sobrantes} descartados)" if sobrantes > 0 else "")
+            )
+            return 0
+
+        with _lock:
+            _metricas['guardados'] += len(lote)
+        return len(lote)
+
+
+atexit.register(vaciar)
+
+
+def estadisticas():
+    """
+    Returns:
+        dict: {'pendientes', 'guardados', 'descartados', 'errores'} de este proceso
+    """
+    with _lock:
+        return {'pendientes': len(_pendientes), **_metricas}
+
+
+def filtrar(desde, hasta, cedula=None, usuario=None):
+    """
+    Registros entre dos fechas (inclusivas), del más antiguo al más reciente.
+
+    Args:
+        desde (date): Primer día
+        hasta (date): Último día
+        cedula (str): Solo esta cédula
+        usuario (str): Solo este nombre de usuario
+
+    Returns:
+        QuerySet: Registros de RegistroGeneracion
+    """
+    from .models import RegistroGeneracion
+
+    # Rango sobre la columna (no fecha__date) para usar el índice
+    zona = timezone.get_current_timezone()
+    registros = RegistroGeneracion.objects.filter(
+        fecha__gte=datetime.combine(desde, hora.min, tzinfo=zona),
+        fecha__lt=datetime.combine(hasta + timedelta(days=1), hora.min, tzinfo=zona),
+    )
+    if cedula:
+        registros = registros.filter(cedula=cedula)
+    if usuario:
+        registros = registros.filter(nombre_usuario=usuario)
+    return registros.order_by('fecha', 'id')
+
+
+def generar_csv(registros):
+    """
+    Genera el CSV de los registros por bloques de texto, sin cargarlos todos
+    en memoria (sirve para StreamingHttpResponse o para escribir a un archivo).
+
+    Args:
+        registros (QuerySet): Registros de RegistroGeneracion, ya ordenados
+
+    Yields:
+        str: Bloques del CSV
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_CSV)
+
+    filas = registros.values_list('fecha', 'nombre_usuario', 'cedula', 'origen', 'hash_datos')
+    for fecha, *resto in filas.iterator(chunk_size=CHUNK_EXPORTACION):
+        writer.writerow([timezone.localtime(fecha).isoformat(timespec='seconds'), *resto])
+        if buffer.tell() >= BLOQUE_CSV:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
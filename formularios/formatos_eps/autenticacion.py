@@ -0,0 +1,98 @@
+"""
+Backend de autenticación con el usuario en caché.
+
+``AuthenticationMiddleware`` carga el usuario de la sesión en cada petición
+(una consulta a la base de datos). ``BackendCacheado`` lo guarda en la caché
+por defecto durante AUTH_USUARIO_CACHE_TTL segundos; junto con las sesiones
+``cached_db`` una búsqueda o una descarga no consultan la base de datos.
+
+Los tokens de la API (``buscar_token``) se guardan igual, con su usuario,
+así una petición de la API con un token conocido tampoco la consulta.
+
+Al guardar o eliminar un usuario o un token se borra su entrada (la del
+usuario borra también las de sus tokens). La caché es de archivos y la
+comparten los workers de la máquina, así que el cambio (desactivar al
+usuario, revocar un token, cambiar la clave) se ve enseguida en todos; solo
+en otra réplica sin CACHE_DIR compartido tarda hasta AUTH_USUARIO_CACHE_TTL.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TokenAPI
+
+
+def _clave(user_id):
+    return f"auth:usuario:{user_id}"
+
+
+def _clave_token(clave_hash):
+    return f"auth:token:{clave_hash}"
+
+
+class BackendCacheado(ModelBackend):
+    """ModelBackend que guarda en caché el usuario de cada sesión."""
+
+    def get_user(self, user_id):
+        ttl = getattr(settings, 'AUTH_USUARIO_CACHE_TTL', 60)
+        if ttl <= 0:
+            return super().get_user(user_id)
+
+        clave = _clave(user_id)
+        usuario = cache.get(clave)
+        if usuario is None:
+            usuario = super().get_user(user_id)
+            if usuario is not None:
+                cache.set(clave, usuario, ttl)
+        return usuario
+
+
+def buscar_token(clave):
+    """
+    Token activo de una clave de la API, con su usuario (también activo).
+
+    Args:
+        clave (str): Clave en claro de la cabecera Authorization
+
+    Returns:
+        TokenAPI: El token, o None si no existe o está revocado
+    """
+    clave_hash = TokenAPI.hash_clave(clave)
+    ttl = getattr(settings, 'AUTH_USUARIO_CACHE_TTL', 60)
+    if ttl > 0:
+        token = cache.get(_clave_token(clave_hash))
+        if token is not None:
+            return token
+
+    token = (
+        TokenAPI.objects.select_related('usuario')
+        .filter(clave_hash=clave_hash, activo=True, usuario__is_active=True)
+        .first()
+    )
+    # Las claves inválidas no se guardan: cualquiera puede inventarlas
+    if token is not None and ttl > 0:
+        cache.set(_clave_token(clave_hash), token, ttl)
+    return token
+
+
+def olvidar_token(token):
+    """Borra el token de la caché (ej: tras actualizar ultimo_uso con update())."""
+    cache.delete(_clave_token(token.clave_hash))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _invalidar_usuario(sender, instance, **kwargs):
+    # También lo dispara el login (actualiza last_login)
+    cache.delete(_clave(instance.pk))
+    # Sus tokens llevan el usuario: desactivarlo los revoca
+    claves_hash = TokenAPI.objects.filter(usuario_id=instance.pk).values_list('clave_hash', flat=True)
+    cache.delete_many([_clave_token(clave_hash) for clave_hash in claves_hash])
+
+
+@receiver(post_save, sender=TokenAPI)
+@receiver(post_delete, sender=TokenAPI)
+def _invalidar_token(sender, instance, **kwargs):
+    olvidar_token(instance)
@@ -0,0 +1,331 @@
+"""
+Calibración de la posición de los campos en el PDF template.
+
+La geometría del template (textos con ``page.get_text("dict")``, cajas y
+líneas con ``page.get_drawings()``) se extrae una sola vez y se guarda en
+disco junto con una imagen del template en blanco por resolución. Con eso:
+
+- cada campo se ajusta a la caja que lo contiene (ancho disponible y,
+  opcionalmente, margen izquierdo y línea base);
+- las vistas previas se dibujan sobre la imagen cacheada, sin volver a
+  procesar los miles de trazos vectoriales del template;
+- el resultado se guarda en el archivo de layout que lee pdf_generator.
+
+Se usa desde ``manage.py calibrar_formulario``.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .pdf_generator import (
+    TAMANO_FUENTE_DEFECTO, cargar_plantilla, dibujar_formulario, fitz_lock, ruta_layout,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rectángulos más pequeños que esto son adornos o casillas de un carácter
+CAJA_MIN_ANCHO = 8
+CAJA_MIN_ALTO = 6
+# Distancia entre el texto y el borde de la caja
+MARGEN_CAJA = 2
+# Distancia máxima (pt) entre la línea base y una línea horizontal para usarla de guía
+TOLERANCIA_LINEA = 4
+
+DPI_PREVIEW = 50
+
+# Datos de ejemplo con textos largos, para ver cómo se reducen
+DATOS_MUESTRA = {
+    'CEDULA': '1234567890',
+    'PRIMER_APELLIDO': 'DE LA TORRE MOSQUERA',
+    'SEGUNDO_APELLIDO': 'GARCIA',
+    'NOMBRES': 'MARIA DEL PILAR ALEJANDRA',
+    'FECHA_NACIMIENTO': '19900315',
+    'PAIS_NACIMIENTO': 'COLOMBIA',
+    'CODIGO_SEXO': '1',
+    'DEPARTAMENTO_NACIMIENTO': 'VALLE DEL CAUCA',
+    'CIUDAD_NACIMIENTO': 'GUADALAJARA DE BUGA',
+}
+
+_geometria = None
+_imagenes = {}
+_lock = threading.Lock()
+
+
+def huella_plantilla():
+    """Hash corto del PDF template, para no mezclar cachés de templates distintos."""
+    return hashlib.sha256(cargar_plantilla()).hexdigest()[:16]
+
+
+def directorio_calibracion():
+    return os.path.join(getattr(settings, 'PDF_CACHE_DIR', '') or tempfile.gettempdir(), 'calibracion')
+
+
+def _escribir(ruta, contenido):
+    """Escritura atómica (temporal + os.replace)."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, ruta_tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.tmp_')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(contenido)
+    os.replace(ruta_tmp, ruta)
+
+
+def extraer_geometria(plantilla):
+    """
+    Extrae textos, cajas y líneas horizontales de la primera página.
+
+    Args:
+        plantilla (bytes): PDF template
+
+    Returns:
+        dict: {'ancho', 'alto', 'cajas': [[x0, y0, x1, y1]],
+            'lineas': [[x0, y, x1]], 'textos': [{'texto', 'bbox', 'tamano'}]}
+    """
+    import fitz  # PyMuPDF
+
+    with fitz_lock:
+        doc = fitz.open(stream=plantilla, filetype='pdf')
+        page = doc[0]
+
+        cajas = set()
+        lineas = set()
+        for dibujo in page.get_drawings():
+            for item in dibujo['items']:
+                if item[0] == 're':
+                    r = item[1]
+                    if r.width >= CAJA_MIN_ANCHO and r.height >= CAJA_MIN_ALTO:
+                        cajas.add((round(r.x0, 1), round(r.y0, 1), round(r.x1, 1), round(r.y1, 1)))
+                elif item[0] == 'l':
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y) < 0.5 and abs(p1.x - p2.x) >= CAJA_MIN_ANCHO:
+                        lineas.add((round(min(p1.x, p2.x), 1), round(p1.y, 1), round(max(p1.x, p2.x), 1)))
+
+        textos = []
+        for bloque in page.get_text('dict')['blocks']:
+            for linea in bloque.get('lines', []):
+                for span in linea['spans']:
+                    if span['text'].strip():
+                        textos.append({
+                            'texto': span['text'].strip(),
+                            'bbox': [round(v, 1) for v in span['bbox']],
+                            'tamano': round(span['size'], 1),
+                        })
+
+        geometria = {
+            'ancho': page.rect.width,
+            'alto': page.rect.height,
+            'cajas': sorted(cajas),
+            'lineas': sorted(lineas),
+            'textos': textos,
+        }
+        doc.close()
+    return geometria
+
+
+def obtener_geometria():
+    """
+    Geometría del template, extraída una sola vez y guardada en disco.
+
+    Returns:
+        dict: Ver extraer_geometria
+    """
+    global _geometria
+    with _lock:
+        if _geometria is not None:
+            return _geometria
+
+        ruta = os.path.join(directorio_calibracion(), f"geometria_{huella_plantilla()}.json")
+        if os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                _geometria = json.load(f)
+        else:
+            _geometria = extraer_geometria(cargar_plantilla())
+            _escribir(ruta, json.dumps(_geometria).encode('utf-8'))
+            logger.info(
+                f"Geometría del template extraída: {len(_geometria['cajas'])} cajas, "
+                f"{len(_geometria['lineas'])} líneas, {len(_geometria['textos'])} textos"
+            )
+        return _geometria
+
+
+def buscar_textos(geometria, patron):
+    """Textos del template que contienen ``patron`` (sin distinguir mayúsculas)."""
+    patron = patron.lower()
+    return [texto for texto in geometria['textos'] if patron in texto['texto'].lower()]
+
+
+def caja_para_punto(geometria, x, y):
+    """
+    La caja más pequeña que contiene el punto (x, y).
+
+    Se ignoran las cajas en las que el punto queda pegado al borde derecho
+    (sin espacio para escribir).
+
+    Returns:
+        list: [x0, y0, x1, y1] o None si ninguna caja lo contiene
+    """
+    candidatas = [
+        caja for caja in geometria['cajas']
+        if caja[0] <= x <= caja[2] - CAJA_MIN_ANCHO and caja[1] <= y <= caja[3]
+    ]
+    if not candidatas:
+        return None
+    return min(candidatas, key=lambda c: (c[2] - c[0]) * (c[3] - c[1]))
+
+
+def linea_para_punto(geometria, x, y):
+    """La línea horizontal bajo el punto (x, y), si hay una cerca."""
+    candidatas = [
+        linea for linea in geometria['lineas']
+        if linea[0] <= x <= linea[2] and 0 <= linea[1] - y <= TOLERANCIA_LINEA
+    ]
+    if not candidatas:
+        return None
+    return min(candidatas, key=lambda l: l[1] - y)
+
+
+def ajustar_campo(geometria, coords, alinear=False):
+    """
+    Ajusta un campo a la caja (o línea) que lo contiene.
+
+    Args:
+        geometria (dict): Ver extraer_geometria
+        coords (dict): {'x', 'y', 'ancho', 'fontsize'} del campo
+        alinear (bool): Mover también x al borde izquierdo de la caja y la
+            línea base al fondo de la caja
+
+    Returns:
+        dict: Coordenadas ajustadas (con 'caja' si se encontró), o None si
+            no hay caja ni línea para el punto
+    """
+    x, y = coords['x'], coords['y']
+    fontsize = coords.get('fontsize', TAMANO_FUENTE_DEFECTO)
+    nuevo = dict(coords)
+
+    caja = caja_para_punto(geometria, x, y)
+    if caja:
+        x0, _, x1, y1 = caja
+    else:
+        linea = linea_para_punto(geometria, x, y)
+        if not linea:
+            return None
+        x0, y1, x1 = linea
+        caja = [x0, y1 - fontsize, x1, y1]
+
+    if alinear:
+        nuevo['x'] = round(x0 + MARGEN_CAJA, 1)
+        # Que los trazos bajo la línea (g, j, p) no toquen el borde
+        nuevo['y'] = round(y1 - 0.3 * fontsize, 1)
+    nuevo['ancho'] = round(x1 - MARGEN_CAJA - nuevo['x'], 1)
+    nuevo['caja'] = list(caja)
+    return nuevo
+
+
+def ajustar_layout(layout, geometria, campos=None, alinear=False):
+    """
+    Ajusta los campos de texto del layout a las cajas del template.
+
+    Returns:
+        tuple: (layout ajustado, lista de campos sin caja)
+    """
+    ajustado = json.loads(json.dumps(layout))
+    sin_caja = []
+    for campo, coords in layout['campos'].items():
+        if campos and campo not in campos:
+            continue
+        nuevo = ajustar_campo(geometria, coords, alinear=alinear)
+        if nuevo is None:
+            sin_caja.append(campo)
+        else:
+            ajustado['campos'][campo] = nuevo
+    return ajustado, sin_caja
+
+
+def guardar_layout(layout, ruta=None):
+    """Guarda el layout para que pdf_generator lo use en lugar de las constantes."""
+    ruta = ruta or ruta_layout()
+    contenido = {
+        'plantilla': huella_plantilla(),
+        'campos': layout['campos'],
+        'fecha_nacimiento': layout['fecha_nacimiento'],
+        'sexo': layout['sexo'],
+        'widgets': layout.get('widgets', {}),
+    }
+    _escribir(ruta, json.dumps(contenido, ensure_ascii=False, indent=2).encode('utf-8'))
+    return ruta
+
+
+def imagen_base(dpi=DPI_PREVIEW):
+    """
+    PNG del template en blanco a la resolución dada, cacheado en memoria y disco.
+
+    Returns:
+        bytes: Imagen PNG
+    """
+    import fitz  # PyMuPDF
+
+    with _lock:
+        if dpi in _imagenes:
+            return _imagenes[dpi]
+
+        ruta = os.path.join(directorio_calibracion(), f"base_{huella_plantilla()}_{dpi}.png")
+        if os.path.exists(ruta):
+            with open(ruta, 'rb') as f:
+                imagen = f.read()
+        else:
+            with fitz_lock:
+                doc = fitz.open(stream=cargar_plantilla(), filetype='pdf')
+                imagen = doc[0].get_pixmap(dpi=dpi).tobytes('png')
+                doc.close()
+            _escribir(ruta, imagen)
+        _imagenes[dpi] = imagen
+        return imagen
+
+
+def generar_preview(layout, datos=None, dpi=DPI_PREVIEW, marcar_cajas=True, recorte=None):
+    """
+    Vista previa en PNG del formulario relleno, a baja resolución.
+
+    Se dibuja sobre la imagen cacheada del template, con el mismo código que
+    genera el PDF (pdf_generator.dibujar_formulario).
+
+    Args:
+        layout (dict): Layout a probar
+        datos (dict): Datos del empleado (por defecto DATOS_MUESTRA)
+        dpi (int): Resolución de la imagen
+        marcar_cajas (bool): Dibujar en rojo el área disponible de cada campo
+        recorte (tuple): (x0, y0, x1, y1) en puntos para ver solo una zona
+
+    Returns:
+        bytes: Imagen PNG
+    """
+    import fitz  # PyMuPDF
+
+    geometria = obtener_geometria()
+    base = imagen_base(dpi)
+
+    with fitz_lock:
+        doc = fitz.open()
+        page = doc.new_page(width=geometria['ancho'], height=geometria['alto'])
+        page.insert_image(page.rect, stream=base)
+
+        shape = page.new_shape()
+        dibujar_formulario(shape, datos or DATOS_MUESTRA, layout)
+        if marcar_cajas:
+            for coords in layout['campos'].values():
+                fontsize = coords.get('fontsize', TAMANO_FUENTE_DEFECTO)
+                shape.draw_rect(fitz.Rect(
+                    coords['x'], coords['y'] - fontsize,
+                    coords['x'] + coords['ancho'], coords['y'] + 0.3 * fontsize,
+                ))
+            shape.finish(color=(1, 0, 0), width=0.5)
+        shape.commit()
+
+        clip = fitz.Rect(recorte) if recorte else None
+        imagen = page.get_pixmap(dpi=dpi, clip=clip).tobytes('png')
+        doc.close()
+    return imagen
@@ -0,0 +1,167 @@
+"""
+Revisión de calidad de los datos de las hojas.
+
+Se ejecuta una vez por snapshot, sobre todos los registros normalizados, y
+construye un índice de las filas con problemas (fechas mal escritas, códigos
+de sexo desconocidos, cédulas duplicadas, textos que no caben en su casilla).
+Así los errores se ven todos juntos (página de calidad y comando
+``revisar_calidad``) y Recursos Humanos puede corregir la hoja de una vez, en
+lugar de descubrirlos uno a uno al generar cada PDF.
+"""
+import calendar
+import csv
+import logging
+from collections import Counter
+
+from .pdf_generator import TAMANO_FUENTE_MINIMO, medir_texto, obtener_layout
+
+logger = logging.getLogger(__name__)
+
+# Tipos de problema y su descripción para las personas que corrigen la hoja
+TIPOS_PROBLEMA = {
+    'cedula_invalida': 'Cédula vacía o con caracteres que no son dígitos',
+    'cedula_duplicada': 'Cédula repetida (solo se usa la primera fila)',
+    'campo_vacio': 'Campo obligatorio vacío',
+    'fecha_invalida': 'Fecha de nacimiento que no es una fecha AAAAMMDD válida',
+    'sexo_desconocido': 'Código de sexo distinto de 0 o 1',
+    'texto_largo': f'Texto que no cabe en su casilla ni con letra de {TAMANO_FUENTE_MINIMO} pt',
+}
+
+# Columnas del reporte en CSV
+COLUMNAS_REPORTE = ['hoja', 'fila', 'cedula', 'campo', 'tipo', 'valor', 'detalle']
+
+CAMPOS_OBLIGATORIOS = ['PRIMER_APELLIDO', 'NOMBRES', 'FECHA_NACIMIENTO']
+
+
+def _problema(sheet_name, fila, registro, campo, tipo, detalle=''):
+    return {
+        'hoja': sheet_name,
+        'fila': fila,
+        'cedula': registro['CEDULA'],
+        'campo': campo,
+        'tipo': tipo,
+        'valor': registro.get(campo, ''),
+        'detalle': detalle or TIPOS_PROBLEMA[tipo],
+    }
+
+
+def _fecha_valida(fecha):
+    if len(fecha) != 8 or not fecha.isdigit():
+        return False
+    # Sin strptime: se llama una vez por fila y es varias veces más lento
+    anio, mes, dia = int(fecha[:4]), int(fecha[4:6]), int(fecha[6:])
+    return 1900 <= anio and 1 <= mes <= 12 and 1 <= dia <= calendar.monthrange(anio, mes)[1]
+
+
+def _excede_ancho(texto, ancho):
+    # Los textos largos se reducen al escribirlos; solo es problema si no
+    # caben ni con el tamaño mínimo (misma medida que usa pdf_generator)
+    return bool(texto) and medir_texto(texto, fontsize=TAMANO_FUENTE_MINIMO) > ancho
+
+
+def revisar_registro(sheet_name, fila, registro):
+    """
+    Revisa un registro normalizado.
+
+    Args:
+        sheet_name (str): Hoja de origen
+        fila (int): Número de fila en la hoja (la 1 es la de encabezados)
+        registro (dict): Registro de normalizacion.normalizar_hoja
+
+    Returns:
+        list: Problemas encontrados (diccionarios)
+    """
+    problemas = []
+    layout = obtener_layout()
+
+    if not registro['CEDULA'].isdigit():
+        problemas.append(_problema(sheet_name, fila, registro, 'CEDULA', 'cedula_invalida'))
+
+    for campo in CAMPOS_OBLIGATORIOS:
+        if not registro[campo]:
+            problemas.append(_problema(sheet_name, fila, registro, campo, 'campo_vacio'))
+
+    fecha = registro['FECHA_NACIMIENTO']
+    if fecha and not _fecha_valida(fecha):
+        problemas.append(_problema(sheet_name, fila, registro, 'FECHA_NACIMIENTO', 'fecha_invalida'))
+
+    if registro['CODIGO_SEXO'] not in layout['sexo']:
+        problemas.append(_problema(sheet_name, fila, registro, 'CODIGO_SEXO', 'sexo_desconocido'))
+
+    for campo, coords in layout['campos'].items():
+        if _excede_ancho(registro.get(campo, ''), coords['ancho']):
+            problemas.append(_problema(sheet_name, fila, registro, campo, 'texto_largo'))
+
+    return problemas
+
+
+def revisar_snapshot(registros_por_hoja, orden_hojas):
+    """
+    Revisa todas las hojas de un snapshot.
+
+    Args:
+        registros_por_hoja (dict): {nombre_hoja: [registros normalizados]}
+        orden_hojas (list): Hojas en orden de prioridad; una cédula repetida
+            se reporta en todas las filas salvo la primera según ese orden
+
+    Returns:
+        dict: {'problemas': [...], 'por_cedula': {cedula: [...]},
+            'resumen': {tipo: cantidad}, 'filas_revisadas': int}
+    """
+    problemas = []
+    primera_fila = {}
+    filas_revisadas = 0
+
+    for sheet_name in orden_hojas:
+        for i, registro in enumerate(registros_por_hoja.get(sheet_name, [])):
+            # +2: la fila 1 de la hoja es la de encabezados
+            fila = i + 2
+            filas_revisadas += 1
+            problemas.extend(revisar_registro(sheet_name, fila, registro))
+
+            cedula = registro['CEDULA']
+            if not cedula:
+                continue
+            if cedula in primera_fila:
+                hoja_original, fila_original = primera_fila[cedula]
+                problemas.append(_problema(
+                    sheet_name, fila, registro, 'CEDULA', 'cedula_duplicada',
+                    f"Cédula repetida; se usa la fila {fila_original} de '{hoja_original}'",
+                ))
+            else:
+                primera_fila[cedula] = (sheet_name, fila)
+
+    por_cedula = {}
+    for problema in problemas:
+        por_cedula.setdefault(problema['cedula'], []).append(problema)
+
+    resumen = Counter(problema['tipo'] for problema in problemas)
+    if problemas:
+        detalle = ', '.join(f"{tipo}={cantidad}" for tipo, cantidad in sorted(resumen.items()))
+        logger.warning(f"Calidad de datos: {len(problemas)} problemas en {filas_revisadas} filas ({detalle})")
+
+    return {
+        'problemas': problemas,
+        'por_cedula': por_cedula,
+        'resumen': dict(resumen),
+        'filas_revisadas': filas_revisadas,
+    }
+
+
+def filtrar_problemas(calidad, tipo=None, hoja=None, cedula=None):
+    """Problemas del índice que cumplen los filtros dados."""
+    if cedula:
+        problemas = calidad['por_cedula'].get(cedula.strip(), [])
+    else:
+        problemas = calidad['problemas']
+    return [
+        p for p in problemas
+        if (not tipo or p['tipo'] == tipo) and (not hoja or p['hoja'] == hoja)
+    ]
+
+
+def escribir_csv(problemas, archivo):
+    """Escribe los problemas como CSV (una fila por problema) en un archivo abierto."""
+    writer = csv.DictWriter(archivo, fieldnames=COLUMNAS_REPORTE)
+    writer.writeheader()
+    writer.writerows(problemas)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .schema import cargar_esquemas, campos_faltantes
+
+
+@register()
+def revisar_esquema_hojas(app_configs, **kwargs):
+    """
+    Valida los campos del formulario contra el último esquema guardado.
+
+    No contacta a Google: usa el archivo SHEETS_ESQUEMA_ARCHIVO (generado con
+    buscar_columnas.py --guardar). Los datos descargados se validan además en
+    cada carga del snapshot.
+    """
+    try:
+        esquemas = cargar_esquemas()
+    except (OSError, ValueError):
+        esquemas = None
+
+    errores = []
+    for sheet_name, esquema in (esquemas or {}).items():
+        for campo, encabezado in campos_faltantes(esquema):
+            errores.append(Warning(
+                f"La hoja '{sheet_name}' no tiene la columna '{encabezado}' (campo {campo}).",
+                hint="Actualice schema.CAMPOS_FORMULARIO o el encabezado de la hoja.",
+                id='formatos_eps.W001',
+            ))
+    return errores
+
+
+@register()
+def revisar_layout_pdf(app_configs, **kwargs):
+    """
+    Avisa si el layout de campos se calibró con otro PDF template.
+    """
+    # Importación local: cargar el template solo al ejecutar los checks
+    from .calibracion import huella_plantilla
+    from .pdf_generator import leer_layout
+
+    try:
+        layout = leer_layout()
+        huella = huella_plantilla()
+    except (OSError, ValueError):
+        return []
+
+    if layout.get('plantilla') and layout['plantilla'] != huella:
+        return [Warning(
+            "El layout de campos del PDF se calibró con otro template.",
+            hint="Ejecute manage.py calibrar_formulario --ajustar --guardar y revise la vista previa.",
+            id='formatos_eps.W002',
+        )]
+    return []
+
+
+@register(Tags.files, deploy=True)
+def revisar_almacenamiento_lotes(app_configs, **kwargs):
+    """
+    Avisa si los ZIP de lotes quedan en el disco local.
+
+    Los genera el proceso worker y los descarga el web: en máquinas
+    distintas (dynos, contenedores) el web no los encuentra.
+    """
+    if settings.LOTES_STORAGE != 'django.core.files.storage.FileSystemStorage':
+        return []
+    return [Warning(
+        f"Los ZIP de lotes se guardan en el disco local ({settings.LOTES_DIR}).",
+        hint=(
+            "Monte LOTES_DIR como un volumen compartido por los procesos web y worker, "
+            "o configure LOTES_STORAGE con un almacenamiento remoto."
+        ),
+        id='formatos_eps.W003',
+    )]
@@ -0,0 +1,129 @@
+"""
+Interruptor de circuito para las llamadas a Google Sheets.
+
+Cuando Google falla o responde lento, cada llamada ocupa un hilo del worker
+hasta el timeout. El circuito se abre tras SHEETS_CIRCUITO_FALLOS fallos
+seguidos (una llamada más lenta que SHEETS_CIRCUITO_LENTO_S cuenta como
+fallo) y mientras está abierto las llamadas fallan de inmediato con
+CircuitoAbierto, sin tocar la red. Pasados SHEETS_CIRCUITO_ABIERTO_S
+segundos se deja pasar una sola llamada de prueba (semiabierto): si
+funciona el circuito se cierra, si no vuelve a abrirse.
+
+Las búsquedas siguen sirviéndose del último snapshot bueno (ver
+google_sheets.snapshot_desactualizado). El estado es de cada proceso.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+
+class CircuitoAbierto(ConnectionError):
+    """Google Sheets está fallando; no se intenta la llamada."""
+
+    def __init__(self, mensaje, reintentar_en=None):
+        super().__init__(mensaje)
+        # Segundos que faltan para la siguiente llamada de prueba
+        self.reintentar_en = reintentar_en
+
+
+class Circuito:
+    """Interruptor de circuito con prueba única al reabrir (thread-safe)."""
+
+    def __init__(self, fallos_max, lento_s, abierto_s):
+        self.fallos_max = fallos_max
+        self.lento_s = lento_s
+        self.abierto_s = abierto_s
+        self._estado = CERRADO
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._lock = threading.Lock()
+        self._metricas = {'aperturas': 0, 'rechazadas': 0, 'fallos': 0, 'lentas': 0}
+
+    def permite(self):
+        """True si una llamada se intentaría (no modifica el estado)."""
+        with self._lock:
+            return self._estado == CERRADO or (
+                self._estado == ABIERTO and time.monotonic() >= self._abierto_hasta
+            )
+
+    def antes(self):
+        """
+        Se llama antes de contactar a Google.
+
+        Raises:
+            CircuitoAbierto: Si el circuito está abierto o ya hay una prueba en curso
+        """
+        with self._lock:
+            if self._estado == CERRADO:
+                return
+            if self._estado == ABIERTO and time.monotonic() >= self._abierto_hasta:
+                # Solo esta llamada prueba si Google ya responde
+                self._estado = SEMIABIERTO
+                return
+            self._metricas['rechazadas'] += 1
+            restante = max(self._abierto_hasta - time.monotonic(), 0)
+        raise CircuitoAbierto(
+            f"Google Sheets no está respondiendo; nuevo intento en {restante:.0f} s",
+            reintentar_en=restante,
+        )
+
+    def cancelar(self):
+        """La llamada autorizada por antes() no llegó a hacerse."""
+        with self._lock:
+            if self._estado == SEMIABIERTO:
+                # El periodo abierto ya venció: la siguiente llamada prueba
+                self._estado = ABIERTO
+
+    def exito(self, duracion):
+        """Registra una llamada terminada; si fue lenta cuenta como fallo."""
+        if duracion > self.lento_s:
+            with self._lock:
+                self._metricas['lentas'] += 1
+            self.fallo()
+            return
+        with self._lock:
+            self._estado = CERRADO
+            self._fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self._metricas['fallos'] += 1
+            self._fallos += 1
+            if self._estado == SEMIABIERTO or self._fallos >= self.fallos_max:
+                if self._estado != ABIERTO:
+                    self._metricas['aperturas'] += 1
+                self._estado = ABIERTO
+                self._abierto_hasta = time.monotonic() + self.abierto_s
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'estado': self._estado,
+                'fallos_seguidos': self._fallos,
+                'abierto_por_s': round(max(self._abierto_hasta - time.monotonic(), 0), 1)
+                if self._estado == ABIERTO else 0,
+                **self._metricas,
+            }
+
+
+_circuito = None
+_circuito_lock = threading.Lock()
+
+
+def get_circuito():
+    """Devuelve el circuito de Google Sheets del proceso (se crea una sola vez)."""
+    global _circuito
+    if _circuito is None:
+        with _circuito_lock:
+            if _circuito is None:
+                _circuito = Circuito(
+                    fallos_max=getattr(settings, 'SHEETS_CIRCUITO_FALLOS', 3),
+                    lento_s=getattr(settings, 'SHEETS_CIRCUITO_LENTO_S', 5),
+                    abierto_s=getattr(settings, 'SHEETS_CIRCUITO_ABIERTO_S', 30),
+                )
+    return _circuito
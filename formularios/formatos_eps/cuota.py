@@ -0,0 +1,230 @@
+"""
+Límite compartido de llamadas a Google Sheets (cuota de lectura por minuto).
+
+Google limita las lecturas por minuto de la cuenta de servicio; al pasarse
+responde 429 y la petición del usuario falla. Todos los procesos (workers de
+gunicorn, revalidaciones en segundo plano, ``procesar_lotes``) comparten una
+cubeta de tokens guardada en la base de datos (modelo CuotaSheets): se
+recarga a SHEETS_CUOTA_POR_MINUTO tokens por minuto y cada lectura consume
+los suyos antes de llamar a Google.
+
+Prioridades: cada llamada se hace con la prioridad del contexto actual
+(``con_prioridad``; por defecto 'interactiva'). Las prioridades bajas solo
+pueden tomar tokens mientras la cubeta conserve su reserva, así una
+sincronización o un lote nunca agotan la cuota que necesita una búsqueda.
+Una llamada interactiva que tendría que esperar más de
+SHEETS_CUOTA_ESPERA_MAX segundos falla de inmediato con CuotaAgotada.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_CUBETA = 'google_sheets'
+
+# Fracción de la cubeta que cada prioridad debe dejar libre
+RESERVAS = {
+    'interactiva': 0.0,
+    'sincronizacion': 0.2,
+    'lote': 0.5,
+}
+# Segundos máximos de espera por prioridad (la interactiva viene de settings)
+ESPERAS_MAX = {
+    'sincronizacion': 120,
+    'lote': 600,
+}
+# Reintentos inmediatos cuando otro proceso actualizó la cubeta a la vez
+MAX_CONFLICTOS = 20
+
+_prioridad = contextvars.ContextVar('prioridad_sheets', default='interactiva')
+
+# Métricas de este worker (se muestran en la vista de estado)
+_metricas = {}
+_metricas_lock = threading.Lock()
+
+
+class CuotaAgotada(ConnectionError):
+    """No hay cuota de Google Sheets disponible dentro del tiempo de espera."""
+
+    def __init__(self, mensaje, reintentar_en=None):
+        super().__init__(mensaje)
+        # Segundos estimados hasta que haya cuota para la llamada
+        self.reintentar_en = reintentar_en
+
+
+@contextmanager
+def con_prioridad(prioridad):
+    """
+    Ejecuta el bloque con la prioridad dada ('interactiva', 'sincronizacion' o 'lote').
+
+    La prioridad vive en un contextvar: no pasa a los hilos que se lancen
+    dentro del bloque.
+    """
+    if prioridad not in RESERVAS:
+        raise ValueError(f"Prioridad desconocida: '{prioridad}'")
+    token = _prioridad.set(prioridad)
+    try:
+        yield
+    finally:
+        _prioridad.reset(token)
+
+
+def prioridad_actual():
+    return _prioridad.get()
+
+
+def _capacidad():
+    return getattr(settings, 'SHEETS_CUOTA_POR_MINUTO', 60)
+
+
+def _espera_max(prioridad):
+    if prioridad == 'interactiva':
+        return getattr(settings, 'SHEETS_CUOTA_ESPERA_MAX', 10)
+    return ESPERAS_MAX[prioridad]
+
+
+def _cubeta(capacidad):
+    from .models import CuotaSheets
+
+    cubeta, _ = CuotaSheets.objects.get_or_create(
+        nombre=NOMBRE_CUBETA,
+        defaults={'tokens': capacidad, 'actualizado': time.time()},
+    )
+    return cubeta
+
+
+def _intentar(costo, reserva, capacidad):
+    """
+    Intenta tomar ``costo`` tokens de la cubeta compartida.
+
+    Returns:
+        float: 0 si se tomaron, los segundos que faltan para que alcancen,
+            o None si otro proceso modificó la cubeta (reintentar)
+    """
+    from .models import CuotaSheets
+
+    tasa = capacidad / 60
+    cubeta = _cubeta(capacidad)
+    ahora = time.time()
+    tokens = min(capacidad, cubeta.tokens + max(ahora - cubeta.actualizado, 0) * tasa)
+
+    necesarios = costo + reserva * capacidad
+    if tokens < necesarios:
+        return (necesarios - tokens) / tasa
+
+    # Escritura condicional: solo si nadie la cambió desde la lectura
+    actualizadas = CuotaSheets.objects.filter(pk=cubeta.pk, version=cubeta.version).update(
+        tokens=tokens - costo,
+        actualizado=ahora,
+        version=F('version') + 1,
+    )
+    return 0 if actualizadas else None
+
+
+def consumir(costo=1):
+    """
+    Espera hasta tener ``costo`` lecturas disponibles y las descuenta.
+
+    Si la base de datos no responde, la llamada se deja pasar: el límite
+    protege la cuota, no debe tumbar las búsquedas.
+
+    Args:
+        costo (int): Lecturas de la API que hará la llamada
+
+    Raises:
+        CuotaAgotada: Si la espera superaría el máximo de la prioridad actual
+    """
+    capacidad = _capacidad()
+    if capacidad <= 0:
+        return
+
+    prioridad = prioridad_actual()
+    reserva = RESERVAS[prioridad]
+    limite = time.monotonic() + _espera_max(prioridad)
+    esperado = 0.0
+    conflictos = 0
+
+    while True:
+        try:
+            espera = _intentar(costo, reserva, capacidad)
+        except DatabaseError as e:
+            logger.warning(f"Cuota de Google Sheets no disponible, se omite el límite: {str(e)}")
+            break
+
+        if espera == 0:
+            break
+        if espera is None:
+            conflictos += 1
+            if conflictos > MAX_CONFLICTOS:
+                espera = 0.05
+            else:
+                continue
+
+        if time.monotonic() + espera > limite:
+            _registrar(prioridad, esperado, rechazada=True)
+            raise CuotaAgotada(
+                f"Cuota de Google Sheets agotada (prioridad {prioridad}); "
+                f"intente de nuevo en {espera:.0f} s",
+                reintentar_en=espera,
+            )
+        time.sleep(espera)
+        esperado += espera
+
+    _registrar(prioridad, esperado)
+
+
+def vaciar():
+    """
+    Deja la cubeta en cero tras un 429 de Google, para que todos los
+    procesos esperen antes de volver a llamar.
+    """
+    from .models import CuotaSheets
+
+    with _metricas_lock:
+        _metricas['respuestas_429'] = _metricas.get('respuestas_429', 0) + 1
+    try:
+        CuotaSheets.objects.filter(nombre=NOMBRE_CUBETA).update(
+            tokens=0, actualizado=time.time(), version=F('version') + 1,
+        )
+    except DatabaseError as e:
+        logger.warning(f"No se pudo vaciar la cuota de Google Sheets: {str(e)}")
+
+
+def _registrar(prioridad, espera, rechazada=False):
+    with _metricas_lock:
+        metricas = _metricas.setdefault(prioridad, {
+            'llamadas': 0, 'limitadas': 0, 'rechazadas': 0, 'espera_total_ms': 0.0, 'espera_max_ms': 0.0,
+        })
+        espera_ms = espera * 1000
+        if rechazada:
+            metricas['rechazadas'] += 1
+        else:
+            metricas['llamadas'] += 1
+        if espera_ms:
+            metricas['limitadas'] += 1
+            metricas['espera_total_ms'] += espera_ms
+            metricas['espera_max_ms'] = max(metricas['espera_max_ms'], espera_ms)
+
+
+def estadisticas():
+    """
+    Returns:
+        dict: {'por_minuto', 'respuestas_429', prioridad: {'llamadas',
+            'limitadas', 'rechazadas', 'espera_total_ms', 'espera_max_ms'}}
+    """
+    with _metricas_lock:
+        datos = {'por_minuto': _capacidad(), 'respuestas_429': _metricas.get('respuestas_429', 0)}
+        for prioridad in RESERVAS:
+            if prioridad in _metricas:
+                datos[prioridad] = {
+                    clave: round(valor, 1) if isinstance(valor, float) else valor
+                    for clave, valor in _metricas[prioridad].items()
+                }
+        return datos
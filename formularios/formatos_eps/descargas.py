@@ -0,0 +1,144 @@
+"""
+Respuestas de descarga con soporte de peticiones por rangos (HTTP Range).
+
+Permiten reanudar una descarga interrumpida pidiendo solo los bytes que
+faltan, tanto de un contenido en memoria (PDF generado) como de un archivo
+en disco (archivos de lotes). Los archivos se envían en bloques, sin
+cargarlos completos en memoria.
+
+Solo se soporta un rango por petición; un Range con varios rangos se
+responde con el contenido completo (200), como permite el RFC 9110.
+"""
+import os
+import re
+
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+# Tamaño de los bloques al enviar archivos
+TAMANO_BLOQUE = 64 * 1024
+
+_RANGO_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parsear_rango(cabecera, total):
+    """
+    Interpreta una cabecera Range de un solo rango.
+
+    Args:
+        cabecera (str): Valor de la cabecera (ej: 'bytes=100-199', 'bytes=-500')
+        total (int): Tamaño total del contenido
+
+    Returns:
+        tuple: (inicio, fin) inclusivos, None si la cabecera no aplica
+            (se responde completo) o 'invalido' si el rango no es satisfacible
+    """
+    coincidencia = _RANGO_RE.match(cabecera.strip().replace(' ', ''))
+    if not coincidencia:
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+
+    if not inicio:
+        # Sufijo: los últimos N bytes
+        longitud = int(fin)
+        if longitud == 0:
+            return 'invalido'
+        return max(total - longitud, 0), total - 1
+
+    inicio = int(inicio)
+    fin = int(fin) if fin else total - 1
+    if inicio >= total or fin < inicio:
+        return 'invalido'
+    return inicio, min(fin, total - 1)
+
+
+def _if_range_valido(request, etag, last_modified):
+    """
+    Indica si se debe atender el Range según la cabecera If-Range.
+
+    Si el recurso cambió desde la primera parte de la descarga, se envía
+    completo para no mezclar bytes de dos versiones.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Solo un ETag fuerte permite combinar rangos
+        return etag is not None and if_range == quote_etag(etag)
+    fecha = parse_http_date_safe(if_range)
+    return fecha is not None and last_modified is not None and int(last_modified) == fecha
+
+
+def _iterar_archivo(ruta, inicio, longitud):
+    with open(ruta, 'rb') as f:
+        f.seek(inicio)
+        pendiente = longitud
+        while pendiente > 0:
+            bloque = f.read(min(TAMANO_BLOQUE, pendiente))
+            if not bloque:
+                break
+            pendiente -= len(bloque)
+            yield bloque
+
+
+def respuesta_descarga(request, content_type, filename, contenido=None, ruta=None,
+                       etag=None, last_modified=None, as_attachment=True):
+    """
+    Construye la respuesta de descarga, completa (200) o parcial (206/416).
+
+    Args:
+        request: Petición de Django
+        content_type (str): Tipo MIME
+        filename (str): Nombre del archivo para Content-Disposition
+        contenido (bytes): Contenido en memoria (o usar ``ruta``)
+        ruta (str): Archivo en disco (o usar ``contenido``)
+        etag (str): ETag fuerte del contenido, sin comillas; se envía en la
+            respuesta y se compara con If-Range
+        last_modified (float): Timestamp de modificación; se envía como
+            Last-Modified y se compara con If-Range
+        as_attachment (bool): Descargar en vez de mostrar en el navegador
+
+    Returns:
+        HttpResponse: Respuesta lista para devolver desde la vista
+    """
+    total = len(contenido) if contenido is not None else os.path.getsize(ruta)
+
+    rango = None
+    cabecera_rango = request.META.get('HTTP_RANGE')
+    if cabecera_rango and request.method in ('GET', 'HEAD') and _if_range_valido(request, etag, last_modified):
+        rango = parsear_rango(cabecera_rango, total)
+
+    if rango == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{total}"
+    elif rango:
+        inicio, fin = rango
+        longitud = fin - inicio + 1
+        if contenido is not None:
+            response = HttpResponse(contenido[inicio:fin + 1], status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                _iterar_archivo(ruta, inicio, longitud), status=206, content_type=content_type
+            )
+        response['Content-Range'] = f"bytes {inicio}-{fin}/{total}"
+        response['Content-Length'] = str(longitud)
+    elif contenido is not None:
+        response = HttpResponse(contenido, content_type=content_type)
+    else:
+        # FileResponse envía el archivo en bloques (o con sendfile si el servidor lo soporta)
+        response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+        response.block_size = TAMANO_BLOQUE
+        response['Content-Length'] = str(total)
+
+    response['Accept-Ranges'] = 'bytes'
+    # Validadores que el cliente devuelve en If-Range al reanudar la descarga
+    if etag is not None:
+        response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if response.status_code != 416:
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
@@ -1,15 +1,49 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import logging
 import os
 import json
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from .calidad import revisar_snapshot
+from .circuito import get_circuito
+from .cuota import con_prioridad
+from .ingesta import ingerir_hoja
+from .normalizacion import normalizar_hoja
+from .schema import CAMPOS_FORMULARIO, encabezados_unicos, obtener_esquema, registrar_encabezados
+from .sheets_backends import get_backend
+from .snapshot import (
+    ARCHIVO_META, EscrituraSnapshot, bloqueo, cargar_snapshot, guardar_snapshot, iterar_hoja, leer_meta,
+    parchar_hoja, parches_desde, version, version_guardada,
+)
+from .sugerencias import actualizar_indice, construir_indice
 
 # Google Sheets API setup
 SCOPE = ["https://www.googleapis.com/auth/spreadsheets"]
 SPREADSHEET_ID = '1OzyM4jlADde1MKU7INbtXvVOUaqD1KfZH_gFLOciwNk'
 
+# Hojas que se consultan, en orden de prioridad de búsqueda
+HOJAS = ['Planta', 'Manipuladoras']
+
 # Lazy loading del client para evitar errores al importar
 _client = None
+_client_lock = threading.Lock()
+
+# Snapshot en memoria de todas las hojas (ver get_snapshot). Se reemplaza
+# completo en cada refresco, así que leerlo no requiere lock; los locks solo
+# protegen la carga inicial, la descarga y el indicador de refresco en curso.
+_snapshot = None
+_carga_lock = threading.Lock()
+_descarga_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+_refresco_en_curso = False
+
+# Momento del último refresco fallido (None si el último funcionó)
+_fallo_refresco = None
+
+# Última revisión del snapshot en disco (ver _disco_mas_reciente)
+_disco_revisado = 0.0
+_mtime_disco = None
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +55,9 @@ def get_credentials():
     1. Variable de entorno GOOGLE_CREDENTIALS (JSON string) - Para producción
     2. Archivo service_account.json - Para desarrollo local
     """
+    # Importación perezosa: google-auth solo se carga si se usa Google Sheets
+    from google.oauth2.service_account import Credentials
+
     # Intentar obtener desde variable de entorno (Railway, producción)
     google_creds_env = os.environ.get('GOOGLE_CREDENTIALS')
 
@@ -58,76 +95,658 @@ def get_credentials():
     )
 
 def get_client():
+    """
+    Devuelve el cliente de gspread del proceso, creándolo la primera vez.
+
+    Con workers de varios hilos, el lock evita que dos peticiones autoricen
+    el cliente a la vez; después de creado se lee sin lock.
+    """
     global _client
     if _client is None:
-        try:
-            creds = get_credentials()
-            _client = gspread.authorize(creds)
-            logger.info("Cliente de Google Sheets autorizado exitosamente")
-        except Exception as e:
-            logger.error(f"Error al conectar con Google Sheets: {str(e)}")
-            raise ConnectionError(f"No se pudo conectar con Google Sheets. Verifique las credenciales: {str(e)}")
+        with _client_lock:
+            if _client is None:
+                # Importación perezosa: gspread solo se carga si se usa Google Sheets
+                import gspread
+
+                try:
+                    creds = get_credentials()
+                    client = gspread.authorize(creds)
+                    # Sin timeout, una llamada lenta bloquea el hilo indefinidamente
+                    client.set_timeout(getattr(settings, 'SHEETS_TIMEOUT', 15))
+                    _client = client
+                    logger.info("Cliente de Google Sheets autorizado exitosamente")
+                except Exception as e:
+                    logger.error(f"Error al conectar con Google Sheets: {str(e)}")
+                    raise ConnectionError(f"No se pudo conectar con Google Sheets. Verifique las credenciales: {str(e)}")
     return _client
 
+def reiniciar_cliente():
+    """Descarta el cliente actual; el siguiente get_client lo vuelve a autorizar."""
+    global _client
+    with _client_lock:
+        _client = None
+
+def construir_registros(all_values):
+    """
+    Convierte las filas de una hoja (con encabezados) en diccionarios.
+
+    Args:
+        all_values (list): Filas de la hoja; la primera es de encabezados
+
+    Returns:
+        list: Lista de diccionarios {encabezado: valor}
+    """
+    if not all_values:
+        return []
+
+    # Primera fila son los encabezados; manejar columnas duplicadas
+    # agregando sufijos
+    unique_headers = encabezados_unicos(all_values[0])
+
+    # Convertir las filas a diccionarios
+    records = []
+    for row in all_values[1:]:  # Saltar encabezados
+        # Asegurar que la fila tenga la misma longitud que los encabezados
+        row_data = row + [''] * (len(unique_headers) - len(row))
+        record = dict(zip(unique_headers, row_data))
+        records.append(record)
+
+    return records
+
 def get_sheet_data(sheet_name):
     try:
-        client = get_client()
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
-
-        # Obtener todos los valores como lista (no diccionario)
-        all_values = sheet.get_all_values()
-
-        if not all_values:
-            return []
-
-        # Primera fila son los encabezados
-        headers = all_values[0]
-
-        # Manejar columnas duplicadas agregando sufijos
-        seen = {}
-        unique_headers = []
-        for header in headers:
-            if header in seen:
-                seen[header] += 1
-                unique_headers.append(f"{header}_{seen[header]}")
-            else:
-                seen[header] = 0
-                unique_headers.append(header)
-
-        # Convertir las filas a diccionarios
-        records = []
-        for row in all_values[1:]:  # Saltar encabezados
-            # Asegurar que la fila tenga la misma longitud que los encabezados
-            row_data = row + [''] * (len(unique_headers) - len(row))
-            record = dict(zip(unique_headers, row_data))
-            records.append(record)
-
-        return records
+        # Obtener todos los valores como lista (no diccionario) desde el
+        # backend configurado (Google Sheets, archivo local o fake)
+        all_values = get_backend().obtener_valores(sheet_name)
+        return construir_registros(all_values)
     except Exception as e:
         logger.error(f"Error al obtener datos de la hoja '{sheet_name}': {str(e)}")
         raise
 
-def find_row_by_cedula(cedula):
+def _publicar_snapshot(hojas, fecha, origen, parchado=None):
+    """
+    Normaliza las hojas y publica el snapshot (ver _publicar_registros).
+    """
+    for sheet_name, filas in hojas.items():
+        registrar_encabezados(sheet_name, filas[0] if filas else [])
+
+    registros = {sheet_name: normalizar_hoja(hojas.get(sheet_name, [])) for sheet_name in HOJAS}
+    return _publicar_registros(registros, fecha, origen, hojas=hojas, parchado=parchado)
+
+def _publicar_registros(registros, fecha, origen, hojas=None, parchado=None):
+    """
+    Construye el índice por cédula y reemplaza el snapshot actual.
+
+    El índice guarda los registros ya normalizados (ver normalizacion), así
+    una búsqueda devuelve directamente lo que se muestra y se imprime. La
+    revisión de calidad (ver calidad) y el índice de sugerencias (ver
+    sugerencias) también se hacen aquí, una sola vez.
+
+    El snapshot publicado nunca se modifica: cada refresco crea uno nuevo y
+    lo asigna de una vez, así los lectores no necesitan lock.
+
+    Args:
+        registros (dict): {nombre_hoja: registros normalizados}
+        fecha (float): Inicio de la última descarga completa (timestamp);
+            de ella dependen SHEETS_CACHE_TTL y el Last-Modified
+        origen (str): 'google' o 'disco' (los parches usan _publicar_parche)
+        hojas (dict): Filas originales de cada hoja; None con la ingesta
+            por streaming, que no las conserva en memoria
+        parchado (float): Momento del último parche del webhook desde esa
+            descarga (None si no hubo)
+    """
+    global _snapshot, _fallo_refresco
+
+    if origen == 'google':
+        _fallo_refresco = None
+
+    indice = {}
+    # Planta tiene prioridad sobre Manipuladoras si una cédula está en ambas
+    for sheet_name in HOJAS:
+        for registro in registros[sheet_name]:
+            cedula_row = registro['CEDULA']
+            if cedula_row and cedula_row not in indice:
+                indice[cedula_row] = registro
+
+    _snapshot = {
+        'hojas': hojas,
+        'registros': registros,
+        'fecha': fecha,
+        'parchado': parchado,
+        'origen': origen,
+        'indice': indice,
+        # Problemas de datos, revisados una sola vez por snapshot
+        'calidad': revisar_snapshot(registros, HOJAS),
+        # Búsqueda por prefijo de cédula, apellidos y nombres
+        'sugerencias': construir_indice(indice),
+    }
+    return _snapshot
+
+def _primer_registro(registros, cedula):
+    """Primera fila con una cédula, en el orden de prioridad de HOJAS (o None)."""
+    for sheet_name in HOJAS:
+        for registro in registros[sheet_name]:
+            if registro['CEDULA'] == cedula:
+                return registro
+    return None
+
+def _actualizar_indice(indice, registros, anteriores, nuevos):
+    """
+    Copia del índice por cédula con los cambios de un parche.
+
+    Solo se miran las cédulas de las filas parchadas. Si una fila conserva su
+    cédula, su registro nuevo reemplaza al anterior (si era el del índice);
+    una cédula que aparece por primera vez se agrega directamente. Solo
+    cuando una cédula cambia y puede estar en otra fila (la que se quitó era
+    la del índice, o la nueva ya estaba) se busca su primera fila en las
+    hojas, con la misma prioridad que en _publicar_registros.
+
+    Args:
+        indice (dict): {cedula: registro}; no se modifica
+        registros (dict): Registros ya parchados
+        anteriores (list): Registros reemplazados (ver _aplicar_a_registros)
+        nuevos (list): Registros nuevos, en las mismas posiciones
+
+    Returns:
+        tuple: (índice nuevo, {cedula: registro o None} con las entradas
+            que cambiaron)
+    """
+    indice = dict(indice)
+    cambios = {}
+    revisar = set()
+    for i, nuevo in enumerate(nuevos):
+        anterior = anteriores[i] if i < len(anteriores) else None
+        cedula = nuevo['CEDULA']
+        if anterior is not None and anterior['CEDULA'] == cedula:
+            # Una fila repetida no está en el índice: no cambia nada
+            if cedula and indice.get(cedula) is anterior:
+                indice[cedula] = cambios[cedula] = nuevo
+            continue
+
+        if anterior is not None and indice.get(anterior['CEDULA']) is anterior:
+            revisar.add(anterior['CEDULA'])
+        if cedula in indice:
+            revisar.add(cedula)
+        elif cedula:
+            indice[cedula] = cambios[cedula] = nuevo
+
+    for cedula in revisar:
+        registro = _primer_registro(registros, cedula)
+        if registro is None:
+            del indice[cedula]
+        else:
+            indice[cedula] = registro
+        cambios[cedula] = registro
+    return indice, cambios
+
+def _publicar_parche(snapshot, registros, hojas, parchado, anteriores, nuevos):
+    """
+    Publica un snapshot con un parche del webhook aplicado.
+
+    A diferencia de _publicar_registros, el trabajo depende solo de las
+    filas parchadas: el índice y las sugerencias se copian y se actualizan
+    en las cédulas afectadas. La revisión de calidad se conserva hasta el
+    siguiente refresco completo (a lo sumo SHEETS_CACHE_TTL, porque el
+    parche no cambia ``fecha``): revisar cada fila cuesta demasiado para
+    hacerlo en cada edición.
+
+    Args:
+        snapshot (dict): Snapshot al que se aplicó el parche
+        registros (dict): Registros ya parchados
+        hojas (dict): Filas originales ya parchadas (None con streaming)
+        parchado (float): Momento del parche
+        anteriores (list): Registros reemplazados
+        nuevos (list): Registros nuevos
+
+    Returns:
+        dict: El snapshot publicado
+    """
+    global _snapshot
+
+    indice, cambios = _actualizar_indice(snapshot['indice'], registros, anteriores, nuevos)
+    _snapshot = dict(
+        snapshot,
+        hojas=hojas,
+        registros=registros,
+        parchado=parchado,
+        origen='webhook',
+        indice=indice,
+        sugerencias=actualizar_indice(snapshot['sugerencias'], cambios) if cambios else snapshot['sugerencias'],
+    )
+    return _snapshot
+
+def refrescar_snapshot():
+    """
+    Descarga todas las hojas, publica el nuevo snapshot y lo guarda en disco.
+
+    Returns:
+        dict: El snapshot publicado
+    """
+    if getattr(settings, 'SHEETS_INGESTA', 'completa') == 'streaming':
+        return _refrescar_por_streaming()
+
+    backend = get_backend()
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+    # Una sola descarga a la vez por proceso
+    with _descarga_lock:
+        # Las filas son al menos tan nuevas como el inicio de la descarga
+        fecha = time.time()
+        hojas = {sheet_name: backend.obtener_valores(sheet_name) for sheet_name in HOJAS}
+
+        parchado = None
+        if directorio:
+            try:
+                with bloqueo(directorio):
+                    parches = parches_desde(directorio, fecha)
+                    for parche in parches:
+                        hojas = _aplicar_a_hojas(hojas, parche['hoja'], parche['fila_inicio'], parche['filas'])
+                    parchado = parches[-1]['parchado'] if parches else None
+                    if _descarga_posterior_en_disco(directorio, fecha):
+                        logger.info("Otro worker guardó una descarga más nueva; no se sobrescribe")
+                    else:
+                        guardar_snapshot(directorio, hojas, fecha, parchado)
+            except OSError as e:
+                # El snapshot en memoria es válido; el disco es para el arranque y los demás workers
+                logger.warning(f"No se pudo guardar el snapshot en disco: {str(e)}")
+
+        snapshot = _publicar_snapshot(hojas, fecha, 'google', parchado=parchado)
+    logger.info(f"Snapshot de hojas actualizado ({len(snapshot['indice'])} cédulas)")
+
+    return snapshot
+
+def _descarga_posterior_en_disco(directorio, fecha):
+    """
+    True si otro worker ya guardó una descarga que empezó después de
+    ``fecha``: guardar la nuestra encima volvería a datos más viejos.
+    """
+    meta = leer_meta(directorio)
+    return meta is not None and meta['fecha'] > fecha
+
+def _refrescar_por_streaming():
+    """
+    Igual que refrescar_snapshot, pero leyendo las filas una a una (ver
+    ingesta). Las filas originales se copian a disco mientras pasan, en vez
+    de guardarse en memoria.
+    """
+    backend = get_backend()
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+
+    with _descarga_lock:
+        fecha = time.time()
+        escritura = None
+        if directorio:
+            try:
+                escritura = EscrituraSnapshot(directorio)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el snapshot en disco: {str(e)}")
+
+        try:
+            registros = {}
+            for sheet_name in HOJAS:
+                escritor = escritura.abrir_hoja(sheet_name) if escritura else None
+                registros[sheet_name] = ingerir_hoja(backend.iterar_filas(sheet_name), sheet_name, escritor)
+        except Exception:
+            if escritura:
+                escritura.descartar()
+            raise
+
+        parchado = None
+        if escritura:
+            try:
+                with bloqueo(directorio):
+                    parches = parches_desde(directorio, fecha)
+                    for parche in parches:
+                        registros, _, _ = _aplicar_a_registros(
+                            registros, parche['hoja'], parche['fila_inicio'], parche['filas'],
+                        )
+                    parchado = parches[-1]['parchado'] if parches else None
+                    if _descarga_posterior_en_disco(directorio, fecha):
+                        logger.info("Otro worker guardó una descarga más nueva; no se sobrescribe")
+                        escritura.descartar()
+                    else:
+                        escritura.aplicar_parches(parches)
+                        escritura.confirmar(fecha, parchado)
+            except OSError as e:
+                # El snapshot en memoria es válido; el disco es para el arranque y los demás workers
+                escritura.descartar()
+                logger.warning(f"No se pudo guardar el snapshot en disco: {str(e)}")
+
+        snapshot = _publicar_registros(registros, fecha, 'google', parchado=parchado)
+    logger.info(f"Snapshot de hojas actualizado por streaming ({len(snapshot['indice'])} cédulas)")
+
+    return snapshot
+
+def _refrescar_en_hilo(funcion):
+    """Ejecuta ``funcion`` en un hilo, si no hay otro refresco en curso."""
+    global _refresco_en_curso
+    with _snapshot_lock:
+        if _refresco_en_curso:
+            return
+        _refresco_en_curso = True
+
+    def _refrescar():
+        global _refresco_en_curso, _fallo_refresco
+        try:
+            # Cede la cuota de Google a las búsquedas de los usuarios
+            with con_prioridad('sincronizacion'):
+                funcion()
+        except Exception as e:
+            # Se sigue sirviendo el último snapshot bueno
+            _fallo_refresco = time.time()
+            logger.error(f"Error al revalidar el snapshot de hojas: {str(e)}")
+        finally:
+            with _snapshot_lock:
+                _refresco_en_curso = False
+            # Conexión a la base de datos abierta por la cuota en este hilo
+            connection.close()
+
+    threading.Thread(target=_refrescar, name='sheets-refresh', daemon=True).start()
+
+def revalidar_en_segundo_plano():
+    """Lanza un refresco del snapshot en un hilo, si no hay otro en curso."""
+    _refrescar_en_hilo(refrescar_snapshot)
+
+def _disco_mas_reciente(snapshot):
+    """
+    True si otro proceso guardó en disco un snapshot más nuevo que ``snapshot``.
+
+    Se revisa como mucho cada SHEETS_SNAPSHOT_VERIFICAR segundos y solo se
+    lee el ``snapshot.json`` si cambió su fecha de modificación. Así los
+    cambios aplicados por el webhook en un worker (o un refresco completo)
+    llegan a los demás sin llamar a Google.
+    """
+    global _disco_revisado, _mtime_disco
+
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+    intervalo = getattr(settings, 'SHEETS_SNAPSHOT_VERIFICAR', 2)
+    ahora = time.monotonic()
+    if not directorio or intervalo <= 0 or ahora - _disco_revisado < intervalo:
+        return False
+    _disco_revisado = ahora
+
     try:
-        planta_data = get_sheet_data('Planta')
-        manipuladoras_data = get_sheet_data('Manipuladoras')
+        mtime = os.stat(os.path.join(directorio, ARCHIVO_META)).st_mtime
+    except OSError:
+        return False
+    if mtime == _mtime_disco:
+        return False
 
-        # Limpiar la cédula de búsqueda (eliminar espacios)
-        cedula_limpia = str(cedula).strip()
+    guardada = version_guardada(directorio)
+    if guardada is not None and guardada > version(snapshot):
+        # La fecha de modificación la anota _recargar_de_disco cuando la
+        # recarga funciona; si ahora no se hace (otro refresco en curso), se
+        # vuelve a intentar en la siguiente revisión
+        return True
+    _mtime_disco = mtime
+    return False
+
+def _recargar_de_disco():
+    """Publica el snapshot que guardó otro worker, si es más nuevo que el actual."""
+    global _mtime_disco
+
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+    # Con el lock de descarga un parche de este worker no se pierde a medias
+    with _descarga_lock:
+        try:
+            mtime = os.stat(os.path.join(directorio, ARCHIVO_META)).st_mtime
+        except OSError:
+            return
+        guardada = version_guardada(directorio)
+        if guardada is None:
+            return
+        if _snapshot is None or guardada > version(_snapshot):
+            if cargar_snapshot_de_disco() is None:
+                return
+        _mtime_disco = mtime
+
+def cargar_snapshot_de_disco():
+    """
+    Publica el snapshot guardado en disco, sin contactar a Google.
+
+    Lo usa el warm-up del proceso maestro de gunicorn (antes del fork), donde
+    no se deben abrir conexiones ni lanzar hilos.
+
+    Returns:
+        dict: El snapshot publicado, o None si no hay snapshot en disco
+    """
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+    if not directorio:
+        return None
+    if getattr(settings, 'SHEETS_INGESTA', 'completa') == 'streaming':
+        return _cargar_de_disco_por_streaming(directorio)
+
+    guardado = cargar_snapshot(directorio)
+    if not guardado:
+        return None
+
+    hojas, meta = guardado
+    return _publicar_snapshot(hojas, meta['fecha'], 'disco', parchado=meta.get('parchado'))
+
+def _cargar_de_disco_por_streaming(directorio):
+    """
+    Igual que cargar_snapshot_de_disco, pero leyendo los CSV fila a fila (ver
+    ingesta): las filas originales no se guardan en memoria.
+    """
+    meta = leer_meta(directorio)
+    if meta is None:
+        return None
+
+    inicio = time.perf_counter()
+    try:
+        registros = {
+            sheet_name: ingerir_hoja(iterar_hoja(directorio, sheet_name), sheet_name)
+            if sheet_name in meta['hojas'] else []
+            for sheet_name in HOJAS
+        }
+    except (OSError, ValueError) as e:
+        logger.warning(f"Snapshot en disco inválido, se ignora: {str(e)}")
+        return None
+
+    logger.info(f"Snapshot cargado desde disco por streaming en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    return _publicar_registros(registros, meta['fecha'], 'disco', parchado=meta.get('parchado'))
+
+def get_snapshot():
+    """
+    Devuelve el snapshot actual de las hojas.
+
+    Al arrancar se carga el último snapshot guardado en disco y se revalida
+    contra Google en segundo plano. Si no hay snapshot en disco, se descarga
+    de forma síncrona. Cuando el snapshot supera SHEETS_CACHE_TTL se sigue
+    sirviendo mientras se refresca en segundo plano.
+    """
+    snapshot = _snapshot
+
+    if snapshot is None:
+        with _carga_lock:
+            snapshot = _snapshot
+            if snapshot is None:
+                snapshot = cargar_snapshot_de_disco()
+                if snapshot:
+                    revalidar_en_segundo_plano()
+                else:
+                    snapshot = refrescar_snapshot()
+        return snapshot
+
+    ttl = getattr(settings, 'SHEETS_CACHE_TTL', 300)
+    if _disco_mas_reciente(snapshot):
+        _refrescar_en_hilo(_recargar_de_disco)
+    elif time.time() - snapshot['fecha'] > ttl and get_circuito().permite():
+        # Con el circuito abierto no se lanza un hilo por petición: se sigue
+        # sirviendo este snapshot hasta que toque volver a probar
+        revalidar_en_segundo_plano()
+
+    return snapshot
+
+def _reemplazar_filas(lista, inicio, nuevas, vacia):
+    """
+    Copia de ``lista`` con ``nuevas`` desde la posición ``inicio``.
+
+    Se rellena con ``vacia()`` si el rango pasa del final de la lista.
+    """
+    lista = list(lista)
+    if len(lista) < inicio + len(nuevas):
+        lista.extend(vacia() for _ in range(inicio + len(nuevas) - len(lista)))
+    lista[inicio:inicio + len(nuevas)] = nuevas
+    return lista
+
+def _aplicar_a_registros(registros, sheet_name, fila_inicio, filas):
+    """
+    Reemplaza los registros de un rango de filas de una hoja.
+
+    Args:
+        registros (dict): {nombre_hoja: registros normalizados}; no se modifica
+        sheet_name (str): Hoja
+        fila_inicio (int): Primera fila (numeración de la hoja, > 1)
+        filas (list): Filas nuevas de la hoja, desde fila_inicio
 
-        for row in planta_data:
-            # Comparar limpiando espacios en blanco
-            cedula_row = str(row.get('CEDULA', '')).strip()
-            if cedula_row == cedula_limpia:
-                return row
+    Returns:
+        tuple: (copia de ``registros`` con el cambio, registros reemplazados,
+            registros nuevos)
+    """
+    esquema = obtener_esquema(sheet_name)
+    encabezados = sorted(esquema, key=esquema.get)
+    nuevos = normalizar_hoja([encabezados] + filas)
+
+    # Posición en la lista de registros: la fila 2 es la primera
+    inicio = fila_inicio - 2
+    anteriores = registros[sheet_name][inicio:inicio + len(nuevos)]
+
+    # Filas vacías al final: Google no las devuelve, así que se quitan
+    registro_vacio = normalizar_hoja([encabezados, []])[0]
+    registros = dict(registros)
+    registros[sheet_name] = lista = _reemplazar_filas(
+        registros[sheet_name], inicio, nuevos, lambda: registro_vacio,
+    )
+    while lista and not any(lista[-1][campo] for campo in CAMPOS_FORMULARIO):
+        lista.pop()
+    return registros, anteriores, nuevos
+
+def _aplicar_a_hojas(hojas, sheet_name, fila_inicio, filas):
+    """
+    Igual que _aplicar_a_registros, sobre las filas originales de las hojas.
+
+    Returns:
+        dict: Copia de ``hojas`` con el cambio
+    """
+    if sheet_name not in hojas:
+        return hojas
+    hojas = dict(hojas)
+    hojas[sheet_name] = lista = _reemplazar_filas(hojas[sheet_name], fila_inicio - 1, filas, list)
+    while lista and not any(celda.strip() for celda in lista[-1]):
+        lista.pop()
+    return hojas
+
+def aplicar_cambios(sheet_name, fila_inicio, fila_fin):
+    """
+    Actualiza en el snapshot solo las filas editadas de una hoja.
+
+    Se descargan de Google únicamente esas filas, se normalizan y se
+    reemplazan en una copia de los registros; el índice y las sugerencias
+    se actualizan solo en las cédulas afectadas (ver _publicar_parche) y se
+    publica un snapshot nuevo. El snapshot en disco se parcha igual, y los
+    demás workers lo recargan al ver su fecha (ver _disco_mas_reciente).
+
+    No sirve para filas insertadas o eliminadas (desplazan las demás) ni
+    para la fila de encabezados: en esos casos hay que refrescar todo.
+
+    Args:
+        sheet_name (str): Hoja editada (una de HOJAS)
+        fila_inicio (int): Primera fila editada (numeración de la hoja, > 1)
+        fila_fin (int): Última fila editada
+
+    Returns:
+        dict: {'anteriores': registros reemplazados, 'nuevos': registros
+            nuevos}
+
+    Raises:
+        ValueError: Si la hoja no existe o el rango incluye los encabezados
+    """
+    if sheet_name not in HOJAS:
+        raise ValueError(f"Hoja desconocida: '{sheet_name}'")
+    if not 1 < fila_inicio <= fila_fin:
+        raise ValueError("El rango debe empezar después de la fila de encabezados")
+
+    # Fuera del lock: la carga inicial también toma _descarga_lock
+    get_snapshot()
+    directorio = getattr(settings, 'SHEETS_SNAPSHOT_DIR', '')
+
+    with _descarga_lock:
+        snapshot = _snapshot
+        # Partir del snapshot más nuevo si otro worker ya guardó uno
+        if directorio and (version_guardada(directorio) or (0, 0)) > version(snapshot):
+            snapshot = cargar_snapshot_de_disco() or snapshot
+
+        # Antes de leer: una descarga que empiece después ya trae estas filas
+        parchado = time.time()
+        filas = get_backend().obtener_filas(sheet_name, fila_inicio, fila_fin)
+        registros, anteriores, nuevos = _aplicar_a_registros(snapshot['registros'], sheet_name, fila_inicio, filas)
+        hojas = snapshot['hojas']
+        if hojas is not None:
+            hojas = _aplicar_a_hojas(hojas, sheet_name, fila_inicio, filas)
+
+        # La fecha de la descarga completa no cambia: el parche no reinicia
+        # SHEETS_CACHE_TTL, así las inserciones y eliminaciones de filas (que
+        # el webhook no ve) se corrigen en el siguiente refresco completo
+        _publicar_parche(snapshot, registros, hojas, parchado, anteriores, nuevos)
 
-        for row in manipuladoras_data:
-            # Comparar limpiando espacios en blanco
-            cedula_row = str(row.get('CEDULA', '')).strip()
-            if cedula_row == cedula_limpia:
-                return row
+        if directorio:
+            try:
+                with bloqueo(directorio):
+                    parchar_hoja(directorio, sheet_name, fila_inicio, filas, parchado)
+            except OSError as e:
+                logger.warning(f"No se pudo parchar el snapshot en disco: {str(e)}")
 
+    logger.info(f"Snapshot parchado: '{sheet_name}' filas {fila_inicio}-{fila_fin}")
+    return {'anteriores': anteriores, 'nuevos': nuevos}
+
+def fecha_modificacion(snapshot):
+    """
+    Última modificación de los datos de un snapshot (para Last-Modified).
+
+    Un parche del webhook no cambia ``fecha`` (ver aplicar_cambios), así
+    que se toma la más reciente entre la descarga completa y el último
+    parche; si no, un If-Modified-Since respondería 304 con datos viejos.
+
+    Returns:
+        float: Timestamp
+    """
+    return max(snapshot['fecha'], snapshot.get('parchado') or 0)
+
+def snapshot_desactualizado():
+    """
+    Fecha de los datos si no se pudieron actualizar, para avisar al usuario.
+
+    Solo mira el snapshot ya cargado (nunca dispara una descarga).
+
+    Returns:
+        float: Timestamp del snapshot que se está sirviendo si el último
+            refresco falló o el circuito de Google está abierto; None si los
+            datos están al día
+    """
+    snapshot = _snapshot
+    if snapshot is None:
         return None
+    ttl = getattr(settings, 'SHEETS_CACHE_TTL', 300)
+    vencido = time.time() - snapshot['fecha'] > ttl
+    if vencido and (_fallo_refresco is not None or not get_circuito().permite()):
+        return snapshot['fecha']
+    return None
+
+def find_row_by_cedula(cedula):
+    """
+    Busca un empleado en el snapshot por cédula.
+
+    Returns:
+        dict: Registro normalizado (ver normalizacion.normalizar_hoja), o
+            None si la cédula no existe. No se debe modificar.
+    """
+    try:
+        snapshot = get_snapshot()
+
+        # Limpiar la cédula de búsqueda (eliminar espacios)
+        cedula_limpia = str(cedula).strip()
+
+        return snapshot['indice'].get(cedula_limpia)
     except ConnectionError:
         raise
     except Exception as e:
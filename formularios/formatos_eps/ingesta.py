@@ -0,0 +1,102 @@
+"""
+Ingesta por streaming de las hojas, con memoria acotada.
+
+La ingesta completa (``obtener_valores`` + ``normalizar_hoja``) tiene en
+memoria a la vez la respuesta entera, todas las filas con todas sus columnas
+y los registros normalizados. Con hojas de cientos de miles de filas y
+decenas de columnas el pico es varias veces el tamaño final del snapshot.
+
+Aquí las filas llegan una a una (``SheetsBackend.iterar_filas``), de cada
+una se guardan solo las columnas del formulario y se normalizan por bloques
+de TAMANO_BLOQUE filas. Lo único que crece con la hoja son los registros
+normalizados, que son lo que de todas formas publica el snapshot. Las filas
+originales se pueden copiar a disco a medida que pasan (ver
+snapshot.EscrituraSnapshot), sin acumularlas.
+"""
+from itertools import islice
+
+from .normalizacion import normalizar_hoja
+from .schema import CAMPOS_FORMULARIO, registrar_encabezados
+
+# Filas que se normalizan juntas (las columnas de un bloque viven a la vez)
+TAMANO_BLOQUE = 5000
+
+# Encabezados de las filas proyectadas: uno por campo del formulario
+ENCABEZADOS_PROYECTADOS = list(CAMPOS_FORMULARIO.values())
+
+
+def proyectar(filas, sheet_name):
+    """
+    Reduce cada fila a las columnas del formulario.
+
+    La primera fila es de encabezados: se registra (ver
+    schema.registrar_encabezados) y se sustituye por ENCABEZADOS_PROYECTADOS.
+    Las columnas que no están en la hoja salen vacías.
+
+    Args:
+        filas (iterable): Filas de la hoja; la primera es de encabezados
+        sheet_name (str): Nombre de la hoja
+
+    Yields:
+        list: ENCABEZADOS_PROYECTADOS y luego una lista por fila, en ese orden
+    """
+    filas = iter(filas)
+    encabezados = next(filas, None)
+    if encabezados is None:
+        return
+
+    esquema = registrar_encabezados(sheet_name, encabezados)
+    indices = [esquema.get(encabezado) for encabezado in ENCABEZADOS_PROYECTADOS]
+
+    yield list(ENCABEZADOS_PROYECTADOS)
+    for fila in filas:
+        largo = len(fila)
+        yield [fila[i] if i is not None and i < largo else '' for i in indices]
+
+
+def copiar(filas, escritor):
+    """Entrega las filas tal cual, escribiéndolas también con ``escritor.writerow``."""
+    for fila in filas:
+        escritor.writerow(fila)
+        yield fila
+
+
+def normalizar_en_bloques(filas_proyectadas, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Normaliza filas proyectadas de a bloques.
+
+    Args:
+        filas_proyectadas (iterable): Salida de proyectar
+        tamano_bloque (int): Filas por bloque
+
+    Returns:
+        list: Registros normalizados, igual que normalizar_hoja sobre toda la hoja
+    """
+    filas = iter(filas_proyectadas)
+    encabezados = next(filas, None)
+    if encabezados is None:
+        return []
+
+    registros = []
+    while True:
+        bloque = list(islice(filas, tamano_bloque))
+        if not bloque:
+            return registros
+        registros.extend(normalizar_hoja([encabezados] + bloque))
+
+
+def ingerir_hoja(filas, sheet_name, escritor=None):
+    """
+    Normaliza una hoja leyendo sus filas una a una.
+
+    Args:
+        filas (iterable): Filas de la hoja (ver SheetsBackend.iterar_filas)
+        sheet_name (str): Nombre de la hoja
+        escritor: csv.writer opcional donde copiar las filas originales
+
+    Returns:
+        list: Registros normalizados de la hoja
+    """
+    if escritor is not None:
+        filas = copiar(filas, escritor)
+    return normalizar_en_bloques(proyectar(filas, sheet_name))
@@ -0,0 +1,264 @@
+"""
+Cola de trabajos de lotes de PDFs sobre la base de datos de Django.
+
+Cada ``TrabajoLote`` se procesa fuera de las peticiones web con el comando
+``python manage.py procesar_lotes``. Los PDFs de un trabajo se escriben uno
+a uno en ``LOTES_DIR/<id>/``; si el worker se reinicia, el trabajo se retoma
+saltando las cédulas que ya tienen su PDF. Al terminar se empaquetan en
+``<id>.zip`` en el almacenamiento LOTES_STORAGE, que comparten el worker y
+el proceso web que sirve la descarga.
+"""
+import logging
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .auditoria import registrar
+from .google_sheets import find_row_by_cedula
+from .models import RegistroGeneracion, TrabajoLote
+from .pdf_cache import obtener_pdf
+from .pdf_generator import generar_nombre_archivo_pdf
+
+logger = logging.getLogger(__name__)
+
+
+_almacenamiento = None
+_almacenamiento_lock = threading.Lock()
+
+
+def get_almacenamiento():
+    """
+    Almacenamiento de los ZIP terminados (LOTES_STORAGE), uno por proceso.
+
+    FileSystemStorage guarda en LOTES_DIR; los demás backends usan su
+    propia configuración.
+    """
+    global _almacenamiento
+    if _almacenamiento is None:
+        with _almacenamiento_lock:
+            if _almacenamiento is None:
+                clase = import_string(settings.LOTES_STORAGE)
+                if issubclass(clase, FileSystemStorage):
+                    _almacenamiento = clase(location=settings.LOTES_DIR)
+                else:
+                    _almacenamiento = clase()
+    return _almacenamiento
+
+
+class _ZipTemporal(File):
+    """ZIP en un archivo temporal: FileSystemStorage lo mueve en vez de copiarlo."""
+
+    def temporary_file_path(self):
+        return self.name
+
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def parsear_cedulas(texto):
+    """
+    Extrae las cédulas de un texto (separadas por espacios, comas o líneas).
+
+    Returns:
+        list: Cédulas sin duplicados, en el orden en que aparecen
+    """
+    cedulas = []
+    vistas = set()
+    for cedula in re.split(r'[\s,;]+', texto or ''):
+        cedula = cedula.strip()
+        if cedula and cedula not in vistas:
+            vistas.add(cedula)
+            cedulas.append(cedula)
+    return cedulas
+
+
+def crear_trabajo(usuario, cedulas):
+    """
+    Encola un trabajo de lote.
+
+    Raises:
+        ValueError: Si no hay cédulas o se supera LOTES_MAX_CEDULAS
+    """
+    maximo = getattr(settings, 'LOTES_MAX_CEDULAS', 2000)
+    if not cedulas:
+        raise ValueError("Ingrese al menos una cédula")
+    if len(cedulas) > maximo:
+        raise ValueError(f"Un lote admite máximo {maximo} cédulas (recibidas: {len(cedulas)})")
+    return TrabajoLote.objects.create(usuario=usuario, cedulas=cedulas)
+
+
+def reclamar_trabajo(worker):
+    """
+    Toma el siguiente trabajo pendiente o abandonado.
+
+    La reclamación es una actualización condicional (solo tiene éxito si
+    nadie modificó el trabajo entre la lectura y la escritura), así que dos
+    workers nunca procesan el mismo trabajo, en cualquier base de datos.
+
+    Returns:
+        TrabajoLote: El trabajo reclamado, o None si no hay trabajo
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'LOTES_LATIDO_SEGUNDOS', 120))
+    candidatos = (
+        TrabajoLote.objects
+        .filter(
+            Q(estado=TrabajoLote.PENDIENTE)
+            | Q(estado=TrabajoLote.EN_PROCESO, latido__lt=limite)
+        )
+        .order_by('creado')
+        .values_list('pk', 'estado', 'latido')[:10]
+    )
+
+    for pk, estado, latido in candidatos:
+        reclamado = TrabajoLote.objects.filter(pk=pk, estado=estado, latido=latido).update(
+            estado=TrabajoLote.EN_PROCESO,
+            worker=worker,
+            latido=timezone.now(),
+            actualizado=timezone.now(),
+        )
+        if reclamado:
+            if estado == TrabajoLote.EN_PROCESO:
+                logger.warning(f"Retomando el lote {pk} abandonado por otro worker")
+            return TrabajoLote.objects.get(pk=pk)
+    return None
+
+
+def directorio_trabajo(trabajo):
+    return os.path.join(settings.LOTES_DIR, str(trabajo.pk))
+
+
+def _guardar_pdf(ruta, contenido):
+    """Escritura atómica: un PDF a medio escribir nunca cuenta como hecho."""
+    fd, ruta_tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.tmp_')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(contenido)
+    os.replace(ruta_tmp, ruta)
+
+
+def _empaquetar(trabajo):
+    """
+    Crea el ZIP final a partir de los PDFs del trabajo y lo guarda en el
+    almacenamiento de lotes.
+
+    Returns:
+        str: Nombre del ZIP en el almacenamiento
+    """
+    directorio = directorio_trabajo(trabajo)
+
+    fd, ruta_tmp = tempfile.mkstemp(dir=settings.LOTES_DIR, prefix='.tmp_')
+    os.close(fd)
+    # Los PDFs ya vienen comprimidos: guardarlos sin recomprimir es mucho más rápido
+    with zipfile.ZipFile(ruta_tmp, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for cedula in trabajo.cedulas:
+            nombre = generar_nombre_archivo_pdf(cedula)
+            ruta_pdf = os.path.join(directorio, nombre)
+            if os.path.exists(ruta_pdf):
+                archivo_zip.write(ruta_pdf, nombre)
+
+    almacenamiento = get_almacenamiento()
+    nombre_zip = f"{trabajo.pk}.zip"
+    try:
+        # Un trabajo retomado reemplaza el ZIP anterior en vez de crear otro nombre
+        almacenamiento.delete(nombre_zip)
+        with open(ruta_tmp, 'rb') as f:
+            nombre_zip = almacenamiento.save(nombre_zip, _ZipTemporal(f, name=ruta_tmp))
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+
+    shutil.rmtree(directorio, ignore_errors=True)
+    return nombre_zip
+
+
+def procesar_trabajo(trabajo, worker, detener=None):
+    """
+    Genera los PDFs pendientes de un trabajo y empaqueta el resultado.
+
+    Args:
+        trabajo (TrabajoLote): Trabajo reclamado por este worker
+        worker (str): Identificador del worker
+        detener (callable): Devuelve True si el worker debe parar; el trabajo
+            se devuelve a pendiente y otro worker lo retoma donde quedó
+
+    Returns:
+        bool: True si el trabajo terminó (completado o con error)
+    """
+    directorio = directorio_trabajo(trabajo)
+    os.makedirs(directorio, exist_ok=True)
+
+    no_encontradas = list(trabajo.no_encontradas)
+    procesados = 0
+
+    try:
+        for cedula in trabajo.cedulas:
+            if detener and detener():
+                TrabajoLote.objects.filter(pk=trabajo.pk, worker=worker).update(
+                    estado=TrabajoLote.PENDIENTE, latido=None, worker='',
+                    procesados=procesados, no_encontradas=no_encontradas,
+                )
+                logger.info(f"Lote {trabajo.pk} interrumpido en {procesados}/{trabajo.total}")
+                return False
+
+            ruta_pdf = os.path.join(directorio, generar_nombre_archivo_pdf(cedula))
+            if not os.path.exists(ruta_pdf) and cedula not in no_encontradas:
+                datos_empleado = find_row_by_cedula(cedula)
+                if datos_empleado:
+                    contenido, hash_datos = obtener_pdf(datos_empleado)
+                    _guardar_pdf(ruta_pdf, contenido)
+                    registrar(trabajo.usuario, cedula, RegistroGeneracion.LOTE, hash_datos)
+                else:
+                    no_encontradas.append(cedula)
+
+            procesados += 1
+            # Progreso y latido; si otro worker retomó el trabajo, se abandona
+            actualizado = TrabajoLote.objects.filter(pk=trabajo.pk, worker=worker).update(
+                procesados=procesados,
+                no_encontradas=no_encontradas,
+                latido=timezone.now(),
+                actualizado=timezone.now(),
+            )
+            if not actualizado:
+                logger.warning(f"El lote {trabajo.pk} ya no pertenece a este worker")
+                return False
+
+        nombre_zip = _empaquetar(trabajo)
+        TrabajoLote.objects.filter(pk=trabajo.pk, worker=worker).update(
+            estado=TrabajoLote.COMPLETADO,
+            archivo=nombre_zip,
+            actualizado=timezone.now(),
+        )
+        logger.info(f"Lote {trabajo.pk} completado: {nombre_zip}")
+        return True
+
+    except ConnectionError as e:
+        # Error transitorio (Google Sheets no disponible): se reintenta luego
+        logger.error(f"Error de conexión al procesar el lote {trabajo.pk}: {str(e)}")
+        TrabajoLote.objects.filter(pk=trabajo.pk, worker=worker).update(
+            estado=TrabajoLote.PENDIENTE, latido=None, worker='',
+            procesados=procesados, no_encontradas=no_encontradas,
+        )
+        return False
+
+    except Exception as e:
+        logger.error(f"Error al procesar el lote {trabajo.pk}: {str(e)}")
+        TrabajoLote.objects.filter(pk=trabajo.pk, worker=worker).update(
+            estado=TrabajoLote.ERROR,
+            error=str(e),
+            procesados=procesados,
+            no_encontradas=no_encontradas,
+            actualizado=timezone.now(),
+        )
+        return True
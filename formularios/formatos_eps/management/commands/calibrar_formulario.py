@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from formatos_eps.calibracion import (
+    DPI_PREVIEW, ajustar_layout, buscar_textos, caja_para_punto, generar_preview,
+    guardar_layout, huella_plantilla, obtener_geometria,
+)
+from formatos_eps.pdf_generator import leer_layout, ruta_layout
+
+
+class Command(BaseCommand):
+    help = "Calibra la posición de los campos en el PDF template y guarda el layout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buscar', metavar='TEXTO', help="Mostrar dónde aparece un texto del template")
+        parser.add_argument('--campo', help="Campo a mover o ajustar (ej: PRIMER_APELLIDO)")
+        parser.add_argument('--x', type=float, help="Nueva coordenada x del campo")
+        parser.add_argument('--y', type=float, help="Nueva coordenada y (línea base) del campo")
+        parser.add_argument('--fontsize', type=float, help="Nuevo tamaño de letra del campo")
+        parser.add_argument(
+            '--ajustar', action='store_true',
+            help="Ajustar el ancho de los campos (o de --campo) a la caja que los contiene",
+        )
+        parser.add_argument(
+            '--alinear', action='store_true',
+            help="Con --ajustar, mover también x y la línea base a los bordes de la caja",
+        )
+        parser.add_argument('--preview', metavar='ARCHIVO.png', help="Guardar una vista previa en PNG")
+        parser.add_argument('--dpi', type=int, default=DPI_PREVIEW, help=f"Resolución de la vista previa (por defecto {DPI_PREVIEW})")
+        parser.add_argument('--recorte', metavar='X0,Y0,X1,Y1', help="Zona de la página para la vista previa")
+        parser.add_argument('--guardar', action='store_true', help="Guardar el layout resultante")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        geometria = obtener_geometria()
+        self.stdout.write(
+            f"Template {huella_plantilla()}: {len(geometria['cajas'])} cajas, "
+            f"{len(geometria['lineas'])} líneas, {len(geometria['textos'])} textos "
+            f"({(time.perf_counter() - inicio) * 1000:.0f} ms)"
+        )
+
+        if options['buscar']:
+            for texto in buscar_textos(geometria, options['buscar']):
+                x0, y0, x1, y1 = texto['bbox']
+                self.stdout.write(f"  '{texto['texto']}' x={x0}-{x1} y={y0}-{y1} ({texto['tamano']} pt)")
+            return
+
+        layout = leer_layout()
+        campo = options['campo']
+        if campo and campo not in layout['campos']:
+            raise CommandError(f"Campo desconocido: {campo}. Campos: {', '.join(layout['campos'])}")
+
+        if campo:
+            for clave in ('x', 'y', 'fontsize'):
+                if options[clave] is not None:
+                    layout['campos'][campo][clave] = options[clave]
+
+        if options['ajustar']:
+            layout, sin_caja = ajustar_layout(
+                layout, geometria, campos=[campo] if campo else None, alinear=options['alinear'],
+            )
+            for nombre in sin_caja:
+                self.stdout.write(self.style.WARNING(f"  {nombre}: no hay una caja ni línea en su posición"))
+
+        self._mostrar(layout, geometria)
+
+        if options['preview']:
+            recorte = None
+            if options['recorte']:
+                try:
+                    recorte = tuple(float(v) for v in options['recorte'].split(','))
+                except ValueError:
+                    raise CommandError("--recorte debe ser X0,Y0,X1,Y1")
+                if len(recorte) != 4:
+                    raise CommandError("--recorte debe ser X0,Y0,X1,Y1")
+            inicio = time.perf_counter()
+            imagen = generar_preview(layout, dpi=options['dpi'], recorte=recorte)
+            with open(options['preview'], 'wb') as f:
+                f.write(imagen)
+            self.stdout.write(
+                f"Vista previa: {options['preview']} ({len(imagen) // 1024} KB, "
+                f"{(time.perf_counter() - inicio) * 1000:.0f} ms)"
+            )
+
+        if options['guardar']:
+            self.stdout.write(self.style.SUCCESS(f"Layout guardado en {guardar_layout(layout)}"))
+        elif options['ajustar'] or campo:
+            self.stdout.write(f"Use --guardar para escribir el layout en {ruta_layout()}")
+
+    def _mostrar(self, layout, geometria):
+        self.stdout.write(f"\n  {'CAMPO':<24} {'X':>6} {'Y':>6} {'ANCHO':>6} {'PT':>4}  CAJA")
+        for nombre, coords in layout['campos'].items():
+            caja = caja_para_punto(geometria, coords['x'], coords['y'])
+            detalle = f"{caja[0]}-{caja[2]} (ancho {caja[2] - caja[0]:.1f})" if caja else "sin caja"
+            self.stdout.write(
+                f"  {nombre:<24} {coords['x']:>6} {coords['y']:>6} {coords['ancho']:>6} "
+                f"{coords.get('fontsize', ''):>4}  {detalle}"
+            )
+        self.stdout.write("")
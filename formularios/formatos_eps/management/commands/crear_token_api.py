@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from formatos_eps.models import TokenAPI
+
+
+class Command(BaseCommand):
+    help = "Crea un token para la API JSON y muestra la clave (una sola vez)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help="Usuario al que pertenece el token")
+        parser.add_argument('--nombre', required=True, help="Integración que usará el token (ej: nomina)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        token, clave = TokenAPI.crear(usuario, options['nombre'])
+        self.stdout.write(self.style.SUCCESS(f"Token '{token.nombre}' creado para {usuario.username}"))
+        self.stdout.write(f"Clave (guárdela ahora, no se puede volver a ver): {clave}")
+        self.stdout.write(f"Uso: Authorization: Token {clave}")
@@ -0,0 +1,46 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from formatos_eps.auditoria import filtrar, generar_csv
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida: '{valor}' (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Exporta a CSV los registros de auditoría de formularios generados en un rango de fechas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help="Primer día (AAAA-MM-DD)")
+        parser.add_argument('--hasta', help="Último día, inclusive (por defecto hoy)")
+        parser.add_argument('--cedula', help="Solo esta cédula")
+        parser.add_argument('--usuario', help="Solo este nombre de usuario")
+        parser.add_argument(
+            '--salida', default='-', metavar='ARCHIVO',
+            help="Archivo CSV de salida ('-' para la salida estándar, por defecto)",
+        )
+
+    def handle(self, *args, **options):
+        desde = _fecha(options['desde'])
+        hasta = _fecha(options['hasta']) if options['hasta'] else timezone.localdate()
+        if hasta < desde:
+            raise CommandError("--hasta es anterior a --desde")
+
+        registros = filtrar(desde, hasta, cedula=options['cedula'], usuario=options['usuario'])
+
+        if options['salida'] == '-':
+            for bloque in generar_csv(registros):
+                sys.stdout.write(bloque)
+            return
+
+        with open(options['salida'], 'w', newline='', encoding='utf-8-sig') as archivo:
+            for bloque in generar_csv(registros):
+                archivo.write(bloque)
+        self.stdout.write(f"Registros del {desde} al {hasta} escritos en {options['salida']}")
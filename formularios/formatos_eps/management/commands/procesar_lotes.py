@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from formatos_eps.cuota import con_prioridad
+from formatos_eps.lotes import identificador_worker, reclamar_trabajo, procesar_trabajo
+
+
+class Command(BaseCommand):
+    help = "Procesa los trabajos de lotes de PDFs encolados en la base de datos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help="Procesar los trabajos disponibles y terminar",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera cuando no hay trabajos (por defecto 2)",
+        )
+
+    def handle(self, *args, **options):
+        self._detener = False
+        # SIGTERM (reinicio/deploy): terminar el PDF en curso y devolver el
+        # trabajo a la cola para que se retome donde quedó
+        signal.signal(signal.SIGTERM, self._pedir_detener)
+        signal.signal(signal.SIGINT, self._pedir_detener)
+
+        worker = identificador_worker()
+        self.stdout.write(f"Worker de lotes iniciado: {worker}")
+
+        while not self._detener:
+            trabajo = reclamar_trabajo(worker)
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f"Procesando lote {trabajo.pk} ({trabajo.total} cédulas)")
+            # Los lotes solo usan la cuota de Google que no necesitan las búsquedas
+            with con_prioridad('lote'):
+                terminado = procesar_trabajo(trabajo, worker, detener=lambda: self._detener)
+            if not terminado and not self._detener:
+                # Error transitorio: esperar antes de volver a intentar
+                time.sleep(options['intervalo'])
+
+        self.stdout.write("Worker de lotes detenido")
+
+    def _pedir_detener(self, signum, frame):
+        self._detener = True
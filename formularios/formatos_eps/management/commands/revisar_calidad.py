@@ -0,0 +1,67 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from formatos_eps.calidad import TIPOS_PROBLEMA, escribir_csv, filtrar_problemas
+from formatos_eps.google_sheets import get_snapshot, refrescar_snapshot
+
+
+class Command(BaseCommand):
+    help = "Muestra los problemas de calidad de los datos de las hojas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refrescar', action='store_true',
+            help="Descargar las hojas en lugar de usar el último snapshot guardado",
+        )
+        parser.add_argument('--tipo', choices=sorted(TIPOS_PROBLEMA), help="Solo este tipo de problema")
+        parser.add_argument('--hoja', help="Solo esta hoja")
+        parser.add_argument('--cedula', help="Solo esta cédula")
+        parser.add_argument(
+            '--csv', metavar='ARCHIVO',
+            help="Escribir los problemas en un CSV ('-' para la salida estándar)",
+        )
+        parser.add_argument(
+            '--limite', type=int, default=50,
+            help="Problemas a listar en pantalla (por defecto 50)",
+        )
+        parser.add_argument(
+            '--estricto', action='store_true',
+            help="Terminar con error si hay problemas (para CI o cron)",
+        )
+
+    def handle(self, *args, **options):
+        snapshot = refrescar_snapshot() if options['refrescar'] else get_snapshot()
+        calidad = snapshot['calidad']
+        problemas = filtrar_problemas(
+            calidad, tipo=options['tipo'], hoja=options['hoja'], cedula=options['cedula'],
+        )
+
+        if options['csv'] == '-':
+            escribir_csv(problemas, sys.stdout)
+            return
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8-sig') as archivo:
+                escribir_csv(problemas, archivo)
+            self.stdout.write(f"{len(problemas)} problemas escritos en {options['csv']}")
+
+        self.stdout.write(f"Filas revisadas: {calidad['filas_revisadas']} (snapshot de {snapshot['origen']})")
+        if not calidad['resumen']:
+            self.stdout.write(self.style.SUCCESS("No se encontraron problemas"))
+            return
+
+        for tipo, cantidad in sorted(calidad['resumen'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {tipo:<18} {cantidad:>6}  {TIPOS_PROBLEMA[tipo]}")
+
+        if not options['csv']:
+            self.stdout.write("")
+            for problema in problemas[:options['limite']]:
+                self.stdout.write(
+                    f"  {problema['hoja']} fila {problema['fila']} ({problema['cedula']}) "
+                    f"{problema['campo']}='{problema['valor']}': {problema['detalle']}"
+                )
+            if len(problemas) > options['limite']:
+                self.stdout.write(f"  ... y {len(problemas) - options['limite']} más (use --csv)")
+
+        if options['estricto']:
+            raise CommandError(f"Hay {len(problemas)} problemas de calidad de datos")
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formatos_eps', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenAPI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('prefijo', models.CharField(max_length=8)),
+                ('clave_hash', models.CharField(max_length=64, unique=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_api', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'token de API',
+                'verbose_name_plural': 'tokens de API',
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
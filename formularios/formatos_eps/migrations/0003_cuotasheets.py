@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formatos_eps', '0002_tokenapi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuotaSheets',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('tokens', models.FloatField()),
+                ('actualizado', models.FloatField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'cuota de Google Sheets',
+                'verbose_name_plural': 'cuotas de Google Sheets',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formatos_eps', '0003_cuotasheets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroGeneracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('nombre_usuario', models.CharField(max_length=150)),
+                ('cedula', models.CharField(max_length=20)),
+                ('origen', models.CharField(choices=[('web', 'Web'), ('api', 'API'), ('lote', 'Lote')], max_length=10)),
+                ('hash_datos', models.CharField(blank=True, max_length=64)),
+                ('usuario', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros_generacion', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'registro de generación',
+                'verbose_name_plural': 'registros de generación',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='formatos_ep_fecha_c9bca9_idx'), models.Index(fields=['cedula', 'fecha'], name='formatos_ep_cedula_7caae4_idx'), models.Index(fields=['usuario', 'fecha'], name='formatos_ep_usuario_a8c5ea_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+import os
+
+from django.db import migrations
+
+
+def rutas_a_nombres(apps, schema_editor):
+    """TrabajoLote.archivo pasa de ruta absoluta en LOTES_DIR a nombre en LOTES_STORAGE."""
+    TrabajoLote = apps.get_model('formatos_eps', 'TrabajoLote')
+    for trabajo in TrabajoLote.objects.exclude(archivo='').only('pk', 'archivo'):
+        if os.path.isabs(trabajo.archivo):
+            TrabajoLote.objects.filter(pk=trabajo.pk).update(archivo=os.path.basename(trabajo.archivo))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formatos_eps', '0004_registrogeneracion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rutas_a_nombres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formatos_eps', '0005_archivo_lote_en_almacenamiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrogeneracion',
+            index=models.Index(fields=['nombre_usuario', 'fecha'], name='formatos_ep_nombre__a5a3da_idx'),
+        ),
+    ]
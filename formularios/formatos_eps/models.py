@@ -1,3 +1,194 @@
+import hashlib
+import secrets
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class TrabajoLote(models.Model):
+    """
+    Generación en segundo plano de los PDFs de un lote de cédulas.
+
+    Lo procesa el comando ``procesar_lotes``; el usuario consulta el progreso
+    y descarga el archivo ZIP cuando termina.
+    """
+
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='trabajos_lote',
+    )
+    cedulas = models.JSONField(default=list)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    procesados = models.PositiveIntegerField(default=0)
+    no_encontradas = models.JSONField(default=list, blank=True)
+    archivo = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    # Worker que lo está procesando y su último latido; un trabajo en proceso
+    # sin latido reciente se considera abandonado y se retoma
+    worker = models.CharField(max_length=100, blank=True)
+    latido = models.DateTimeField(null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-creado']
+        indexes = [
+            models.Index(fields=['estado', 'creado']),
+        ]
+        verbose_name = 'trabajo de lote'
+        verbose_name_plural = 'trabajos de lote'
+
+    def __str__(self):
+        return f"Lote {self.id} ({self.get_estado_display()})"
+
+    @property
+    def total(self):
+        return len(self.cedulas)
+
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return 100
+        return int(self.procesados * 100 / self.total)
+
+
+class TokenAPI(models.Model):
+    """
+    Token de acceso a la API JSON para una integración (nómina, etc.).
+
+    Solo se guarda el hash SHA-256 de la clave: la clave se muestra una sola
+    vez al crearla con ``manage.py crear_token_api``.
+    """
+
+    nombre = models.CharField(max_length=100)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tokens_api',
+    )
+    # Primeros caracteres de la clave, para reconocer el token sin guardarla
+    prefijo = models.CharField(max_length=8)
+    clave_hash = models.CharField(max_length=64, unique=True)
+    activo = models.BooleanField(default=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creado']
+        verbose_name = 'token de API'
+        verbose_name_plural = 'tokens de API'
+
+    def __str__(self):
+        return f"{self.nombre} ({self.prefijo}...)"
+
+    @staticmethod
+    def hash_clave(clave):
+        return hashlib.sha256(clave.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def crear(cls, usuario, nombre):
+        """
+        Crea un token nuevo.
+
+        Returns:
+            tuple: (TokenAPI, clave en claro); la clave no se puede recuperar después
+        """
+        clave = secrets.token_urlsafe(32)
+        token = cls.objects.create(
+            usuario=usuario,
+            nombre=nombre,
+            prefijo=clave[:8],
+            clave_hash=cls.hash_clave(clave),
+        )
+        return token, clave
+
+
+class CuotaSheets(models.Model):
+    """
+    Cubeta de tokens compartida por todos los procesos para las llamadas a
+    Google Sheets (ver cuota.py).
+
+    Se actualiza con escrituras condicionales sobre ``version``, igual que
+    la reclamación de trabajos de lote, así funciona en cualquier base de
+    datos sin bloqueos.
+    """
+
+    nombre = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField()
+    # Momento (timestamp) en que se calcularon los tokens
+    actualizado = models.FloatField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'cuota de Google Sheets'
+        verbose_name_plural = 'cuotas de Google Sheets'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.tokens:.1f} tokens"
+
+
+class RegistroGeneracion(models.Model):
+    """
+    Auditoría de formularios generados: quién generó el PDF de qué cédula y
+    cuándo.
+
+    Las filas no se escriben durante la petición: ``auditoria.registrar``
+    las deja en un buffer del proceso que se guarda en bloque (ver
+    auditoria.py).
+    """
+
+    WEB = 'web'
+    API = 'api'
+    LOTE = 'lote'
+    ORIGENES = [
+        (WEB, 'Web'),
+        (API, 'API'),
+        (LOTE, 'Lote'),
+    ]
+
+    # Momento de la generación (no el de la escritura en bloque)
+    fecha = models.DateTimeField(default=timezone.now)
+    # Sin índice propio: lo cubre el índice (usuario, fecha)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        db_index=False,
+        related_name='registros_generacion',
+    )
+    # Se conserva aunque el usuario se elimine; el listado no necesita el join
+    nombre_usuario = models.CharField(max_length=150)
+    cedula = models.CharField(max_length=20)
+    origen = models.CharField(max_length=10, choices=ORIGENES)
+    # Versión de los datos con que se generó el PDF (su ETag)
+    hash_datos = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha']),
+            models.Index(fields=['cedula', 'fecha']),
+            models.Index(fields=['usuario', 'fecha']),
+            # Búsqueda del admin y filtro --usuario de exportar_auditoria
+            models.Index(fields=['nombre_usuario', 'fecha']),
+        ]
+        verbose_name = 'registro de generación'
+        verbose_name_plural = 'registros de generación'
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.cedula} por {self.nombre_usuario} ({self.fecha:%Y-%m-%d %H:%M})"
@@ -0,0 +1,63 @@
+"""
+Normalización de las filas de las hojas en registros del formulario.
+
+Se ejecuta una sola vez por snapshot, sobre todas las filas de una hoja a la
+vez y columna por columna: primero se extrae cada columna del formulario como
+una lista y luego se calculan las columnas derivadas (primer y segundo nombre,
+fecha en DDMMYYYY) con una pasada por columna. Los registros resultantes ya
+están listos para mostrar y para generar el PDF, así que las peticiones no
+hacen ningún procesamiento de texto.
+
+Los registros publicados en el snapshot se comparten entre hilos y no se
+deben modificar.
+"""
+from .schema import CAMPOS_FORMULARIO, mapa_encabezados
+
+# Columnas calculadas a partir de las de la hoja
+CAMPOS_DERIVADOS = ['PRIMER_NOMBRE', 'SEGUNDO_NOMBRE', 'FECHA_NACIMIENTO_DDMMYYYY']
+
+
+def _columna(datos, indice):
+    """Extrae una columna sin espacios sobrantes ('' si la fila es más corta)."""
+    if indice is None:
+        return [''] * len(datos)
+    return [fila[indice].strip() if indice < len(fila) else '' for fila in datos]
+
+
+def normalizar_hoja(filas):
+    """
+    Convierte todas las filas de una hoja en registros del formulario.
+
+    Args:
+        filas (list): Filas de la hoja; la primera es de encabezados
+
+    Returns:
+        list: Registros {campo: valor} con los campos de CAMPOS_FORMULARIO y
+            CAMPOS_DERIVADOS, en el orden de la hoja
+    """
+    if not filas:
+        return []
+
+    esquema = mapa_encabezados(filas[0])
+    datos = filas[1:]
+
+    columnas = {
+        campo: _columna(datos, esquema.get(encabezado))
+        for campo, encabezado in CAMPOS_FORMULARIO.items()
+    }
+    columnas['CODIGO_SEXO'] = [codigo.upper() for codigo in columnas['CODIGO_SEXO']]
+
+    # Nombres: el primero y el resto como segundo nombre
+    partes = [nombres.split() for nombres in columnas['NOMBRES']]
+    columnas['PRIMER_NOMBRE'] = [p[0] if p else '' for p in partes]
+    columnas['SEGUNDO_NOMBRE'] = [' '.join(p[1:]) for p in partes]
+
+    # Fecha YYYYMMDD -> DDMMYYYY (vacía si no tiene 8 caracteres)
+    columnas['FECHA_NACIMIENTO_DDMMYYYY'] = [
+        f[6:8] + f[4:6] + f[0:4] if len(f) == 8 else ''
+        for f in columnas['FECHA_NACIMIENTO']
+    ]
+
+    campos = list(columnas)
+    return [dict(zip(campos, valores)) for valores in zip(*columnas.values())]
+
@@ -0,0 +1,314 @@
+"""
+Caché de PDFs generados, con dos niveles:
+
+- Memoria: LRU acotado en bytes, propio de cada worker.
+- Disco: directorio compartido por todos los workers del contenedor, con
+  tamaño máximo; al superarlo se eliminan los archivos usados hace más tiempo.
+
+La clave es ``calcular_hash_datos`` (datos normalizados + versión del
+template), así que un cambio en los datos o en el template produce una clave
+nueva y las entradas viejas simplemente dejan de usarse hasta ser desalojadas.
+
+Las vistas previas en PNG usan la misma clave en una caché aparte, solo en
+memoria (se generan en unos 30 ms, no vale la pena guardarlas en disco).
+"""
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .calibracion import generar_preview
+from .pdf_generator import calcular_hash_datos, generar_pdf_bytes, obtener_layout
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMemoria:
+    """LRU en memoria acotado por el tamaño total de los valores."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def obtener(self, clave, contar=True):
+        with self._lock:
+            valor = self._entradas.get(clave)
+            if valor is None:
+                if contar:
+                    self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            if contar:
+                self.hits += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes:
+                _, desalojado = self._entradas.popitem(last=False)
+                self._bytes -= len(desalojado)
+                self.evictions += 1
+
+    def eliminar(self, clave):
+        with self._lock:
+            valor = self._entradas.pop(clave, None)
+            if valor is not None:
+                self._bytes -= len(valor)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CacheDisco:
+    """
+    Caché en un directorio, compartido entre procesos.
+
+    Las escrituras son atómicas (temporal + ``os.replace``) y la lectura de un
+    archivo que otro proceso acaba de desalojar se trata como un miss, así que
+    no hace falta un lock entre workers.
+    """
+
+    def __init__(self, directorio, max_bytes, extension='.pdf'):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}{self.extension}")
+
+    def obtener(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                valor = f.read()
+            # Actualizar la fecha de uso para el desalojo LRU
+            os.utime(ruta)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return valor
+
+    def guardar(self, clave, valor):
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            fd, ruta_tmp = tempfile.mkstemp(dir=self.directorio, prefix='.tmp_')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(valor)
+            os.replace(ruta_tmp, self._ruta(clave))
+        except OSError as e:
+            logger.warning(f"No se pudo guardar en la caché de disco: {str(e)}")
+            return
+        self._desalojar()
+
+    def eliminar(self, clave):
+        try:
+            os.remove(self._ruta(clave))
+        except OSError:
+            pass
+
+    def _listar(self):
+        archivos = []
+        try:
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    if entrada.name.endswith(self.extension):
+                        try:
+                            info = entrada.stat()
+                        except OSError:
+                            continue
+                        archivos.append((info.st_mtime, info.st_size, entrada.path))
+        except OSError:
+            pass
+        return archivos
+
+    def _desalojar(self):
+        archivos = self._listar()
+        total = sum(tamano for _, tamano, _ in archivos)
+        if total <= self.max_bytes:
+            return
+
+        # Los usados hace más tiempo primero
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                # Otro worker ya lo eliminó
+                continue
+            total -= tamano
+            with self._lock:
+                self.evictions += 1
+
+    def estadisticas(self):
+        archivos = self._listar()
+        with self._lock:
+            return {
+                'entradas': len(archivos),
+                'bytes': sum(tamano for _, tamano, _ in archivos),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CacheDosNiveles:
+    """Memoria primero, luego disco; un hit en disco se promueve a memoria."""
+
+    def __init__(self, memoria, disco=None):
+        self.memoria = memoria
+        self.disco = disco
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def obtener(self, clave):
+        valor = self.memoria.obtener(clave)
+        if valor is None and self.disco is not None:
+            valor = self.disco.obtener(clave)
+            if valor is not None:
+                self.memoria.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        self.memoria.guardar(clave, valor)
+        if self.disco is not None:
+            self.disco.guardar(clave, valor)
+
+    def eliminar(self, clave):
+        self.memoria.eliminar(clave)
+        if self.disco is not None:
+            self.disco.eliminar(clave)
+
+    def obtener_o_generar(self, clave, generar):
+        """
+        Devuelve el valor cacheado o lo genera una sola vez.
+
+        Si varios hilos piden la misma clave a la vez, solo uno la genera y
+        los demás esperan su resultado.
+        """
+        valor = self.obtener(clave)
+        if valor is not None:
+            return valor
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(clave, threading.Lock())
+        try:
+            with lock:
+                # Otro hilo pudo generarlo mientras se esperaba el lock
+                valor = self.memoria.obtener(clave, contar=False)
+                if valor is None:
+                    valor = generar()
+                    self.guardar(clave, valor)
+                return valor
+        finally:
+            with self._locks_lock:
+                self._locks.pop(clave, None)
+
+    def estadisticas(self):
+        return {
+            'memoria': self.memoria.estadisticas(),
+            'disco': self.disco.estadisticas() if self.disco is not None else None,
+        }
+
+
+_cache = None
+_cache_previews = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_pdf():
+    """Devuelve la caché de PDFs del proceso (se crea una sola vez)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                memoria = CacheMemoria(getattr(settings, 'PDF_CACHE_MEMORIA_MB', 64) * 1024 * 1024)
+                directorio = getattr(settings, 'PDF_CACHE_DIR', '')
+                disco = None
+                if directorio:
+                    disco = CacheDisco(directorio, getattr(settings, 'PDF_CACHE_DISCO_MB', 512) * 1024 * 1024)
+                _cache = CacheDosNiveles(memoria, disco)
+    return _cache
+
+
+def get_cache_previews():
+    """Devuelve la caché de vistas previas del proceso (solo memoria)."""
+    global _cache_previews
+    if _cache_previews is None:
+        with _cache_lock:
+            if _cache_previews is None:
+                memoria = CacheMemoria(getattr(settings, 'PDF_PREVIEW_CACHE_MB', 16) * 1024 * 1024)
+                _cache_previews = CacheDosNiveles(memoria)
+    return _cache_previews
+
+
+def clave_preview(datos_empleado):
+    """Clave de la vista previa: la del PDF más la resolución."""
+    return f"{calcular_hash_datos(datos_empleado)}-{getattr(settings, 'PDF_PREVIEW_DPI', 72)}"
+
+
+def obtener_preview(datos_empleado):
+    """
+    Devuelve la vista previa en PNG del formulario del empleado.
+
+    Se dibujan solo los campos sobre la imagen cacheada del template en
+    blanco (ver calibracion.generar_preview), sin generar el PDF.
+
+    Args:
+        datos_empleado (dict): Datos normalizados del empleado
+
+    Returns:
+        tuple: (imagen PNG en bytes, clave de la caché)
+    """
+    clave = clave_preview(datos_empleado)
+    imagen = get_cache_previews().obtener_o_generar(clave, lambda: generar_preview(
+        obtener_layout(), datos_empleado,
+        dpi=getattr(settings, 'PDF_PREVIEW_DPI', 72), marcar_cajas=False,
+    ))
+    return imagen, clave
+
+
+def obtener_pdf(datos_empleado):
+    """
+    Devuelve el PDF del empleado desde la caché, generándolo si hace falta.
+
+    Args:
+        datos_empleado (dict): Datos normalizados del empleado
+
+    Returns:
+        tuple: (contenido del PDF en bytes, hash de los datos)
+    """
+    clave = calcular_hash_datos(datos_empleado)
+    contenido = get_cache_pdf().obtener_o_generar(clave, lambda: generar_pdf_bytes(datos_empleado))
+    return contenido, clave
@@ -1,8 +1,23 @@
 """
 Módulo para generar PDFs de formularios EPS con datos de empleados
+
+PyMuPDF (fitz) se importa dentro de las funciones que lo usan, para que
+importar este módulo (por ejemplo al cargar las URLs) no lo cargue.
+
+La posición de cada campo se toma del archivo de layout (PDF_LAYOUT_ARCHIVO)
+que genera ``manage.py calibrar_formulario``; las constantes de este módulo
+son los valores por defecto cuando no hay archivo.
+
+Si el template trae campos de formulario (widgets AcroForm), los campos que
+tienen widget se llenan por nombre y el resto se dibuja sobre la página en
+las coordenadas del layout.
 """
-import fitz  # PyMuPDF
+import hashlib
+import json
+import math
 import os
+import threading
+from functools import lru_cache
 from django.conf import settings
 
 # Coordenadas de los campos en el PDF
@@ -17,6 +32,26 @@ COORDENADAS_CAMPOS = {
     'CIUDAD_NACIMIENTO': {'x': 130, 'y': 200},
 }
 
+# Ancho disponible (puntos) de cada campo de texto, desde su x hasta el
+# siguiente campo o el borde de la casilla, y tamaño de letra con que se escribe
+ANCHOS_CAMPOS = {
+    'CEDULA': 150,
+    'PRIMER_APELLIDO': 120,
+    'SEGUNDO_APELLIDO': 125,
+    'PRIMER_NOMBRE': 145,
+    'SEGUNDO_NOMBRE': 105,
+    'PAIS_NACIMIENTO': 80,
+    'DEPARTAMENTO_NACIMIENTO': 75,
+    'CIUDAD_NACIMIENTO': 150,
+}
+TAMANOS_FUENTE = {'DEPARTAMENTO_NACIMIENTO': 8}
+TAMANO_FUENTE_DEFECTO = 10
+
+# Un texto más ancho que su casilla se escribe con letra más pequeña, hasta
+# este tamaño mínimo
+TAMANO_FUENTE_MINIMO = 6
+FUENTE = 'helv'  # Helvetica
+
 # Coordenadas para fecha de nacimiento (cada dígito en su posición)
 # Formato: DDMMYYYY
 COORDENADAS_FECHA_NACIMIENTO = [
@@ -36,10 +71,287 @@ COORDENADAS_SEXO = {
     '1': {'x': 267.5, 'y': 176.5},  # Femenino
 }
 
+# Claves de widget además de los campos de texto del layout: la fecha
+# completa (DDMMYYYY) en un solo widget y una casilla por código de sexo
+WIDGET_FECHA = 'FECHA_NACIMIENTO'
+PREFIJO_WIDGET_SEXO = 'SEXO_'
+
 # Ruta al PDF original (plantilla)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 PDF_TEMPLATE = os.path.join(BASE_DIR, 'formatos', 'formulario_de_afiliacion_eps_delagente_comfenalco_valle.pdf')
 
+# Versión de la forma de rellenar el PDF: incrementarla al cambiar
+# coordenadas, el dibujo de los campos o la compresión invalida ETags y
+# PDFs cacheados
+VERSION_GENERADOR = '3'
+
+# Opciones de serialización del PDF generado según PDF_SALIDA. En 'compacta'
+# el template se recomprime una sola vez por proceso (ver plantilla_salida) y
+# en cada PDF solo se comprime lo que se agregó.
+OPCIONES_SALIDA = {
+    'estandar': {'no_new_id': True},
+    'compacta': {'no_new_id': True, 'garbage': 1, 'deflate': True},
+}
+# Solo opciones de PyMuPDF 1.24 (la versión mínima de requirements.txt)
+OPCIONES_COMPACTAR_PLANTILLA = {'garbage': 4, 'expand': 255, 'deflate': True, 'use_objstms': 1}
+
+# Contenido del PDF template (se lee una sola vez por proceso)
+_plantilla_bytes = None
+_plantilla_lock = threading.Lock()
+_plantilla_compacta = None
+_version_plantilla = None
+
+# Layout de los campos (se lee una sola vez por proceso)
+_layout = None
+_layout_lock = threading.Lock()
+
+# PyMuPDF no es thread-safe: con workers gthread los renders de un mismo
+# proceso se serializan (el render es CPU y no libera el GIL de todos modos).
+# Reentrante porque las medidas de texto lo toman también durante el render.
+fitz_lock = threading.RLock()
+
+
+def cargar_plantilla():
+    """
+    Lee el PDF template en memoria la primera vez y lo reutiliza después.
+
+    Returns:
+        bytes: Contenido del PDF template
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el PDF template
+    """
+    global _plantilla_bytes
+    if _plantilla_bytes is None:
+        with _plantilla_lock:
+            if _plantilla_bytes is None:
+                if not os.path.exists(PDF_TEMPLATE):
+                    raise FileNotFoundError(f"No se encuentra el PDF template: {PDF_TEMPLATE}")
+                with open(PDF_TEMPLATE, 'rb') as f:
+                    _plantilla_bytes = f.read()
+    return _plantilla_bytes
+
+
+def modo_salida():
+    modo = getattr(settings, 'PDF_SALIDA', 'estandar')
+    return modo if modo in OPCIONES_SALIDA else 'estandar'
+
+
+def compactar_pdf(contenido):
+    """
+    Recomprime un PDF: elimina objetos duplicados, vuelve a comprimir todos
+    los streams y agrupa los objetos en object streams.
+
+    Es lento (alrededor de medio segundo para el template), así que se aplica al
+    template una vez, no a cada PDF generado.
+
+    Args:
+        contenido (bytes): PDF original
+
+    Returns:
+        bytes: PDF equivalente, más pequeño
+    """
+    import fitz  # PyMuPDF
+
+    with fitz_lock:
+        doc = fitz.open(stream=contenido, filetype='pdf')
+        compacto = doc.tobytes(**OPCIONES_COMPACTAR_PLANTILLA)
+        doc.close()
+    return compacto
+
+
+def plantilla_salida():
+    """
+    Template sobre el que se generan los PDFs según PDF_SALIDA.
+
+    Returns:
+        bytes: El template original ('estandar') o su versión compactada una
+            sola vez por proceso ('compacta')
+    """
+    global _plantilla_compacta
+    if modo_salida() != 'compacta':
+        return cargar_plantilla()
+    if _plantilla_compacta is None:
+        with _plantilla_lock:
+            if _plantilla_compacta is None:
+                if not os.path.exists(PDF_TEMPLATE):
+                    raise FileNotFoundError(f"No se encuentra el PDF template: {PDF_TEMPLATE}")
+                with open(PDF_TEMPLATE, 'rb') as f:
+                    _plantilla_compacta = compactar_pdf(f.read())
+    return _plantilla_compacta
+
+
+def layout_defecto():
+    """
+    Layout construido con las constantes de este módulo.
+
+    Returns:
+        dict: {'campos': {campo: {'x', 'y', 'ancho', 'fontsize'}},
+            'fecha_nacimiento': [{'x', 'y'} x 8], 'sexo': {codigo: {'x', 'y'}},
+            'widgets': {clave: nombre del widget en el template}}
+    """
+    return {
+        'campos': {
+            campo: {
+                'x': coords['x'],
+                'y': coords['y'],
+                'ancho': ANCHOS_CAMPOS[campo],
+                'fontsize': TAMANOS_FUENTE.get(campo, TAMANO_FUENTE_DEFECTO),
+            }
+            for campo, coords in COORDENADAS_CAMPOS.items()
+        },
+        'fecha_nacimiento': [dict(coords) for coords in COORDENADAS_FECHA_NACIMIENTO],
+        'sexo': {codigo: dict(coords) for codigo, coords in COORDENADAS_SEXO.items()},
+        'widgets': {},
+    }
+
+
+def ruta_layout():
+    return getattr(settings, 'PDF_LAYOUT_ARCHIVO', '')
+
+
+def leer_layout(ruta=None):
+    """
+    Lee un archivo de layout y lo completa con los valores por defecto.
+
+    Args:
+        ruta (str): Archivo JSON (por defecto PDF_LAYOUT_ARCHIVO)
+
+    Returns:
+        dict: Layout completo; el por defecto si el archivo no existe
+    """
+    layout = layout_defecto()
+    ruta = ruta or ruta_layout()
+    if not ruta or not os.path.exists(ruta):
+        return layout
+
+    with open(ruta, 'r', encoding='utf-8') as f:
+        guardado = json.load(f)
+    for campo, valores in guardado.get('campos', {}).items():
+        layout['campos'].setdefault(campo, {}).update(valores)
+    if guardado.get('fecha_nacimiento'):
+        layout['fecha_nacimiento'] = guardado['fecha_nacimiento']
+    layout['sexo'].update(guardado.get('sexo', {}))
+    layout['widgets'].update(guardado.get('widgets', {}))
+    if guardado.get('plantilla'):
+        layout['plantilla'] = guardado['plantilla']
+    return layout
+
+
+def obtener_layout():
+    """Devuelve el layout del proceso (se lee una sola vez)."""
+    global _layout
+    if _layout is None:
+        with _layout_lock:
+            if _layout is None:
+                _layout = leer_layout()
+    return _layout
+
+
+def version_plantilla():
+    """
+    Identifica el PDF template, el layout y la versión del generador.
+
+    Returns:
+        str: Hash corto que cambia si cambia el template, el layout o el generador
+    """
+    global _version_plantilla
+    if _version_plantilla is None:
+        digest = hashlib.sha256(cargar_plantilla())
+        digest.update(json.dumps(obtener_layout(), sort_keys=True).encode('utf-8'))
+        digest.update(f"{usar_widgets()}:{aplanar_widgets()}:{modo_salida()}".encode('utf-8'))
+        _version_plantilla = f"{digest.hexdigest()[:16]}-{VERSION_GENERADOR}"
+    return _version_plantilla
+
+
+def usar_widgets():
+    return getattr(settings, 'PDF_USAR_WIDGETS', True)
+
+
+def aplanar_widgets():
+    return getattr(settings, 'PDF_APLANAR_WIDGETS', False)
+
+
+@lru_cache(maxsize=4)
+def detectar_widgets(plantilla):
+    """
+    Widgets (campos AcroForm) de la primera página del template.
+
+    Se recorre la página una sola vez por template; los bytes del template
+    son siempre el mismo objeto, así que la consulta a la caché es inmediata.
+
+    Args:
+        plantilla (bytes): PDF template
+
+    Returns:
+        dict: {nombre del campo: tipo de widget ('Text', 'CheckBox', ...)}
+    """
+    import fitz  # PyMuPDF
+
+    with fitz_lock:
+        doc = fitz.open(stream=plantilla, filetype='pdf')
+        widgets = {
+            widget.field_name: widget.field_type_string
+            for widget in doc[0].widgets()
+            if widget.field_name
+        }
+        doc.close()
+    return widgets
+
+
+def _nombre_normalizado(nombre):
+    return nombre.strip().upper().replace(' ', '_').replace('-', '_')
+
+
+def mapa_widgets(layout, widgets):
+    """
+    Qué claves del formulario se llenan con un widget del template.
+
+    Primero se usan los nombres indicados en ``layout['widgets']``; las
+    demás claves se emparejan con el widget del mismo nombre (sin distinguir
+    mayúsculas, espacios ni guiones).
+
+    Args:
+        layout (dict): Layout (ver layout_defecto)
+        widgets (dict): Ver detectar_widgets
+
+    Returns:
+        dict: {clave: nombre del widget}; las claves son los campos del
+            layout, WIDGET_FECHA y PREFIJO_WIDGET_SEXO + código
+    """
+    if not widgets:
+        return {}
+
+    claves = list(layout['campos']) + [WIDGET_FECHA]
+    claves += [PREFIJO_WIDGET_SEXO + codigo for codigo in layout['sexo']]
+    por_nombre = {_nombre_normalizado(nombre): nombre for nombre in widgets}
+
+    mapa = {}
+    for clave in claves:
+        nombre = layout.get('widgets', {}).get(clave)
+        if nombre in widgets:
+            mapa[clave] = nombre
+        elif _nombre_normalizado(clave) in por_nombre:
+            mapa[clave] = por_nombre[_nombre_normalizado(clave)]
+    return mapa
+
+
+def calcular_hash_datos(datos_empleado):
+    """
+    Calcula un hash de los datos normalizados del empleado y del template.
+
+    Dos PDFs con el mismo hash son idénticos, así que sirve como ETag y
+    como clave de caché.
+
+    Args:
+        datos_empleado (dict): Datos normalizados (ver normalizacion.normalizar_hoja)
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    contenido = json.dumps(datos_empleado, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{version_plantilla()}:{contenido}".encode('utf-8')).hexdigest()
+
 
 def convertir_fecha_yyyymmdd_a_ddmmyyyy(fecha_str):
     """
@@ -95,81 +407,329 @@ def split_nombres(nombres_completos):
         return (primer_nombre, segundo_nombre)
 
 
-def insertar_texto_en_pdf(page, texto, x, y, fontsize=10, color=(0, 0, 0)):
+@lru_cache(maxsize=None)
+def _avances_fuente(fontname):
+    """
+    Tabla {carácter: ancho del glifo con letra de 1 pt} de una fuente.
+
+    Se llena a medida que aparecen caracteres; es lo mismo que calcula
+    fitz.get_text_length, pero sin crear la fuente en cada llamada (~40 µs).
+    """
+    import fitz  # PyMuPDF
+
+    with fitz_lock:
+        fuente = fitz.Font(fontname)
+    avances = {}
+
+    def avance(caracter):
+        valor = avances.get(caracter)
+        if valor is None:
+            with fitz_lock:
+                valor = avances[caracter] = fuente.glyph_advance(ord(caracter))
+        return valor
+
+    return avance
+
+
+@lru_cache(maxsize=8192)
+def medir_texto(texto, fontname=FUENTE, fontsize=TAMANO_FUENTE_DEFECTO):
+    """
+    Ancho en puntos de un texto escrito en una línea.
+
+    Los nombres se repiten mucho entre empleados, así que los anchos se
+    cachean por (texto, fuente, tamaño).
+
+    Args:
+        texto (str): Texto a medir
+        fontname (str): Fuente base de PyMuPDF
+        fontsize (float): Tamaño de letra
+
+    Returns:
+        float: Ancho en puntos
+    """
+    avance = _avances_fuente(fontname)
+    return sum(avance(caracter) for caracter in texto) * fontsize
+
+
+def ajustar_tamano(texto, ancho, fontsize=TAMANO_FUENTE_DEFECTO, minimo=TAMANO_FUENTE_MINIMO, fontname=FUENTE):
+    """
+    Tamaño de letra con que un texto cabe en un ancho dado.
+
+    Se calcula a partir de la medida del texto (el ancho es proporcional al
+    tamaño), sin renderizar de prueba.
+
+    Returns:
+        float: ``fontsize`` si el texto cabe; si no, el mayor tamaño (en
+            pasos de 0.5 pt) con que cabe, sin bajar de ``minimo``
+    """
+    medido = medir_texto(texto, fontname, fontsize)
+    if medido <= ancho:
+        return fontsize
+    return max(minimo, math.floor(fontsize * ancho / medido * 2) / 2)
+
+
+def insertar_texto_en_pdf(shape, texto, x, y, fontsize=10, color=(0, 0, 0), ancho=None):
     """
     Inserta texto en una coordenada específica del PDF.
 
     Args:
-        page: Página de PyMuPDF
+        shape: Shape de PyMuPDF (``page.new_shape()``); todos los campos se
+            escriben en el mismo shape y se confirman con un solo commit
         texto (str): Texto a insertar
         x (int/float): Coordenada X
         y (int/float): Coordenada Y
         fontsize (int): Tamaño de fuente
         color (tuple): Color RGB (0-1, 0-1, 0-1)
+        ancho (int/float): Ancho de la casilla; si el texto no cabe se
+            reduce el tamaño de letra (ver ajustar_tamano)
     """
     if not texto:
         return
 
-    # Crear rectángulo para el texto (amplio para que no se corte)
-    text_rect = fitz.Rect(x, y - fontsize, x + 200, y + fontsize)
+    texto = str(texto)
+    tamano = ajustar_tamano(texto, ancho, fontsize) if ancho else fontsize
 
-    # Insertar texto
-    page.insert_textbox(
-        text_rect,
-        str(texto),
-        fontsize=fontsize,
-        fontname="helv",  # Helvetica
+    # Misma línea base que tenía el texto con su tamaño nominal, aunque se reduzca
+    linea_base = y + 0.075 * fontsize
+    shape.insert_text(
+        (x, linea_base),
+        texto,
+        fontsize=tamano,
+        fontname=FUENTE,
         color=color,
-        align=fitz.TEXT_ALIGN_LEFT
     )
 
 
-def marcar_x_en_pdf(page, x, y, size=7, color=(0, 0, 0)):
+def insertar_campo(shape, campo, texto, layout=None):
+    """Escribe un campo del layout con su tamaño de letra y ancho de casilla."""
+    coords = (layout or obtener_layout())['campos'][campo]
+    insertar_texto_en_pdf(
+        shape, texto, coords['x'], coords['y'],
+        fontsize=coords.get('fontsize', TAMANO_FUENTE_DEFECTO),
+        ancho=coords.get('ancho'),
+    )
+
+
+def marcar_x_en_pdf(shape, x, y, size=7, color=(0, 0, 0)):
     """
     Marca una X en una coordenada específica del PDF.
 
     Args:
-        page: Página de PyMuPDF
+        shape: Shape de PyMuPDF (ver insertar_texto_en_pdf)
         x (int/float): Coordenada X
         y (int/float): Coordenada Y
         size (int): Tamaño de la X
         color (tuple): Color RGB (0-1, 0-1, 0-1)
     """
-    # Dibujar línea diagonal de arriba-izquierda a abajo-derecha
-    page.draw_line(
-        (x - size/2, y - size/2),
-        (x + size/2, y + size/2),
-        color=color,
-        width=1.5
-    )
-
-    # Dibujar línea diagonal de arriba-derecha a abajo-izquierda
-    page.draw_line(
-        (x + size/2, y - size/2),
-        (x - size/2, y + size/2),
-        color=color,
-        width=1.5
-    )
+    # Línea diagonal de arriba-izquierda a abajo-derecha
+    shape.draw_line((x - size/2, y - size/2), (x + size/2, y + size/2))
+    # Línea diagonal de arriba-derecha a abajo-izquierda
+    shape.draw_line((x + size/2, y - size/2), (x - size/2, y + size/2))
+    shape.finish(color=color, width=1.5)
 
 
-def insertar_fecha_nacimiento(page, fecha_yyyymmdd):
+def insertar_fecha_nacimiento(shape, fecha_yyyymmdd):
     """
     Inserta la fecha de nacimiento distribuyendo cada dígito en su coordenada.
 
     Args:
-        page: Página de PyMuPDF
+        shape: Shape de PyMuPDF (ver insertar_texto_en_pdf)
         fecha_yyyymmdd (str): Fecha en formato YYYYMMDD
     """
-    # Convertir a DDMMYYYY
-    fecha_ddmmyyyy = convertir_fecha_yyyymmdd_a_ddmmyyyy(fecha_yyyymmdd)
+    insertar_digitos_fecha(shape, convertir_fecha_yyyymmdd_a_ddmmyyyy(fecha_yyyymmdd))
+
+
+def insertar_digitos_fecha(shape, fecha_ddmmyyyy, layout=None):
+    """
+    Inserta una fecha ya convertida a DDMMYYYY, un dígito por casilla.
 
+    Args:
+        shape: Shape de PyMuPDF (ver insertar_texto_en_pdf)
+        fecha_ddmmyyyy (str): Fecha en formato DDMMYYYY
+        layout (dict): Layout a usar (por defecto el del proceso)
+    """
     if not fecha_ddmmyyyy or len(fecha_ddmmyyyy) != 8:
         return
 
     # Insertar cada dígito en su coordenada
+    coordenadas = (layout or obtener_layout())['fecha_nacimiento']
     for i, digito in enumerate(fecha_ddmmyyyy):
-        coords = COORDENADAS_FECHA_NACIMIENTO[i]
-        insertar_texto_en_pdf(page, digito, coords['x'], coords['y'], fontsize=10)
+        coords = coordenadas[i]
+        insertar_texto_en_pdf(shape, digito, coords['x'], coords['y'], fontsize=10)
+
+
+def valores_formulario(datos_empleado):
+    """
+    Textos que se escriben en el formulario, por campo.
+
+    Args:
+        datos_empleado (dict): Datos del empleado (ver generar_pdf_bytes)
+
+    Returns:
+        dict: Campos de texto del layout, WIDGET_FECHA (DDMMYYYY) y
+            CODIGO_SEXO
+    """
+    # Nombres y fecha: precalculados en el snapshot o calculados aquí
+    if 'PRIMER_NOMBRE' in datos_empleado:
+        primer_nombre = datos_empleado['PRIMER_NOMBRE']
+        segundo_nombre = datos_empleado.get('SEGUNDO_NOMBRE', '')
+    else:
+        primer_nombre, segundo_nombre = split_nombres(datos_empleado.get('NOMBRES', ''))
+
+    if 'FECHA_NACIMIENTO_DDMMYYYY' in datos_empleado:
+        fecha_ddmmyyyy = datos_empleado['FECHA_NACIMIENTO_DDMMYYYY']
+    else:
+        fecha_ddmmyyyy = convertir_fecha_yyyymmdd_a_ddmmyyyy(datos_empleado.get('FECHA_NACIMIENTO', ''))
+
+    return {
+        'CEDULA': datos_empleado.get('CEDULA', ''),
+        'PRIMER_APELLIDO': datos_empleado.get('PRIMER_APELLIDO', ''),
+        'SEGUNDO_APELLIDO': datos_empleado.get('SEGUNDO_APELLIDO', ''),
+        'PRIMER_NOMBRE': primer_nombre,
+        'SEGUNDO_NOMBRE': segundo_nombre,
+        WIDGET_FECHA: fecha_ddmmyyyy,
+        'PAIS_NACIMIENTO': datos_empleado.get('PAIS_NACIMIENTO', ''),
+        'CODIGO_SEXO': str(datos_empleado.get('CODIGO_SEXO', '')),
+        'DEPARTAMENTO_NACIMIENTO': datos_empleado.get('DEPARTAMENTO_NACIMIENTO', ''),
+        'CIUDAD_NACIMIENTO': datos_empleado.get('CIUDAD_NACIMIENTO', ''),
+    }
+
+
+def dibujar_formulario(shape, datos_empleado, layout=None, omitir=()):
+    """
+    Dibuja todos los campos del empleado en un shape de la página.
+
+    Lo usan la generación del PDF y las vistas previas de calibración, así
+    ambas muestran exactamente lo mismo.
+
+    Args:
+        shape: Shape de PyMuPDF; el llamador hace el commit
+        datos_empleado (dict): Datos del empleado (ver generar_pdf_bytes)
+        layout (dict): Layout a usar (por defecto el del proceso)
+        omitir (iterable): Claves que ya se llenaron con widgets (ver mapa_widgets)
+    """
+    layout = layout or obtener_layout()
+    valores = valores_formulario(datos_empleado)
+
+    for campo in ('CEDULA', 'PRIMER_APELLIDO', 'SEGUNDO_APELLIDO', 'PRIMER_NOMBRE', 'SEGUNDO_NOMBRE'):
+        if campo not in omitir:
+            insertar_campo(shape, campo, valores[campo], layout)
+
+    # Insertar FECHA DE NACIMIENTO (distribuyendo cada dígito)
+    if valores[WIDGET_FECHA] and WIDGET_FECHA not in omitir:
+        insertar_digitos_fecha(shape, valores[WIDGET_FECHA], layout)
+
+    if 'PAIS_NACIMIENTO' not in omitir:
+        insertar_campo(shape, 'PAIS_NACIMIENTO', valores['PAIS_NACIMIENTO'], layout)
+
+    # Marcar SEXO con X
+    codigo_sexo = valores['CODIGO_SEXO']
+    if codigo_sexo in layout['sexo'] and PREFIJO_WIDGET_SEXO + codigo_sexo not in omitir:
+        coords = layout['sexo'][codigo_sexo]
+        marcar_x_en_pdf(shape, coords['x'], coords['y'], size=7)
+
+    for campo in ('DEPARTAMENTO_NACIMIENTO', 'CIUDAD_NACIMIENTO'):
+        if campo not in omitir:
+            insertar_campo(shape, campo, valores[campo], layout)
+
+
+def llenar_widgets(page, datos_empleado, mapa):
+    """
+    Llena los widgets del template con los datos del empleado.
+
+    Los textos que no caben con la letra del widget se escriben con tamaño
+    automático (el visor lo ajusta al ancho del widget).
+
+    Args:
+        page: Página de PyMuPDF con los widgets
+        datos_empleado (dict): Datos del empleado (ver generar_pdf_bytes)
+        mapa (dict): Ver mapa_widgets
+    """
+    import fitz  # PyMuPDF
+
+    valores = valores_formulario(datos_empleado)
+    claves = {nombre: clave for clave, nombre in mapa.items()}
+
+    for widget in page.widgets():
+        clave = claves.get(widget.field_name)
+        if clave is None:
+            continue
+
+        if clave.startswith(PREFIJO_WIDGET_SEXO):
+            marcado = valores['CODIGO_SEXO'] == clave[len(PREFIJO_WIDGET_SEXO):]
+            if widget.field_type in (fitz.PDF_WIDGET_TYPE_CHECKBOX, fitz.PDF_WIDGET_TYPE_RADIOBUTTON):
+                widget.field_value = widget.on_state() if marcado else 'Off'
+            else:
+                widget.field_value = 'X' if marcado else ''
+        else:
+            texto = str(valores[clave])
+            tamano = widget.text_fontsize or TAMANO_FUENTE_DEFECTO
+            # 2 pt de borde a cada lado del widget
+            if texto and medir_texto(texto, FUENTE, tamano) > widget.rect.width - 4:
+                widget.text_fontsize = 0
+            widget.field_value = texto
+        widget.update()
+
+
+def generar_pdf_bytes(datos_empleado, plantilla=None, widgets=None, aplanar=None):
+    """
+    Rellena el PDF del formulario EPS con los datos del empleado en memoria.
+
+    Args:
+        datos_empleado (dict): Diccionario con los datos del empleado
+            Debe contener: CEDULA, PRIMER_APELLIDO, SEGUNDO_APELLIDO, NOMBRES.
+            Si trae los campos precalculados del snapshot (PRIMER_NOMBRE,
+            SEGUNDO_NOMBRE, FECHA_NACIMIENTO_DDMMYYYY) se usan directamente.
+        plantilla (bytes): PDF template (por defecto plantilla_salida())
+        widgets (bool): Llenar los widgets del template si los tiene (por
+            defecto PDF_USAR_WIDGETS); si no, todo se dibuja encima
+        aplanar (bool): Convertir los widgets llenados en contenido de la
+            página, no editable (por defecto PDF_APLANAR_WIDGETS)
+
+    Returns:
+        bytes: Contenido del PDF generado
+
+    Raises:
+        FileNotFoundError: Si no se encuentra el PDF template
+        Exception: Si hay error al generar el PDF
+    """
+    import fitz  # PyMuPDF
+
+    # Verificar que existe el template (y leerlo si es la primera vez)
+    plantilla = plantilla or plantilla_salida()
+    layout = obtener_layout()
+    widgets = usar_widgets() if widgets is None else widgets
+    aplanar = aplanar_widgets() if aplanar is None else aplanar
+    mapa = mapa_widgets(layout, detectar_widgets(plantilla)) if widgets else {}
+
+    with fitz_lock:
+        try:
+            # Abrir el PDF template desde memoria
+            doc = fitz.open(stream=plantilla, filetype='pdf')
+
+            # Obtener la primera página (asumimos que el formulario está en página 1)
+            page = doc[0]
+
+            if mapa:
+                llenar_widgets(page, datos_empleado, mapa)
+
+            # Lo que no tiene widget se dibuja en un solo shape: cada commit
+            # reescribe el contenido de la página, que en este template es muy grande
+            shape = page.new_shape()
+            dibujar_formulario(shape, datos_empleado, layout, omitir=mapa)
+            shape.commit()
+
+            if mapa and aplanar:
+                doc.bake(annots=False, widgets=True)
+
+            # Serializar el PDF generado
+            contenido = doc.tobytes(**OPCIONES_SALIDA[modo_salida()])
+            doc.close()
+
+            return contenido
+
+        except Exception as e:
+            raise Exception(f"Error al generar el PDF: {str(e)}")
 
 
 def rellenar_pdf_empleado(datos_empleado, output_path):
@@ -188,84 +748,12 @@ def rellenar_pdf_empleado(datos_empleado, output_path):
         FileNotFoundError: Si no se encuentra el PDF template
         Exception: Si hay error al generar el PDF
     """
-    # Verificar que existe el template
-    if not os.path.exists(PDF_TEMPLATE):
-        raise FileNotFoundError(f"No se encuentra el PDF template: {PDF_TEMPLATE}")
+    contenido = generar_pdf_bytes(datos_empleado)
 
-    try:
-        # Abrir el PDF template
-        doc = fitz.open(PDF_TEMPLATE)
-
-        # Obtener la primera página (asumimos que el formulario está en página 1)
-        page = doc[0]
-
-        # Extraer datos del empleado
-        cedula = datos_empleado.get('CEDULA', '')
-        primer_apellido = datos_empleado.get('PRIMER_APELLIDO', '')
-        segundo_apellido = datos_empleado.get('SEGUNDO_APELLIDO', '')
-        nombres_completos = datos_empleado.get('NOMBRES', '')
-        fecha_nacimiento = datos_empleado.get('FECHA_NACIMIENTO', '')
-        pais_nacimiento = datos_empleado.get('PAIS_NACIMIENTO', '')
-        codigo_sexo = datos_empleado.get('CODIGO_SEXO', '')
-        departamento_nacimiento = datos_empleado.get('DEPARTAMENTO_NACIMIENTO', '')
-        ciudad_nacimiento = datos_empleado.get('CIUDAD_NACIMIENTO', '')
-
-        # Dividir nombres
-        primer_nombre, segundo_nombre = split_nombres(nombres_completos)
-
-        # Insertar CEDULA
-        coords = COORDENADAS_CAMPOS['CEDULA']
-        insertar_texto_en_pdf(page, cedula, coords['x'], coords['y'], fontsize=10)
-
-        # Insertar PRIMER APELLIDO
-        coords = COORDENADAS_CAMPOS['PRIMER_APELLIDO']
-        insertar_texto_en_pdf(page, primer_apellido, coords['x'], coords['y'], fontsize=10)
-
-        # Insertar SEGUNDO APELLIDO
-        coords = COORDENADAS_CAMPOS['SEGUNDO_APELLIDO']
-        insertar_texto_en_pdf(page, segundo_apellido, coords['x'], coords['y'], fontsize=10)
-
-        # Insertar PRIMER NOMBRE
-        coords = COORDENADAS_CAMPOS['PRIMER_NOMBRE']
-        insertar_texto_en_pdf(page, primer_nombre, coords['x'], coords['y'], fontsize=10)
-
-        # Insertar SEGUNDO NOMBRE (si existe)
-        if segundo_nombre:
-            coords = COORDENADAS_CAMPOS['SEGUNDO_NOMBRE']
-            insertar_texto_en_pdf(page, segundo_nombre, coords['x'], coords['y'], fontsize=10)
-
-        # Insertar FECHA DE NACIMIENTO (distribuyendo cada dígito)
-        if fecha_nacimiento:
-            insertar_fecha_nacimiento(page, fecha_nacimiento)
-
-        # Insertar PAIS DE NACIMIENTO
-        if pais_nacimiento:
-            coords = COORDENADAS_CAMPOS['PAIS_NACIMIENTO']
-            insertar_texto_en_pdf(page, pais_nacimiento, coords['x'], coords['y'], fontsize=10)
-
-        # Marcar SEXO con X
-        if codigo_sexo in COORDENADAS_SEXO:
-            coords = COORDENADAS_SEXO[str(codigo_sexo)]
-            marcar_x_en_pdf(page, coords['x'], coords['y'], size=7)
-
-        # Insertar DEPARTAMENTO DE NACIMIENTO
-        if departamento_nacimiento:
-            coords = COORDENADAS_CAMPOS['DEPARTAMENTO_NACIMIENTO']
-            insertar_texto_en_pdf(page, departamento_nacimiento, coords['x'], coords['y'], fontsize=8)
-
-        # Insertar CIUDAD DE NACIMIENTO
-        if ciudad_nacimiento:
-            coords = COORDENADAS_CAMPOS['CIUDAD_NACIMIENTO']
-            insertar_texto_en_pdf(page, ciudad_nacimiento, coords['x'], coords['y'], fontsize=10)
-
-        # Guardar el PDF generado
-        doc.save(output_path)
-        doc.close()
+    with open(output_path, 'wb') as f:
+        f.write(contenido)
 
-        return output_path
-
-    except Exception as e:
-        raise Exception(f"Error al generar el PDF: {str(e)}")
+    return output_path
 
 
 def generar_nombre_archivo_pdf(cedula):
@@ -0,0 +1,163 @@
+"""
+Esquema (encabezados) de las hojas de empleados.
+
+Define en un solo lugar qué columna de la hoja alimenta cada campo del
+formulario, y permite obtener y cachear el mapa encabezado -> índice de cada
+hoja leyendo solo la fila 1, validar que las columnas esperadas existen y
+comparar el esquema actual con uno guardado anteriormente.
+"""
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+from .sheets_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Campo del formulario -> encabezado de la columna en la hoja
+CAMPOS_FORMULARIO = {
+    'CEDULA': 'CEDULA',
+    'PRIMER_APELLIDO': 'PRIMER APELLIDO',
+    'SEGUNDO_APELLIDO': 'SEGUNDO APELLIDO',
+    'NOMBRES': 'NOMBRES',
+    'FECHA_NACIMIENTO': 'FECHA DE NACIMIENTO',
+    'PAIS_NACIMIENTO': 'PAIS DE NACIMIENTO',
+    'CODIGO_SEXO': 'CODIGO SEXO',
+    'DEPARTAMENTO_NACIMIENTO': 'DEPARTAMENTO NACIMIENTO',
+    'CIUDAD_NACIMIENTO': 'CIUDAD DE NACIMIENTO',
+}
+
+# Esquemas conocidos en este proceso: {nombre_hoja: {encabezado: índice}}
+_esquemas = {}
+_esquemas_lock = threading.Lock()
+
+
+def encabezados_unicos(headers):
+    """
+    Agrega sufijos a los encabezados duplicados ('CIUDAD', 'CIUDAD_1', ...).
+
+    Args:
+        headers (list): Encabezados tal como vienen en la hoja
+
+    Returns:
+        list: Encabezados sin duplicados, en el mismo orden
+    """
+    seen = {}
+    unique_headers = []
+    for header in headers:
+        if header in seen:
+            seen[header] += 1
+            unique_headers.append(f"{header}_{seen[header]}")
+        else:
+            seen[header] = 0
+            unique_headers.append(header)
+    return unique_headers
+
+
+def mapa_encabezados(headers):
+    """Devuelve {encabezado: índice de columna}, con duplicados renombrados."""
+    return {header: i for i, header in enumerate(encabezados_unicos(headers))}
+
+
+def campos_faltantes(esquema):
+    """
+    Lista los campos del formulario cuya columna no existe en el esquema.
+
+    Args:
+        esquema (dict): {encabezado: índice}
+
+    Returns:
+        list: Tuplas (campo, encabezado esperado)
+    """
+    return [
+        (campo, encabezado)
+        for campo, encabezado in CAMPOS_FORMULARIO.items()
+        if encabezado not in esquema
+    ]
+
+
+def registrar_encabezados(sheet_name, headers):
+    """
+    Actualiza el esquema cacheado de una hoja y lo valida si cambió.
+
+    Se llama cada vez que se descarga una hoja, así un encabezado renombrado
+    se detecta al cargar los datos y no cuando un campo sale vacío.
+
+    Returns:
+        dict: El esquema {encabezado: índice}
+    """
+    esquema = mapa_encabezados(headers)
+    with _esquemas_lock:
+        cambio = _esquemas.get(sheet_name) != esquema
+        if cambio:
+            _esquemas[sheet_name] = esquema
+    if cambio:
+        for campo, encabezado in campos_faltantes(esquema):
+            logger.error(
+                f"La hoja '{sheet_name}' no tiene la columna '{encabezado}' "
+                f"(campo {campo}); el campo saldrá vacío"
+            )
+    return esquema
+
+
+def obtener_esquema(sheet_name, refrescar=False):
+    """
+    Devuelve el esquema de una hoja, leyendo solo su fila de encabezados.
+
+    Args:
+        sheet_name (str): Nombre de la hoja
+        refrescar (bool): Ignorar el esquema cacheado en este proceso
+
+    Returns:
+        dict: {encabezado: índice}
+    """
+    if refrescar or sheet_name not in _esquemas:
+        registrar_encabezados(sheet_name, get_backend().obtener_encabezados(sheet_name))
+    return _esquemas[sheet_name]
+
+
+def ruta_esquema_guardado():
+    return getattr(settings, 'SHEETS_ESQUEMA_ARCHIVO', '')
+
+
+def guardar_esquemas(esquemas, ruta=None):
+    """Guarda los esquemas en un JSON para compararlos en ejecuciones futuras."""
+    ruta = ruta or ruta_esquema_guardado()
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(esquemas, f, ensure_ascii=False, indent=2)
+
+
+def cargar_esquemas(ruta=None):
+    """
+    Carga los esquemas guardados.
+
+    Returns:
+        dict: {nombre_hoja: {encabezado: índice}} o None si no hay archivo
+    """
+    ruta = ruta or ruta_esquema_guardado()
+    if not ruta or not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def diferencias_esquema(anterior, actual):
+    """
+    Compara dos esquemas de una misma hoja.
+
+    Returns:
+        dict: {'agregadas': [...], 'eliminadas': [...], 'movidas': [(encabezado, antes, ahora)]}
+    """
+    return {
+        'agregadas': [h for h in actual if h not in anterior],
+        'eliminadas': [h for h in anterior if h not in actual],
+        'movidas': [
+            (h, anterior[h], actual[h])
+            for h in actual
+            if h in anterior and anterior[h] != actual[h]
+        ],
+    }
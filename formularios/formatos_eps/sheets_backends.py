@@ -0,0 +1,476 @@
+"""
+Backends de datos para las hojas de empleados.
+
+El backend se selecciona con ``settings.SHEETS_BACKEND``:
+
+- ``gspread``: Google Sheets real (producción).
+- ``archivo``: un directorio con un CSV por hoja (``Planta.csv``,
+  ``Manipuladoras.csv``) o un libro ``.xlsx`` con una hoja por nombre.
+  Un snapshot exportado (ver ``snapshot.py``) tiene este mismo formato.
+- ``csv_http``: un CSV por hoja descargado por HTTP (``SHEETS_CSV_URL`` con
+  ``{hoja}``; por ejemplo las hojas publicadas en la web como CSV).
+- ``fake``: datos generados en memoria, con latencia y errores configurables.
+  Sirve para pruebas de carga sin consumir la cuota de la API de Google.
+
+Todos los backends devuelven las filas como lista de listas, con la fila de
+encabezados en la primera posición (igual que ``worksheet.get_all_values()``).
+``iterar_filas`` entrega las mismas filas una a una, sin cargar la hoja
+completa (ver ingesta).
+"""
+import csv
+import io
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import cuota
+from .circuito import get_circuito
+
+logger = logging.getLogger(__name__)
+
+# Encabezados que usan los datos simulados (los mismos de la hoja real)
+ENCABEZADOS_FAKE = [
+    'CEDULA',
+    'PRIMER APELLIDO',
+    'SEGUNDO APELLIDO',
+    'NOMBRES',
+    'FECHA DE NACIMIENTO',
+    'PAIS DE NACIMIENTO',
+    'CODIGO SEXO',
+    'DEPARTAMENTO NACIMIENTO',
+    'CIUDAD DE NACIMIENTO',
+]
+
+# Prefijo de cédula por hoja en los datos simulados
+PREFIJOS_FAKE = {
+    'Planta': 1000000000,
+    'Manipuladoras': 2000000000,
+}
+
+_APELLIDOS_FAKE = ['GARCIA', 'LOPEZ', 'RODRIGUEZ', 'MARTINEZ', 'GOMEZ', 'DIAZ', 'MUÑOZ', 'ROJAS']
+_NOMBRES_FAKE = ['JUAN CARLOS', 'MARIA', 'ANA LUCIA', 'PEDRO', 'LUISA FERNANDA', 'JOSE', 'DIANA', 'CARLOS ANDRES']
+_CIUDADES_FAKE = [('VALLE DEL CAUCA', 'CALI'), ('ANTIOQUIA', 'MEDELLIN'), ('CAUCA', 'POPAYAN'), ('NARIÑO', 'PASTO')]
+
+# Lecturas de la API por llamada de gspread: metadatos del libro, metadatos
+# de la pestaña y los valores (ver cuota)
+LECTURAS_POR_LLAMADA = 3
+
+# Exportación en CSV de una pestaña de Google Sheets
+URL_EXPORTACION_CSV = 'https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}'
+
+
+def cedula_fake(sheet_name, indice):
+    """
+    Devuelve la cédula de la fila ``indice`` de una hoja simulada.
+
+    Útil para que los scripts de carga generen cédulas que existen.
+    """
+    return str(PREFIJOS_FAKE.get(sheet_name, 3000000000) + indice)
+
+
+def filas_csv_http(url, session=None, timeout=None):
+    """
+    Descarga un CSV por HTTP y entrega sus filas a medida que llegan.
+
+    El cuerpo se lee por bloques desde el socket y se parsea sin guardarlo
+    completo en memoria (las celdas con saltos de línea se respetan).
+
+    Args:
+        url (str): URL del CSV
+        session: Sesión de requests (por ejemplo la autorizada de gspread);
+            por defecto se usa una nueva sin autenticación
+        timeout (float): Segundos de espera de la conexión y entre bloques
+            (por defecto SHEETS_TIMEOUT)
+
+    Yields:
+        list: Filas del CSV (listas de str)
+
+    Raises:
+        ConnectionError: Si la respuesta no es 200 o la conexión falla,
+            también a mitad de la descarga
+    """
+    import requests
+    from urllib3.exceptions import HTTPError
+
+    timeout = timeout or getattr(settings, 'SHEETS_TIMEOUT', 15)
+    try:
+        respuesta = (session or requests).get(url, stream=True, timeout=timeout)
+    except requests.RequestException as e:
+        raise ConnectionError(f"No se pudo descargar el CSV: {str(e)}") from e
+    try:
+        if respuesta.status_code != 200:
+            raise ConnectionError(f"Error al descargar el CSV ({respuesta.status_code}): {url}")
+        # Descomprimir gzip si el servidor lo usa, y no cerrar el stream al
+        # llegar al final (TextIOWrapper lee una vez más para detectar el EOF)
+        respuesta.raw.decode_content = True
+        respuesta.raw.auto_close = False
+        texto = io.TextIOWrapper(respuesta.raw, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(texto)
+        except (requests.RequestException, HTTPError) as e:
+            # Se lee el socket directamente: los errores son de urllib3
+            raise ConnectionError(f"Se interrumpió la descarga del CSV: {str(e)}") from e
+    finally:
+        respuesta.close()
+
+
+class SheetsBackend:
+    """Interfaz común de los backends de hojas."""
+
+    nombre = 'base'
+
+    def obtener_valores(self, sheet_name):
+        """
+        Obtiene todas las filas de una hoja.
+
+        Args:
+            sheet_name (str): Nombre de la hoja (ej: 'Planta')
+
+        Returns:
+            list: Lista de filas (listas de str); la primera es de encabezados
+        """
+        raise NotImplementedError
+
+    def obtener_encabezados(self, sheet_name):
+        """
+        Obtiene solo la fila de encabezados de una hoja.
+
+        Los backends que pueden leer una sola fila lo sobrescriben para no
+        descargar la hoja completa.
+
+        Returns:
+            list: Encabezados (str) en el orden de las columnas
+        """
+        valores = self.obtener_valores(sheet_name)
+        return valores[0] if valores else []
+
+    def obtener_filas(self, sheet_name, fila_inicio, fila_fin):
+        """
+        Obtiene un rango de filas de una hoja (numeración de la hoja, desde 1).
+
+        Las filas que no existen se devuelven vacías, así el resultado
+        siempre tiene ``fila_fin - fila_inicio + 1`` elementos.
+
+        Returns:
+            list: Filas (listas de str)
+        """
+        valores = self.obtener_valores(sheet_name)[fila_inicio - 1:fila_fin]
+        return valores + [[] for _ in range(fila_fin - fila_inicio + 1 - len(valores))]
+
+    def iterar_filas(self, sheet_name):
+        """
+        Entrega las filas de una hoja una a una (la primera es de encabezados).
+
+        Los backends que pueden leer la hoja por partes lo sobrescriben; por
+        defecto se recorre la hoja completa.
+
+        Returns:
+            iterator: Filas (listas de str)
+        """
+        return iter(self.obtener_valores(sheet_name))
+
+
+def _es_falla_de_google(error):
+    """Errores que indican que Google no está disponible (no errores de uso)."""
+    import requests
+
+    if isinstance(error, (requests.RequestException, TimeoutError, ConnectionError)):
+        return True
+    estado = getattr(getattr(error, 'response', None), 'status_code', None)
+    return estado is not None and (estado == 429 or estado >= 500)
+
+
+@contextmanager
+def _llamada_google(lecturas=LECTURAS_POR_LLAMADA, streaming=False):
+    """
+    Envuelve una llamada a Google Sheets.
+
+    - El circuito (ver circuito) rechaza la llamada si Google viene fallando.
+    - Se descuentan las lecturas de la cuota compartida (ver cuota); un 429
+      la vacía para que todos los procesos esperen.
+    - Los errores de red y los timeouts se convierten en ConnectionError,
+      que es lo que manejan las vistas.
+
+    Con ``streaming`` el bloque recorre una descarga que el llamador consume
+    a su ritmo: su duración no cuenta como llamada lenta, y si el llamador
+    deja de leer antes del final la llamada cuenta como exitosa.
+    """
+    import requests
+
+    circuito = get_circuito()
+    circuito.antes()
+    try:
+        cuota.consumir(lecturas)
+    except Exception:
+        circuito.cancelar()
+        raise
+
+    inicio = time.monotonic()
+    try:
+        yield
+    except GeneratorExit:
+        circuito.exito(0)
+        raise
+    except Exception as e:
+        if not _es_falla_de_google(e):
+            circuito.exito(time.monotonic() - inicio)
+            raise
+        if getattr(getattr(e, 'response', None), 'status_code', None) == 429:
+            cuota.vaciar()
+        circuito.fallo()
+        if isinstance(e, (requests.RequestException, TimeoutError)):
+            raise ConnectionError(f"Google Sheets no respondió: {str(e)}") from e
+        raise
+    circuito.exito(0 if streaming else time.monotonic() - inicio)
+
+
+class GspreadBackend(SheetsBackend):
+    """
+    Google Sheets real a través de gspread.
+
+    Cada llamada pasa por el circuito y la cuota compartida (ver
+    _llamada_google) y tiene el timeout SHEETS_TIMEOUT (ver get_client).
+    """
+
+    nombre = 'gspread'
+
+    def _abrir_hoja(self, sheet_name):
+        from .google_sheets import get_client, SPREADSHEET_ID
+
+        client = get_client()
+        return client, client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
+
+    def obtener_valores(self, sheet_name):
+        with _llamada_google():
+            _, sheet = self._abrir_hoja(sheet_name)
+            return sheet.get_all_values()
+
+    def obtener_encabezados(self, sheet_name):
+        with _llamada_google():
+            _, sheet = self._abrir_hoja(sheet_name)
+            # Solo la fila 1, no la hoja completa
+            return sheet.row_values(1)
+
+    def obtener_filas(self, sheet_name, fila_inicio, fila_fin):
+        with _llamada_google():
+            _, sheet = self._abrir_hoja(sheet_name)
+            # Filas completas en notación A1 ('5:7'); Google omite las vacías del final
+            valores = list(sheet.get(f"{fila_inicio}:{fila_fin}"))
+        return valores + [[] for _ in range(fila_fin - fila_inicio + 1 - len(valores))]
+
+    def iterar_filas(self, sheet_name):
+        from .google_sheets import SPREADSHEET_ID
+
+        # Abrir la hoja y leer el CSV completo son una sola llamada: un error
+        # a mitad de la descarga también abre el circuito
+        with _llamada_google(streaming=True):
+            client, sheet = self._abrir_hoja(sheet_name)
+            # Exportación CSV de la pestaña, con la sesión autorizada de gspread
+            url = URL_EXPORTACION_CSV.format(spreadsheet_id=SPREADSHEET_ID, gid=sheet.id)
+            yield from filas_csv_http(url, session=client.session)
+
+
+class ArchivoBackend(SheetsBackend):
+    """Hojas leídas desde un directorio de CSV o un libro XLSX local."""
+
+    nombre = 'archivo'
+
+    def __init__(self, ruta):
+        if not ruta:
+            raise ValueError("SHEETS_ARCHIVO es obligatorio con SHEETS_BACKEND='archivo'")
+        self.ruta = ruta
+
+    def obtener_valores(self, sheet_name):
+        if self.ruta.lower().endswith('.xlsx'):
+            return self._leer_xlsx(sheet_name)
+        return self._leer_csv(sheet_name)
+
+    def _ruta_csv(self, sheet_name):
+        ruta_csv = os.path.join(self.ruta, f"{sheet_name}.csv")
+        if not os.path.exists(ruta_csv):
+            raise FileNotFoundError(f"No se encuentra la hoja '{sheet_name}': {ruta_csv}")
+        return ruta_csv
+
+    def _leer_csv(self, sheet_name):
+        with open(self._ruta_csv(sheet_name), 'r', encoding='utf-8-sig', newline='') as f:
+            return [row for row in csv.reader(f)]
+
+    def iterar_filas(self, sheet_name):
+        if self.ruta.lower().endswith('.xlsx'):
+            return super().iterar_filas(sheet_name)
+        return self._iterar_csv(self._ruta_csv(sheet_name))
+
+    def _iterar_csv(self, ruta_csv):
+        with open(ruta_csv, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.reader(f)
+
+    def obtener_encabezados(self, sheet_name):
+        if self.ruta.lower().endswith('.xlsx'):
+            return super().obtener_encabezados(sheet_name)
+
+        with open(self._ruta_csv(sheet_name), 'r', encoding='utf-8-sig', newline='') as f:
+            return next(csv.reader(f), [])
+
+    def _leer_xlsx(self, sheet_name):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError("Para leer archivos .xlsx instale openpyxl: pip install openpyxl")
+
+        libro = openpyxl.load_workbook(self.ruta, read_only=True, data_only=True)
+        try:
+            if sheet_name not in libro.sheetnames:
+                raise FileNotFoundError(f"El libro {self.ruta} no tiene la hoja '{sheet_name}'")
+            return [
+                ['' if valor is None else str(valor) for valor in row]
+                for row in libro[sheet_name].iter_rows(values_only=True)
+            ]
+        finally:
+            libro.close()
+
+
+class CsvHttpBackend(SheetsBackend):
+    """Un CSV por hoja descargado por HTTP (``SHEETS_CSV_URL`` con ``{hoja}``)."""
+
+    nombre = 'csv_http'
+
+    def __init__(self, url):
+        if '{hoja}' not in (url or ''):
+            raise ValueError("SHEETS_CSV_URL debe incluir '{hoja}' con SHEETS_BACKEND='csv_http'")
+        self.url = url
+
+    def iterar_filas(self, sheet_name):
+        return filas_csv_http(self.url.format(hoja=sheet_name))
+
+    def obtener_valores(self, sheet_name):
+        return list(self.iterar_filas(sheet_name))
+
+    def obtener_encabezados(self, sheet_name):
+        filas = self.iterar_filas(sheet_name)
+        try:
+            return next(filas, [])
+        finally:
+            # Cierra la conexión sin descargar el resto
+            filas.close()
+
+
+class FakeBackend(SheetsBackend):
+    """
+    Datos simulados en memoria para pruebas de carga.
+
+    Cada llamada espera ``latencia_ms`` (más un jitter de hasta el 20%) y
+    falla con probabilidad ``tasa_error``, imitando a la API de Google.
+    """
+
+    nombre = 'fake'
+
+    def __init__(self, filas=1000, latencia_ms=0, tasa_error=0):
+        self.filas = filas
+        self.latencia_ms = latencia_ms
+        self.tasa_error = tasa_error
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _simular_llamada(self, sheet_name):
+        # Igual que Google: circuito, cuota compartida y timeout
+        with _llamada_google(lecturas=1):
+            if self.latencia_ms:
+                latencia = self.latencia_ms * random.uniform(1.0, 1.2) / 1000
+                timeout = getattr(settings, 'SHEETS_TIMEOUT', 15)
+                time.sleep(min(latencia, timeout))
+                if latencia > timeout:
+                    raise TimeoutError(f"Timeout simulado al leer la hoja '{sheet_name}' ({timeout} s)")
+            if self.tasa_error and random.random() < self.tasa_error:
+                raise ConnectionError(f"Error simulado al leer la hoja '{sheet_name}'")
+
+    def _generar_fila(self, sheet_name, indice):
+        departamento, ciudad = _CIUDADES_FAKE[indice % len(_CIUDADES_FAKE)]
+        return [
+            cedula_fake(sheet_name, indice),
+            _APELLIDOS_FAKE[indice % len(_APELLIDOS_FAKE)],
+            _APELLIDOS_FAKE[(indice // 7) % len(_APELLIDOS_FAKE)],
+            _NOMBRES_FAKE[indice % len(_NOMBRES_FAKE)],
+            f"{1960 + indice % 45}{1 + indice % 12:02d}{1 + indice % 28:02d}",
+            'COLOMBIA',
+            str(indice % 2),
+            departamento,
+            ciudad,
+        ]
+
+    def obtener_valores(self, sheet_name):
+        self._simular_llamada(sheet_name)
+
+        with self._lock:
+            if sheet_name not in self._cache:
+                filas = [list(ENCABEZADOS_FAKE)]
+                filas.extend(self._generar_fila(sheet_name, i) for i in range(self.filas))
+                self._cache[sheet_name] = filas
+
+        # Copia superficial: el llamador puede modificar la lista
+        return list(self._cache[sheet_name])
+
+    def obtener_encabezados(self, sheet_name):
+        self._simular_llamada(sheet_name)
+        return list(ENCABEZADOS_FAKE)
+
+    def obtener_filas(self, sheet_name, fila_inicio, fila_fin):
+        self._simular_llamada(sheet_name)
+        # Fila 1: encabezados; fila n: registro n - 2
+        return [
+            list(ENCABEZADOS_FAKE) if fila == 1
+            else self._generar_fila(sheet_name, fila - 2) if fila - 2 < self.filas
+            else []
+            for fila in range(fila_inicio, fila_fin + 1)
+        ]
+
+    def iterar_filas(self, sheet_name):
+        self._simular_llamada(sheet_name)
+        # Filas generadas a medida que se piden, sin la caché de obtener_valores
+        yield list(ENCABEZADOS_FAKE)
+        for i in range(self.filas):
+            yield self._generar_fila(sheet_name, i)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def crear_backend(nombre=None):
+    """
+    Crea el backend indicado (o el configurado en settings).
+
+    Raises:
+        ValueError: Si el nombre de backend no es válido
+    """
+    nombre = nombre or getattr(settings, 'SHEETS_BACKEND', 'gspread')
+
+    if nombre == 'gspread':
+        return GspreadBackend()
+    if nombre == 'archivo':
+        return ArchivoBackend(getattr(settings, 'SHEETS_ARCHIVO', ''))
+    if nombre == 'csv_http':
+        return CsvHttpBackend(getattr(settings, 'SHEETS_CSV_URL', ''))
+    if nombre == 'fake':
+        return FakeBackend(
+            filas=getattr(settings, 'SHEETS_FAKE_FILAS', 1000),
+            latencia_ms=getattr(settings, 'SHEETS_FAKE_LATENCIA_MS', 0),
+            tasa_error=getattr(settings, 'SHEETS_FAKE_TASA_ERROR', 0),
+        )
+
+    raise ValueError(f"SHEETS_BACKEND desconocido: '{nombre}' (use gspread, archivo, csv_http o fake)")
+
+
+def get_backend():
+    """Devuelve el backend configurado (se crea una sola vez por proceso)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = crear_backend()
+                logger.info(f"Usando backend de hojas: {_backend.nombre}")
+    return _backend
@@ -0,0 +1,349 @@
+"""
+Persistencia en disco del último snapshot bueno de las hojas.
+
+El snapshot se guarda como un CSV por hoja (``Planta.csv``,
+``Manipuladoras.csv``) más un ``snapshot.json`` con la fecha de descarga.
+Es el mismo formato que lee el backend ``archivo``, así que un snapshot
+exportado también sirve como fuente local de datos.
+
+Cada archivo se escribe en un temporal y se reemplaza con ``os.replace``,
+de modo que otro worker nunca lee un snapshot a medio escribir. El
+``snapshot.json`` se escribe al final y marca el snapshot como completo.
+
+Varios workers escriben en el mismo directorio (refrescos completos y
+parches del webhook). Toda escritura se hace con ``bloqueo(directorio)``
+tomado, y cada parche queda además en ``parches.jsonl``: un refresco que
+empezó a descargar antes de un parche lo vuelve a aplicar antes de guardar
+(ver ``parches_desde``), así no lo pisa con datos anteriores a la edición.
+"""
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows (solo desarrollo): el bloqueo queda limitado al proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_META = 'snapshot.json'
+ARCHIVO_PARCHES = 'parches.jsonl'
+ARCHIVO_BLOQUEO = '.bloqueo'
+
+_bloqueo_local = threading.Lock()
+
+
+@contextmanager
+def bloqueo(directorio):
+    """
+    Bloqueo exclusivo del snapshot en disco, entre hilos y procesos (flock).
+
+    Lo toman el refresco completo al guardar y el webhook al parchar; las
+    lecturas no lo necesitan (los archivos se reemplazan de forma atómica).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    with _bloqueo_local, open(os.path.join(directorio, ARCHIVO_BLOQUEO), 'a') as archivo:
+        if fcntl is not None:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def _escribir_atomico(ruta, escribir):
+    """Escribe un archivo mediante un temporal en el mismo directorio."""
+    directorio = os.path.dirname(ruta)
+    fd, ruta_tmp = tempfile.mkstemp(dir=directorio, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            escribir(f)
+        os.replace(ruta_tmp, ruta)
+    except Exception:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+        raise
+
+
+def _escribir_meta(directorio, meta):
+    _escribir_atomico(os.path.join(directorio, ARCHIVO_META), lambda f: json.dump(meta, f))
+
+
+def guardar_snapshot(directorio, hojas, fecha, parchado=None):
+    """
+    Guarda en disco las filas de cada hoja. Se llama con ``bloqueo`` tomado.
+
+    Args:
+        directorio (str): Directorio destino (se crea si no existe)
+        hojas (dict): {nombre_hoja: lista de filas, con encabezados}
+        fecha (float): Momento en que empezó la descarga (timestamp)
+        parchado (float): Último parche ya aplicado a las filas (ver
+            parches_desde), o None
+    """
+    os.makedirs(directorio, exist_ok=True)
+
+    for sheet_name, filas in hojas.items():
+        _escribir_atomico(
+            os.path.join(directorio, f"{sheet_name}.csv"),
+            lambda f, filas=filas: csv.writer(f).writerows(filas),
+        )
+
+    _escribir_meta(directorio, {'fecha': fecha, 'hojas': list(hojas.keys()), 'parchado': parchado})
+    podar_parches(directorio, fecha)
+
+
+class EscrituraSnapshot:
+    """
+    Escritura de un snapshot hoja por hoja, mientras se descargan las filas.
+
+    Cada hoja se escribe en un temporal (``abrir_hoja``) y ``confirmar``
+    reemplaza los CSV y escribe el ``snapshot.json`` al final, igual que
+    guardar_snapshot. Si la descarga falla, ``descartar`` borra los
+    temporales y el snapshot anterior queda intacto.
+    """
+
+    def __init__(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self._hojas = {}
+
+    def abrir_hoja(self, sheet_name):
+        """
+        Returns:
+            csv.writer: Escritor del CSV temporal de la hoja
+        """
+        fd, ruta_tmp = tempfile.mkstemp(dir=self.directorio, prefix='.tmp_')
+        archivo = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+        self._hojas[sheet_name] = (archivo, ruta_tmp)
+        return csv.writer(archivo)
+
+    def aplicar_parches(self, parches):
+        """
+        Aplica a las hojas escritas los parches recibidos durante la descarga
+        (ver parches_desde). Se llama con ``bloqueo`` tomado.
+        """
+        for parche in parches:
+            if parche['hoja'] not in self._hojas:
+                continue
+            archivo, ruta_tmp = self._hojas[parche['hoja']]
+            archivo.close()
+            _reemplazar_en_csv(ruta_tmp, parche['fila_inicio'], parche['filas'])
+
+    def confirmar(self, fecha, parchado=None):
+        """
+        Publica las hojas escritas y el ``snapshot.json``. Se llama con
+        ``bloqueo`` tomado (argumentos como en guardar_snapshot).
+        """
+        for sheet_name, (archivo, ruta_tmp) in self._hojas.items():
+            archivo.close()
+            os.replace(ruta_tmp, os.path.join(self.directorio, f"{sheet_name}.csv"))
+
+        hojas = list(self._hojas.keys())
+        self._hojas = {}
+        _escribir_meta(self.directorio, {'fecha': fecha, 'hojas': hojas, 'parchado': parchado})
+        podar_parches(self.directorio, fecha)
+
+    def descartar(self):
+        """Borra los temporales sin tocar el snapshot guardado."""
+        for archivo, ruta_tmp in self._hojas.values():
+            archivo.close()
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+        self._hojas = {}
+
+
+def version(datos):
+    """
+    Versión de un snapshot (en memoria o su ``snapshot.json``), para saber
+    cuál de dos es más nuevo.
+
+    Manda ``fecha`` (inicio de la última descarga completa) y, con la misma
+    descarga, ``parchado`` (último parche del webhook).
+
+    Returns:
+        tuple: (fecha, parchado)
+    """
+    return datos['fecha'], datos.get('parchado') or 0
+
+
+def version_guardada(directorio):
+    """
+    Versión (ver ``version``) del snapshot guardado en disco, sin leer las hojas.
+
+    Returns:
+        tuple: (fecha, parchado), o None si no hay un ``snapshot.json`` válido
+    """
+    meta = leer_meta(directorio)
+    return version(meta) if meta else None
+
+
+def _reemplazar_en_csv(ruta_csv, fila_inicio, filas):
+    """
+    Reemplaza en un CSV las filas desde ``fila_inicio`` (numeración de la
+    hoja), copiándolo fila a fila a un temporal, sin cargarlo en memoria.
+    Las filas vacías del final se descartan, como hace Google al devolver
+    una hoja.
+    """
+    fila_fin = fila_inicio + len(filas) - 1
+
+    def escribir(destino):
+        escritor = csv.writer(destino)
+        # Filas vacías retenidas hasta saber si las sigue una con datos
+        vacias = []
+
+        def agregar(fila):
+            if not any(celda.strip() for celda in fila):
+                vacias.append(fila)
+                return
+            escritor.writerows(vacias)
+            vacias.clear()
+            escritor.writerow(fila)
+
+        numero = 0
+        with open(ruta_csv, 'r', encoding='utf-8', newline='') as origen:
+            for numero, fila in enumerate(csv.reader(origen), start=1):
+                agregar(filas[numero - fila_inicio] if fila_inicio <= numero <= fila_fin else fila)
+        # Rango que pasa del final de la hoja
+        for numero in range(max(numero + 1, fila_inicio), fila_fin + 1):
+            agregar(filas[numero - fila_inicio])
+
+    _escribir_atomico(ruta_csv, escribir)
+
+
+def parchar_hoja(directorio, sheet_name, fila_inicio, filas, parchado):
+    """
+    Reemplaza un rango de filas de una hoja del snapshot guardado. Se llama
+    con ``bloqueo`` tomado.
+
+    El parche se anota en ``parches.jsonl`` y en el ``snapshot.json``
+    (``parchado``); ``fecha`` sigue siendo la de la última descarga completa.
+
+    Args:
+        directorio (str): Directorio del snapshot
+        sheet_name (str): Nombre de la hoja
+        fila_inicio (int): Primera fila reemplazada (numeración de la hoja)
+        filas (list): Filas nuevas, desde fila_inicio
+        parchado (float): Momento en que se leyeron las filas (timestamp)
+
+    Returns:
+        bool: False si no hay un snapshot completo con esa hoja
+    """
+    ruta_csv = os.path.join(directorio, f"{sheet_name}.csv")
+    meta = leer_meta(directorio)
+    if meta is None or sheet_name not in meta['hojas'] or not os.path.exists(ruta_csv):
+        return False
+
+    # Primero el registro: un refresco en curso en otro worker lo reaplica
+    parche = {'parchado': parchado, 'hoja': sheet_name, 'fila_inicio': fila_inicio, 'filas': filas}
+    with open(os.path.join(directorio, ARCHIVO_PARCHES), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(parche) + '\n')
+
+    _reemplazar_en_csv(ruta_csv, fila_inicio, filas)
+    meta['parchado'] = max(parchado, meta.get('parchado') or 0)
+    _escribir_meta(directorio, meta)
+    return True
+
+
+def parches_desde(directorio, desde):
+    """
+    Parches del webhook cuyas filas se leyeron después de ``desde``.
+
+    Un refresco que empezó a descargar en ``desde`` puede no incluirlos;
+    aplicarlos de nuevo es seguro, porque cada edición posterior trae su
+    propio parche, más nuevo.
+
+    Returns:
+        list: [{'parchado', 'hoja', 'fila_inicio', 'filas'}] en orden
+    """
+    parches = []
+    try:
+        with open(os.path.join(directorio, ARCHIVO_PARCHES), 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    parche = json.loads(linea)
+                except ValueError:
+                    # Línea cortada por un proceso que murió al escribirla
+                    continue
+                if parche['parchado'] > desde:
+                    parches.append(parche)
+    except OSError:
+        return []
+    return sorted(parches, key=lambda parche: parche['parchado'])
+
+
+def podar_parches(directorio, fecha):
+    """
+    Quita de ``parches.jsonl`` los parches anteriores a una descarga completa
+    ya guardada con esa ``fecha``: los refrescos que empezaron antes ya no
+    pueden guardar (ver google_sheets), así que nadie los va a reaplicar.
+    """
+    vigentes = parches_desde(directorio, fecha)
+    _escribir_atomico(
+        os.path.join(directorio, ARCHIVO_PARCHES),
+        lambda f: f.writelines(json.dumps(parche) + '\n' for parche in vigentes),
+    )
+
+
+def leer_meta(directorio):
+    """
+    Lee el ``snapshot.json`` del directorio.
+
+    Returns:
+        dict: {'fecha', 'hojas', 'parchado'} o None si no hay un snapshot
+            completo
+    """
+    try:
+        with open(os.path.join(directorio, ARCHIVO_META), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if 'fecha' not in meta or 'hojas' not in meta:
+        return None
+    return meta
+
+
+def iterar_hoja(directorio, sheet_name):
+    """
+    Entrega las filas guardadas de una hoja una a una, sin cargar el CSV.
+
+    Yields:
+        list: Filas (listas de str); la primera es de encabezados
+    """
+    with open(os.path.join(directorio, f"{sheet_name}.csv"), 'r', encoding='utf-8', newline='') as f:
+        yield from csv.reader(f)
+
+
+def cargar_snapshot(directorio):
+    """
+    Carga el snapshot guardado en disco.
+
+    Args:
+        directorio (str): Directorio del snapshot
+
+    Returns:
+        tuple: (hojas, meta) o None si no hay un snapshot completo
+    """
+    meta = leer_meta(directorio)
+    if meta is None:
+        return None
+
+    inicio = time.perf_counter()
+    try:
+        hojas = {sheet_name: list(iterar_hoja(directorio, sheet_name)) for sheet_name in meta['hojas']}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Snapshot en disco inválido, se ignora: {str(e)}")
+        return None
+
+    logger.info(
+        f"Snapshot cargado desde disco en {(time.perf_counter() - inicio) * 1000:.1f} ms "
+        f"({sum(len(filas) for filas in hojas.values())} filas)"
+    )
+    return hojas, meta
@@ -0,0 +1,191 @@
+"""
+Sugerencias de búsqueda mientras se escribe.
+
+El índice se construye una vez por snapshot (ver google_sheets) a partir de
+los registros ya normalizados: una lista ordenada de claves (la cédula y cada
+palabra de apellidos y nombres, en mayúsculas y sin tildes) que se recorre
+por prefijo con ``bisect``. Ninguna consulta toca las hojas y cada una revisa
+como mucho MAX_CANDIDATOS entradas, así el costo por tecla está acotado sin
+importar el tamaño de las hojas.
+"""
+import bisect
+import threading
+import unicodedata
+
+# Caracteres mínimos para sugerir y máximos que se tienen en cuenta
+MIN_CARACTERES = 2
+MAX_CARACTERES = 60
+# Entradas del índice revisadas como máximo por consulta
+MAX_CANDIDATOS = 2000
+
+# Costo de las consultas en este worker (se muestra en la vista de estado)
+_estadisticas = {'consultas': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+_estadisticas_lock = threading.Lock()
+
+
+def normalizar_texto(texto):
+    """Mayúsculas y sin tildes, para que 'peña' encuentre 'PEÑA' y 'PENA'."""
+    descompuesto = unicodedata.normalize('NFKD', texto.upper())
+    return ''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+
+def _describir(registro):
+    """Nombre completo de un registro y sus palabras normalizadas."""
+    nombre = ' '.join(filter(None, (
+        registro['PRIMER_APELLIDO'], registro['SEGUNDO_APELLIDO'], registro['NOMBRES'],
+    )))
+    return nombre, tuple(normalizar_texto(nombre).split())
+
+
+def construir_indice(indice_cedulas):
+    """
+    Construye el índice de sugerencias.
+
+    Args:
+        indice_cedulas (dict): {cedula: registro normalizado} del snapshot
+
+    Returns:
+        dict: {'claves': [...], 'posiciones': [...], 'cedulas': [...],
+            'nombres': [...], 'palabras': [...]}; claves y posiciones son
+            listas paralelas ordenadas por clave
+    """
+    entradas = []
+    cedulas = []
+    nombres = []
+    palabras = []
+    for posicion, (cedula, registro) in enumerate(indice_cedulas.items()):
+        nombre, palabras_registro = _describir(registro)
+
+        cedulas.append(cedula)
+        nombres.append(nombre)
+        palabras.append(palabras_registro)
+        entradas.append((cedula, posicion))
+        entradas.extend((palabra, posicion) for palabra in set(palabras_registro))
+
+    entradas.sort()
+    return {
+        'claves': [clave for clave, _ in entradas],
+        'posiciones': [posicion for _, posicion in entradas],
+        'cedulas': cedulas,
+        'nombres': nombres,
+        'palabras': palabras,
+    }
+
+
+def actualizar_indice(indice, cambios):
+    """
+    Copia del índice de sugerencias con algunas cédulas cambiadas.
+
+    Para los parches del webhook: solo se quitan y se insertan las claves de
+    esas cédulas, sin volver a normalizar ni ordenar las demás. Una cédula
+    nueva ocupa una posición al final; la de una cédula eliminada queda sin
+    claves (y sin cédula), así ninguna consulta llega a ella.
+
+    Args:
+        indice (dict): Ver construir_indice; no se modifica
+        cambios (dict): {cedula: registro normalizado, o None si la cédula
+            ya no está en el snapshot}
+
+    Returns:
+        dict: Índice nuevo, con la misma estructura
+    """
+    indice = {campo: list(valores) for campo, valores in indice.items()}
+    claves = indice['claves']
+    posiciones = indice['posiciones']
+    cedulas = indice['cedulas']
+
+    for cedula, registro in cambios.items():
+        try:
+            posicion = cedulas.index(cedula)
+        except ValueError:
+            posicion = None
+
+        if posicion is not None:
+            for clave in {cedula, *indice['palabras'][posicion]}:
+                i = posiciones.index(
+                    posicion, bisect.bisect_left(claves, clave), bisect.bisect_right(claves, clave),
+                )
+                del claves[i]
+                del posiciones[i]
+            if registro is None:
+                cedulas[posicion] = None
+                indice['nombres'][posicion] = ''
+                indice['palabras'][posicion] = ()
+                continue
+        elif registro is None:
+            continue
+        else:
+            posicion = len(cedulas)
+            cedulas.append(cedula)
+            indice['nombres'].append('')
+            indice['palabras'].append(())
+
+        nombre, palabras_registro = _describir(registro)
+        indice['nombres'][posicion] = nombre
+        indice['palabras'][posicion] = palabras_registro
+        for clave in {cedula, *palabras_registro}:
+            # Al final de las claves iguales: el orden entre ellas no importa
+            i = bisect.bisect_right(claves, clave)
+            claves.insert(i, clave)
+            posiciones.insert(i, posicion)
+    return indice
+
+
+def buscar(indice, consulta, limite=10):
+    """
+    Registros cuya cédula o palabras empiezan por los términos de la consulta.
+
+    Se recorre el índice por el término más largo (el más selectivo) y los
+    demás términos se comprueban en cada candidato.
+
+    Args:
+        indice (dict): Ver construir_indice
+        consulta (str): Texto escrito (ej: '1023', 'garcia ma')
+        limite (int): Máximo de resultados
+
+    Returns:
+        list: [{'cedula', 'nombre'}] en orden de clave
+    """
+    terminos = normalizar_texto(consulta[:MAX_CARACTERES]).split()
+    if not terminos or len(''.join(terminos)) < MIN_CARACTERES:
+        return []
+
+    principal = max(terminos, key=len)
+    resto = list(terminos)
+    resto.remove(principal)
+
+    claves = indice['claves']
+    i = bisect.bisect_left(claves, principal)
+    fin = min(len(claves), i + MAX_CANDIDATOS)
+
+    resultados = []
+    vistas = set()
+    while i < fin and len(resultados) < limite and claves[i].startswith(principal):
+        posicion = indice['posiciones'][i]
+        i += 1
+        if posicion in vistas:
+            continue
+        vistas.add(posicion)
+
+        cedula = indice['cedulas'][posicion]
+        palabras = indice['palabras'][posicion]
+        if all(cedula.startswith(t) or any(p.startswith(t) for p in palabras) for t in resto):
+            resultados.append({'cedula': cedula, 'nombre': indice['nombres'][posicion]})
+    return resultados
+
+
+def registrar_consulta(duracion_ms):
+    with _estadisticas_lock:
+        _estadisticas['consultas'] += 1
+        _estadisticas['total_ms'] += duracion_ms
+        _estadisticas['max_ms'] = max(_estadisticas['max_ms'], duracion_ms)
+
+
+def estadisticas():
+    with _estadisticas_lock:
+        consultas = _estadisticas['consultas']
+        return {
+            'consultas': consultas,
+            'promedio_ms': round(_estadisticas['total_ms'] / consultas, 3) if consultas else 0,
+            'max_ms': round(_estadisticas['max_ms'], 3),
+        }
@@ -1,3 +1,921 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import runpy
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+
+from . import auditoria, cuota, google_sheets, lotes, sheets_backends, sugerencias
+from .circuito import ABIERTO, CERRADO, SEMIABIERTO, Circuito, CircuitoAbierto
+from .descargas import parsear_rango, respuesta_descarga
+from .models import CuotaSheets, RegistroGeneracion, TokenAPI, TrabajoLote
+from .pdf_generator import generar_nombre_archivo_pdf
+from .sheets_backends import FakeBackend, cedula_fake
+from .webhook import firmar
+
+
+class ParsearRangoTests(SimpleTestCase):
+    """Cabecera Range de un solo rango (descargas.parsear_rango)."""
+
+    def test_rango_cerrado(self):
+        self.assertEqual(parsear_rango('bytes=100-199', 1000), (100, 199))
+
+    def test_rango_abierto_hasta_el_final(self):
+        self.assertEqual(parsear_rango('bytes=900-', 1000), (900, 999))
+
+    def test_fin_mayor_que_el_total_se_recorta(self):
+        self.assertEqual(parsear_rango('bytes=900-5000', 1000), (900, 999))
+
+    def test_sufijo(self):
+        self.assertEqual(parsear_rango('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parsear_rango('bytes=-5000', 1000), (0, 999))
+
+    def test_no_satisfacible(self):
+        self.assertEqual(parsear_rango('bytes=1000-', 1000), 'invalido')
+        self.assertEqual(parsear_rango('bytes=200-100', 1000), 'invalido')
+        self.assertEqual(parsear_rango('bytes=-0', 1000), 'invalido')
+
+    def test_varios_rangos_o_malformado_se_ignora(self):
+        self.assertIsNone(parsear_rango('bytes=0-10,20-30', 1000))
+        self.assertIsNone(parsear_rango('bytes=-', 1000))
+        self.assertIsNone(parsear_rango('items=0-10', 1000))
+
+
+class RespuestaDescargaTests(SimpleTestCase):
+    """Respuestas 200/206/416 de descargas.respuesta_descarga."""
+
+    CONTENIDO = bytes(range(256)) * 4
+    ETAG = 'abc123'
+    MODIFICADO = 1700000000.0
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _descargar(self, **cabeceras):
+        request = self.factory.get('/descarga/', **cabeceras)
+        return respuesta_descarga(
+            request, 'application/pdf', 'formulario.pdf', contenido=self.CONTENIDO,
+            etag=self.ETAG, last_modified=self.MODIFICADO,
+        )
+
+    def test_sin_range_completo(self):
+        response = self._descargar()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.CONTENIDO)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_rango_parcial(self):
+        response = self._descargar(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.CONTENIDO[100:200])
+        self.assertEqual(response['Content-Range'], f"bytes 100-199/{len(self.CONTENIDO)}")
+        self.assertEqual(response['Content-Length'], '100')
+
+    def test_rango_no_satisfacible(self):
+        response = self._descargar(HTTP_RANGE=f"bytes={len(self.CONTENIDO)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(self.CONTENIDO)}")
+        self.assertFalse(response.has_header('Content-Disposition'))
+
+    def test_varios_rangos_responde_completo(self):
+        response = self._descargar(HTTP_RANGE='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.CONTENIDO)
+
+    def test_if_range_con_etag_vigente(self):
+        response = self._descargar(HTTP_RANGE='bytes=-10', HTTP_IF_RANGE=quote_etag(self.ETAG))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.CONTENIDO[-10:])
+
+    def test_if_range_con_etag_distinto_responde_completo(self):
+        response = self._descargar(HTTP_RANGE='bytes=-10', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.CONTENIDO)
+
+    def test_if_range_con_etag_debil_responde_completo(self):
+        response = self._descargar(HTTP_RANGE='bytes=-10', HTTP_IF_RANGE=f'W/"{self.ETAG}"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range_con_fecha(self):
+        response = self._descargar(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.MODIFICADO))
+        self.assertEqual(response.status_code, 206)
+        response = self._descargar(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.MODIFICADO + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rango_de_archivo_en_disco(self):
+        fd, ruta = tempfile.mkstemp()
+        self.addCleanup(os.remove, ruta)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.CONTENIDO)
+
+        request = self.factory.get('/descarga/', HTTP_RANGE='bytes=1000-')
+        response = respuesta_descarga(request, 'application/zip', 'lote.zip', ruta=ruta)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO[1000:])
+        self.assertEqual(response['Content-Range'], f"bytes 1000-1023/{len(self.CONTENIDO)}")
+
+    def test_validadores_para_reanudar(self):
+        completa = self._descargar()
+        self.assertEqual(completa['ETag'], quote_etag(self.ETAG))
+        self.assertEqual(completa['Last-Modified'], http_date(self.MODIFICADO))
+
+        # El cliente reanuda con el ETag que recibió en la primera respuesta
+        parcial = self._descargar(HTTP_RANGE='bytes=512-', HTTP_IF_RANGE=completa['ETag'])
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial.content, self.CONTENIDO[512:])
+        self.assertEqual(parcial['ETag'], completa['ETag'])
+        self.assertEqual(parcial['Last-Modified'], completa['Last-Modified'])
+
+
+class LoteDescargaTests(TestCase):
+    """Descarga reanudable del ZIP de un lote (views.lote_descargar_view)."""
+
+    CONTENIDO = b'PK\x03\x04' + bytes(range(256)) * 16
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(
+            LOTES_DIR=self.directorio, LOTES_STORAGE='django.core.files.storage.FileSystemStorage',
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        # Almacenamiento nuevo sobre el directorio de la prueba
+        parche = mock.patch.object(lotes, '_almacenamiento', None)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        usuario = User.objects.create_user('operador', password='clave')
+        with open(os.path.join(self.directorio, 'lote.zip'), 'wb') as f:
+            f.write(self.CONTENIDO)
+        self.trabajo = TrabajoLote.objects.create(
+            usuario=usuario, cedulas=['1'], estado=TrabajoLote.COMPLETADO, archivo='lote.zip',
+        )
+        self.client.force_login(usuario)
+        self.url = reverse('formatos_eps:lote_descargar', args=[self.trabajo.pk])
+
+    def test_reanudar_con_el_etag_de_la_primera_respuesta(self):
+        completa = self.client.get(self.url)
+        self.assertEqual(completa.status_code, 200)
+        self.assertEqual(b''.join(completa.streaming_content), self.CONTENIDO)
+        self.assertTrue(completa.has_header('Last-Modified'))
+
+        parcial = self.client.get(self.url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=completa['ETag'])
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(b''.join(parcial.streaming_content), self.CONTENIDO[100:])
+        self.assertEqual(parcial['ETag'], completa['ETag'])
+
+    def test_reanudar_con_last_modified(self):
+        completa = self.client.get(self.url)
+        parcial = self.client.get(self.url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE=completa['Last-Modified'])
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(b''.join(parcial.streaming_content), self.CONTENIDO[-4:])
+
+    def test_lote_sin_archivo(self):
+        os.remove(os.path.join(self.directorio, 'lote.zip'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class LotesTests(TestCase):
+    """Cola de lotes: reclamación, reanudación y parada del worker (lotes, procesar_lotes)."""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(
+            LOTES_DIR=self.directorio, LOTES_STORAGE='django.core.files.storage.FileSystemStorage',
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for objetivo, atributo, valor in (
+            (lotes, '_almacenamiento', None),
+            # Sin PDFs reales ni registros de auditoría
+            (lotes, 'obtener_pdf', lambda datos: (f"PDF {datos['CEDULA']}".encode(), 'hash')),
+            (lotes, 'registrar', mock.Mock()),
+        ):
+            parche = mock.patch.object(objetivo, atributo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.usuario = User.objects.create_user('operador')
+
+    def _trabajo(self, cedulas, **campos):
+        return TrabajoLote.objects.create(usuario=self.usuario, cedulas=cedulas, **campos)
+
+    def _ruta_pdf(self, trabajo, cedula):
+        return os.path.join(lotes.directorio_trabajo(trabajo), generar_nombre_archivo_pdf(cedula))
+
+    def _contenido_zip(self, trabajo):
+        trabajo.refresh_from_db()
+        with lotes.get_almacenamiento().open(trabajo.archivo) as f, zipfile.ZipFile(f) as archivo_zip:
+            return {nombre: archivo_zip.read(nombre) for nombre in archivo_zip.namelist()}
+
+    def test_reclamar_pierde_la_carrera_y_toma_el_siguiente(self):
+        primero = self._trabajo(['1'])
+        segundo = self._trabajo(['2'])
+        TrabajoLote.objects.filter(pk=primero.pk).update(creado=timezone.now() - timedelta(minutes=1))
+
+        actualizar = QuerySet.update
+        competidos = []
+
+        def competir(queryset, **campos):
+            # Otro worker reclama el primero entre la lectura y la escritura
+            if not competidos:
+                competidos.append(primero.pk)
+                actualizar(
+                    TrabajoLote.objects.filter(pk=primero.pk),
+                    estado=TrabajoLote.EN_PROCESO, worker='otro', latido=timezone.now(),
+                )
+            return actualizar(queryset, **campos)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=competir):
+            trabajo = lotes.reclamar_trabajo('este')
+
+        self.assertEqual(trabajo.pk, segundo.pk)
+        self.assertEqual(trabajo.worker, 'este')
+        primero.refresh_from_db()
+        self.assertEqual(primero.worker, 'otro')
+        self.assertIsNone(lotes.reclamar_trabajo('tercero'))
+
+    def test_reclamar_trabajo_abandonado(self):
+        abandonado = self._trabajo(
+            ['1'], estado=TrabajoLote.EN_PROCESO, worker='caido', latido=timezone.now() - timedelta(hours=1),
+        )
+        self._trabajo(['2'], estado=TrabajoLote.EN_PROCESO, worker='vivo', latido=timezone.now())
+
+        trabajo = lotes.reclamar_trabajo('este')
+        self.assertEqual(trabajo.pk, abandonado.pk)
+        self.assertEqual(trabajo.worker, 'este')
+        self.assertIsNone(lotes.reclamar_trabajo('otro'))
+
+    def test_reanudar_salta_los_pdf_existentes(self):
+        self._trabajo(['1', '2', '3'], no_encontradas=['3'])
+        trabajo = lotes.reclamar_trabajo('este')
+        os.makedirs(lotes.directorio_trabajo(trabajo))
+        with open(self._ruta_pdf(trabajo, '1'), 'wb') as f:
+            f.write(b'PDF anterior')
+
+        with mock.patch.object(lotes, 'find_row_by_cedula', side_effect=lambda c: {'CEDULA': c}) as buscar:
+            self.assertTrue(lotes.procesar_trabajo(trabajo, 'este'))
+
+        buscar.assert_called_once_with('2')
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoLote.COMPLETADO)
+        self.assertEqual(trabajo.procesados, 3)
+        self.assertEqual(self._contenido_zip(trabajo), {
+            generar_nombre_archivo_pdf('1'): b'PDF anterior',
+            generar_nombre_archivo_pdf('2'): b'PDF 2',
+        })
+        self.assertFalse(os.path.exists(lotes.directorio_trabajo(trabajo)))
+
+    def test_error_de_conexion_devuelve_a_pendiente(self):
+        self._trabajo(['1', '2'])
+        trabajo = lotes.reclamar_trabajo('este')
+        respuestas = [{'CEDULA': '1'}, CircuitoAbierto('caído', reintentar_en=5)]
+
+        with mock.patch.object(lotes, 'find_row_by_cedula', side_effect=respuestas):
+            self.assertFalse(lotes.procesar_trabajo(trabajo, 'este'))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoLote.PENDIENTE)
+        self.assertEqual((trabajo.worker, trabajo.latido, trabajo.procesados), ('', None, 1))
+        self.assertTrue(os.path.exists(self._ruta_pdf(trabajo, '1')))
+
+        # Otro worker lo retoma donde quedó
+        trabajo = lotes.reclamar_trabajo('otro')
+        with mock.patch.object(lotes, 'find_row_by_cedula', side_effect=lambda c: {'CEDULA': c}) as buscar:
+            self.assertTrue(lotes.procesar_trabajo(trabajo, 'otro'))
+        buscar.assert_called_once_with('2')
+        self.assertEqual(len(self._contenido_zip(trabajo)), 2)
+
+    def test_sigterm_devuelve_el_trabajo_a_la_cola(self):
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, senal, signal.getsignal(senal))
+        trabajo = self._trabajo(['1', '2', '3'])
+
+        def buscar(cedula):
+            # El deploy detiene el worker mientras genera el primer PDF
+            os.kill(os.getpid(), signal.SIGTERM)
+            return {'CEDULA': cedula}
+
+        salida = StringIO()
+        with mock.patch.object(lotes, 'find_row_by_cedula', side_effect=buscar) as buscar_mock:
+            call_command('procesar_lotes', '--intervalo', '0', stdout=salida)
+
+        # Termina el PDF en curso y no empieza el siguiente
+        buscar_mock.assert_called_once_with('1')
+        self.assertIn('Worker de lotes detenido', salida.getvalue())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoLote.PENDIENTE)
+        self.assertEqual((trabajo.worker, trabajo.procesados), ('', 1))
+        self.assertTrue(os.path.exists(self._ruta_pdf(trabajo, '1')))
+
+
+@override_settings(AUDITORIA_LOTE=3, AUDITORIA_INTERVALO_S=0.05, AUDITORIA_MAX_PENDIENTES=3)
+class AuditoriaTests(TestCase):
+    """Buffer de auditoría, su guardado en bloque y la exportación a CSV."""
+
+    def setUp(self):
+        # Buffer propio de la prueba y sin hilo de fondo: se vacía a mano
+        self.despertar = threading.Event()
+        for atributo, valor in (
+            ('_pendientes', []),
+            ('_metricas', {'guardados': 0, 'descartados': 0, 'errores': 0}),
+            ('_despertar', self.despertar),
+            ('_asegurar_hilo', mock.Mock()),
+        ):
+            parche = mock.patch.object(auditoria, atributo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.usuario = User.objects.create_user('auditor')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.usuario
+
+    def _descargar(self, cedula, status=200, rango=None):
+        respuesta = HttpResponse(status=status)
+        if rango:
+            respuesta['Content-Range'] = rango
+        auditoria.registrar_descarga(self.request, respuesta, cedula, 'hash', RegistroGeneracion.WEB)
+
+    def _cedulas_guardadas(self):
+        return list(RegistroGeneracion.objects.order_by('fecha', 'id').values_list('cedula', flat=True))
+
+    def test_registrar_descarga_solo_desde_el_inicio(self):
+        self._descargar('1')
+        self._descargar('2', status=206, rango='bytes 0-99/1000')
+        self._descargar('3', status=206, rango='bytes 100-999/1000')
+        self._descargar('4', status=304)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(auditoria.vaciar(), 2)
+        self.assertEqual(self._cedulas_guardadas(), ['1', '2'])
+        registro = RegistroGeneracion.objects.get(cedula='1')
+        self.assertEqual((registro.usuario, registro.nombre_usuario), (self.usuario, 'auditor'))
+        self.assertEqual((registro.origen, registro.hash_datos), (RegistroGeneracion.WEB, 'hash'))
+        self.assertEqual(auditoria.estadisticas()['guardados'], 2)
+
+    def test_vaciado_por_tamano(self):
+        with self.assertNumQueries(0):
+            self._descargar('1')
+            self._descargar('2')
+        self.assertFalse(self.despertar.is_set())
+
+        # AUDITORIA_LOTE registros despiertan el hilo sin esperar el intervalo
+        self._descargar('3')
+        self.assertTrue(self.despertar.is_set())
+
+    def test_vaciado_por_tiempo(self):
+        self._descargar('1')
+
+        vaciar = auditoria.vaciar
+        vueltas = []
+
+        def una_vuelta():
+            # El hilo no termina nunca: se corta en la segunda vuelta
+            if vueltas:
+                raise StopIteration
+            vueltas.append((time.monotonic() - inicio, vaciar()))
+
+        # Sin llenar el lote, el hilo guarda tras AUDITORIA_INTERVALO_S
+        inicio = time.monotonic()
+        with mock.patch.object(auditoria, 'vaciar', side_effect=una_vuelta):
+            with self.assertRaises(StopIteration):
+                auditoria._bucle()
+
+        (espera, guardados), = vueltas
+        self.assertGreaterEqual(espera, 0.05)
+        self.assertEqual(guardados, 1)
+        self.assertEqual(self._cedulas_guardadas(), ['1'])
+
+    def test_error_de_base_de_datos_reencola_hasta_el_limite(self):
+        for cedula in '12345':
+            self._descargar(cedula)
+
+        with mock.patch.object(RegistroGeneracion.objects, 'bulk_create', side_effect=DatabaseError('caída')):
+            self.assertEqual(auditoria.vaciar(), 0)
+        # Se conservan los AUDITORIA_MAX_PENDIENTES más recientes
+        self.assertEqual(auditoria.estadisticas(), {'pendientes': 3, 'guardados': 0, 'descartados': 2, 'errores': 1})
+
+        self.assertEqual(auditoria.vaciar(), 3)
+        self.assertEqual(self._cedulas_guardadas(), ['3', '4', '5'])
+        self.assertEqual(auditoria.estadisticas()['pendientes'], 0)
+
+    def test_worker_exit_guarda_el_buffer(self):
+        self._descargar('1')
+        configuracion = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+
+        worker = mock.Mock(pid=1234)
+        configuracion['worker_exit'](mock.Mock(), worker)
+
+        self.assertEqual(self._cedulas_guardadas(), ['1'])
+        worker.log.info.assert_called_once()
+
+    def test_exportar_csv_por_bloques(self):
+        for cedula in ('1', '2', '3'):
+            self._descargar(cedula)
+            auditoria.vaciar()
+
+        hoy = timezone.localdate()
+        with mock.patch.object(auditoria, 'BLOQUE_CSV', 1):
+            bloques = list(auditoria.generar_csv(auditoria.filtrar(hoy, hoy)))
+        # Un bloque por fila (más el encabezado) y el resto al final
+        self.assertEqual(len(bloques), 4)
+        filas = list(csv.reader(io.StringIO(''.join(bloques))))
+        self.assertEqual(filas[0], auditoria.COLUMNAS_CSV)
+        self.assertEqual([fila[1:] for fila in filas[1:]], [['auditor', c, 'web', 'hash'] for c in '123'])
+
+        self.assertEqual(list(auditoria.filtrar(hoy, hoy, cedula='2').values_list('cedula', flat=True)), ['2'])
+        ayer = hoy - timedelta(days=1)
+        self.assertFalse(auditoria.filtrar(ayer, ayer).exists())
+
+    def test_accion_exportar_csv_del_admin(self):
+        for cedula in ('1', '2'):
+            self._descargar(cedula)
+        auditoria.vaciar()
+        self.client.force_login(User.objects.create_superuser('admin', password='clave'))
+
+        response = self.client.post(reverse('admin:formatos_eps_registrogeneracion_changelist'), {
+            'action': 'exportar_csv',
+            '_selected_action': RegistroGeneracion.objects.values_list('pk', flat=True),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('\ufeff'))
+        filas = list(csv.reader(io.StringIO(contenido[1:])))
+        self.assertEqual([fila[2] for fila in filas[1:]], ['1', '2'])
+
+
+@override_settings(SHEETS_CUOTA_POR_MINUTO=60, SHEETS_CUOTA_ESPERA_MAX=0)
+@mock.patch.dict(cuota.ESPERAS_MAX, {'sincronizacion': 0, 'lote': 0})
+class CuotaTests(TestCase):
+    """Cubeta compartida de lecturas de Google Sheets (cuota.consumir)."""
+
+    def _tokens(self, tokens=None):
+        """Fija los tokens de la cubeta (si se dan) y devuelve los actuales."""
+        if tokens is not None:
+            CuotaSheets.objects.update_or_create(
+                nombre=cuota.NOMBRE_CUBETA,
+                defaults={'tokens': tokens, 'actualizado': time.time()},
+            )
+        return CuotaSheets.objects.get(nombre=cuota.NOMBRE_CUBETA).tokens
+
+    def test_consumir_descuenta_tokens(self):
+        self._tokens(60)
+        cuota.consumir(3)
+        self.assertAlmostEqual(self._tokens(), 57, delta=0.5)
+
+    def test_interactiva_usa_la_reserva(self):
+        # 10 de 60: por debajo de la reserva de sincronización (12) y de lotes (30)
+        self._tokens(10)
+        cuota.consumir(5)
+        self.assertAlmostEqual(self._tokens(), 5, delta=0.5)
+
+    def test_lote_respeta_su_reserva(self):
+        self._tokens(32)
+        with cuota.con_prioridad('lote'):
+            cuota.consumir(1)
+            with self.assertRaises(cuota.CuotaAgotada):
+                cuota.consumir(2)
+        # La interactiva sí puede tomar lo que el lote deja libre
+        cuota.consumir(2)
+
+    def test_sincronizacion_respeta_su_reserva(self):
+        self._tokens(14)
+        with cuota.con_prioridad('sincronizacion'):
+            cuota.consumir(2)
+            with self.assertRaises(cuota.CuotaAgotada):
+                cuota.consumir(1)
+
+    def test_interactiva_sin_tokens_falla_de_inmediato(self):
+        self._tokens(0)
+        inicio = time.monotonic()
+        with self.assertRaises(cuota.CuotaAgotada):
+            cuota.consumir(1)
+        self.assertLess(time.monotonic() - inicio, 1)
+
+    def test_vaciar_tras_un_429(self):
+        self._tokens(60)
+        respuestas_429 = cuota.estadisticas()['respuestas_429']
+
+        cuota.vaciar()
+
+        self.assertAlmostEqual(self._tokens(), 0, delta=0.5)
+        self.assertEqual(cuota.estadisticas()['respuestas_429'], respuestas_429 + 1)
+        with self.assertRaises(cuota.CuotaAgotada):
+            cuota.consumir(1)
+
+    def test_prioridad_desconocida(self):
+        with self.assertRaises(ValueError):
+            with cuota.con_prioridad('urgente'):
+                pass
+
+    @override_settings(SHEETS_CUOTA_POR_MINUTO=0)
+    def test_sin_limite(self):
+        cuota.consumir(1000)
+        self.assertFalse(CuotaSheets.objects.exists())
+
+
+class CircuitoTests(SimpleTestCase):
+    """Transiciones del interruptor de circuito de Google Sheets."""
+
+    def setUp(self):
+        self.circuito = Circuito(fallos_max=3, lento_s=5, abierto_s=30)
+
+    def _estado(self):
+        return self.circuito.estadisticas()['estado']
+
+    def _abrir(self):
+        for _ in range(3):
+            self.circuito.antes()
+            self.circuito.fallo()
+
+    def _pasado_el_periodo_abierto(self):
+        """Adelanta el reloj del circuito más allá de abierto_s."""
+        return mock.patch('formatos_eps.circuito.time.monotonic', return_value=time.monotonic() + 31)
+
+    def test_cerrado_hasta_fallos_max(self):
+        for _ in range(2):
+            self.circuito.antes()
+            self.circuito.fallo()
+        self.assertEqual(self._estado(), CERRADO)
+        # Un éxito reinicia la cuenta de fallos seguidos
+        self.circuito.antes()
+        self.circuito.exito(0.1)
+        self.assertEqual(self.circuito.estadisticas()['fallos_seguidos'], 0)
+
+    def test_se_abre_y_rechaza_sin_llamar(self):
+        self._abrir()
+        self.assertEqual(self._estado(), ABIERTO)
+        self.assertFalse(self.circuito.permite())
+        with self.assertRaises(CircuitoAbierto):
+            self.circuito.antes()
+        estadisticas = self.circuito.estadisticas()
+        self.assertEqual(estadisticas['aperturas'], 1)
+        self.assertEqual(estadisticas['rechazadas'], 1)
+
+    def test_llamada_lenta_cuenta_como_fallo(self):
+        for _ in range(3):
+            self.circuito.antes()
+            self.circuito.exito(6)
+        self.assertEqual(self._estado(), ABIERTO)
+        self.assertEqual(self.circuito.estadisticas()['lentas'], 3)
+
+    def test_semiabierto_deja_pasar_una_sola_prueba(self):
+        self._abrir()
+        with self._pasado_el_periodo_abierto():
+            self.assertTrue(self.circuito.permite())
+            self.circuito.antes()
+            self.assertEqual(self._estado(), SEMIABIERTO)
+            with self.assertRaises(CircuitoAbierto):
+                self.circuito.antes()
+
+    def test_prueba_exitosa_cierra(self):
+        self._abrir()
+        with self._pasado_el_periodo_abierto():
+            self.circuito.antes()
+            self.circuito.exito(0.1)
+        self.assertEqual(self._estado(), CERRADO)
+        self.circuito.antes()
+
+    def test_prueba_fallida_reabre(self):
+        self._abrir()
+        with self._pasado_el_periodo_abierto():
+            self.circuito.antes()
+            self.circuito.fallo()
+        self.assertEqual(self._estado(), ABIERTO)
+        self.assertEqual(self.circuito.estadisticas()['aperturas'], 2)
+        with self.assertRaises(CircuitoAbierto):
+            self.circuito.antes()
+
+    def test_cancelar_la_prueba_permite_otra(self):
+        self._abrir()
+        with self._pasado_el_periodo_abierto():
+            self.circuito.antes()
+            # La llamada no se hizo (por ejemplo, sin cuota): ni éxito ni fallo
+            self.circuito.cancelar()
+            self.assertEqual(self._estado(), ABIERTO)
+            self.circuito.antes()
+            self.assertEqual(self._estado(), SEMIABIERTO)
+        self.assertEqual(self.circuito.estadisticas()['aperturas'], 1)
+
+    def test_cancelar_con_el_circuito_cerrado_no_cambia_nada(self):
+        self.circuito.antes()
+        self.circuito.cancelar()
+        self.assertEqual(self._estado(), CERRADO)
+
+
+@override_settings(SHEETS_WEBHOOK_SECRETO='secreto', SHEETS_SNAPSHOT_DIR='', SHEETS_INGESTA='completa')
+class WebhookHojasTests(TestCase):
+    """Webhook de cambios en las hojas y parche del snapshot (aplicar_cambios)."""
+
+    def setUp(self):
+        # Snapshot y backend propios de la prueba; se restauran al terminar
+        self.backend = FakeBackend(filas=20)
+        for objetivo, atributo, valor in (
+            (sheets_backends, '_backend', self.backend),
+            (google_sheets, '_snapshot', None),
+        ):
+            parche = mock.patch.object(objetivo, atributo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.url = reverse('formatos_eps:webhook_hojas')
+
+    def _enviar(self, datos, secreto='secreto', firma=None):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        if firma is None:
+            firma = 'sha256=' + firmar(cuerpo, secreto)
+        return self.client.post(
+            self.url, cuerpo, content_type='application/json', HTTP_X_WEBHOOK_FIRMA=firma,
+        )
+
+    def _fila_editada(self, indice, **cambios):
+        """Fila ``indice`` de la hoja simulada con columnas cambiadas."""
+        fila = self.backend._generar_fila('Planta', indice)
+        for columna, valor in cambios.items():
+            fila[sheets_backends.ENCABEZADOS_FAKE.index(columna)] = valor
+        return fila
+
+    @override_settings(SHEETS_WEBHOOK_SECRETO='')
+    def test_desactivado_sin_secreto(self):
+        response = self._enviar({'hoja': 'Planta', 'fila_inicio': 2, 'ts': time.time()})
+        self.assertEqual(response.status_code, 404)
+
+    def test_firma_invalida(self):
+        datos = {'hoja': 'Planta', 'fila_inicio': 2, 'ts': time.time()}
+        self.assertEqual(self._enviar(datos, secreto='otro').status_code, 403)
+        self.assertEqual(self._enviar(datos, firma='').status_code, 403)
+
+    def test_peticion_vencida(self):
+        response = self._enviar({'hoja': 'Planta', 'fila_inicio': 2, 'ts': time.time() - 3600})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['error'], 'Petición vencida')
+
+    def test_hoja_desconocida(self):
+        response = self._enviar({'hoja': 'Otra', 'fila_inicio': 2, 'ts': time.time()})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cambio_de_encabezados_pide_refresco_completo(self):
+        with mock.patch('formatos_eps.webhook.revalidar_en_segundo_plano') as revalidar:
+            response = self._enviar({'hoja': 'Planta', 'fila_inicio': 1, 'fila_fin': 1, 'ts': time.time()})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accion'], 'refresco')
+        revalidar.assert_called_once()
+
+    def test_parche_de_filas(self):
+        google_sheets.get_snapshot()
+        cedula = cedula_fake('Planta', 1)
+        fila = self._fila_editada(1, NOMBRES='NOMBRE EDITADO')
+
+        with mock.patch.object(self.backend, 'obtener_filas', return_value=[fila]):
+            response = self._enviar({'hoja': 'Planta', 'fila_inicio': 3, 'fila_fin': 3, 'ts': time.time()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accion'], 'parche')
+        self.assertEqual(response.json()['cedulas'], [cedula])
+        self.assertEqual(google_sheets.find_row_by_cedula(cedula)['NOMBRES'], 'NOMBRE EDITADO')
+
+    def test_aplicar_cambios_actualiza_el_indice(self):
+        snapshot = google_sheets.get_snapshot()
+        anterior = cedula_fake('Planta', 0)
+        fila = self._fila_editada(0, CEDULA='99999999')
+
+        with mock.patch.object(self.backend, 'obtener_filas', return_value=[fila]):
+            cambios = google_sheets.aplicar_cambios('Planta', 2, 2)
+
+        self.assertEqual(cambios['anteriores'][0]['CEDULA'], anterior)
+        self.assertEqual(cambios['nuevos'][0]['CEDULA'], '99999999')
+        self.assertIsNone(google_sheets.find_row_by_cedula(anterior))
+        self.assertEqual(google_sheets.find_row_by_cedula('99999999')['NOMBRES'], fila[3])
+        # Las demás filas y el snapshot anterior no cambian
+        self.assertIsNotNone(google_sheets.find_row_by_cedula(cedula_fake('Planta', 1)))
+        self.assertIn(anterior, snapshot['indice'])
+
+    def test_aplicar_cambios_no_reinicia_el_ttl(self):
+        snapshot = google_sheets.get_snapshot()
+        with mock.patch.object(self.backend, 'obtener_filas', return_value=[self._fila_editada(1)]):
+            google_sheets.aplicar_cambios('Planta', 3, 3)
+
+        parchado = google_sheets.get_snapshot()
+        self.assertEqual(parchado['fecha'], snapshot['fecha'])
+        self.assertGreaterEqual(parchado['parchado'], snapshot['fecha'])
+        self.assertEqual(parchado['origen'], 'webhook')
+
+    def test_aplicar_cambios_quita_filas_vaciadas_al_final(self):
+        google_sheets.get_snapshot()
+        ultima = cedula_fake('Planta', 19)
+
+        with mock.patch.object(self.backend, 'obtener_filas', return_value=[[]]):
+            google_sheets.aplicar_cambios('Planta', 21, 21)
+
+        snapshot = google_sheets.get_snapshot()
+        self.assertEqual(len(snapshot['registros']['Planta']), 19)
+        self.assertIsNone(google_sheets.find_row_by_cedula(ultima))
+
+    def test_parche_incremental_igual_a_reconstruir(self):
+        google_sheets.get_snapshot()
+        repetida = cedula_fake('Planta', 5)
+        filas = [
+            # Toma la cédula de una fila posterior: pasa a ser la del índice
+            self._fila_editada(0, CEDULA=repetida),
+            self._fila_editada(1, NOMBRES='NOMBRE EDITADO'),
+            self._fila_editada(2, CEDULA='99999999', NOMBRES='NOMBRE NUEVO'),
+        ]
+
+        with mock.patch.object(google_sheets, 'revisar_snapshot') as revisar:
+            with mock.patch.object(self.backend, 'obtener_filas', return_value=filas):
+                google_sheets.aplicar_cambios('Planta', 2, 4)
+            self.assertEqual(google_sheets.find_row_by_cedula(repetida)['NOMBRES'], filas[0][3])
+            # Devuelve la cédula: la fila posterior vuelve a ser la del índice
+            with mock.patch.object(self.backend, 'obtener_filas', return_value=[self._fila_editada(0)]):
+                google_sheets.aplicar_cambios('Planta', 2, 2)
+        # La calidad se conserva hasta el siguiente refresco completo
+        revisar.assert_not_called()
+
+        def entradas(sugerencias):
+            return sorted(
+                (clave, sugerencias['cedulas'][posicion], sugerencias['nombres'][posicion])
+                for clave, posicion in zip(sugerencias['claves'], sugerencias['posiciones'])
+            )
+
+        parchado = google_sheets.get_snapshot()
+        esperado = google_sheets._publicar_registros(parchado['registros'], parchado['fecha'], 'google')
+        self.assertEqual(parchado['indice'], esperado['indice'])
+        self.assertEqual(parchado['sugerencias']['claves'], sorted(parchado['sugerencias']['claves']))
+        self.assertEqual(entradas(parchado['sugerencias']), entradas(esperado['sugerencias']))
+        resultados = sugerencias.buscar(parchado['sugerencias'], 'nombre nuevo')
+        self.assertEqual([resultado['cedula'] for resultado in resultados], ['99999999'])
+
+    def test_if_modified_since_ve_el_parche(self):
+        snapshot = google_sheets.get_snapshot()
+        # Descarga completa de hace un minuto: el parche es claramente posterior
+        google_sheets._snapshot = dict(snapshot, fecha=snapshot['fecha'] - 60)
+        self.client.force_login(User.objects.create_user('consulta'))
+        cedula = cedula_fake('Planta', 1)
+        urls = [reverse(f'formatos_eps:{nombre}', args=[cedula]) for nombre in ('generar_pdf', 'preview_pdf')]
+
+        modificados = {}
+        for url in urls:
+            modificados[url] = self.client.get(url)['Last-Modified']
+            respuesta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=modificados[url])
+            self.assertEqual(respuesta.status_code, 304)
+
+        with mock.patch.object(self.backend, 'obtener_filas', return_value=[self._fila_editada(1, NOMBRES='OTRO')]):
+            google_sheets.aplicar_cambios('Planta', 3, 3)
+
+        for url in urls:
+            respuesta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=modificados[url])
+            self.assertEqual(respuesta.status_code, 200, url)
+            self.assertNotEqual(respuesta['Last-Modified'], modificados[url])
+
+    def test_aplicar_cambios_rechaza_los_encabezados(self):
+        with self.assertRaises(ValueError):
+            google_sheets.aplicar_cambios('Planta', 1, 3)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    AUTH_USUARIO_CACHE_TTL=60,
+)
+class ApiTokenCacheTests(TestCase):
+    """Tokens de la API en caché (autenticacion.buscar_token) y su invalidación."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('integracion')
+        self.token, clave = TokenAPI.crear(self.usuario, 'nómina')
+        self.cabeceras = {'HTTP_AUTHORIZATION': f'Token {clave}'}
+        self.url = reverse('formatos_eps:api_empleado', args=['1000000001'])
+        # Sin hojas: un 404 es una petición autenticada, un 401 no
+        parche = mock.patch('formatos_eps.api.find_row_by_cedula', return_value=None)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _get(self):
+        return self.client.get(self.url, **self.cabeceras).status_code
+
+    def _calentar(self):
+        # La primera petición guarda ultimo_uso y la segunda vuelve a cachear el token
+        self.assertEqual(self._get(), 404)
+        self.assertEqual(self._get(), 404)
+
+    def test_peticion_con_el_token_en_cache_no_consulta_la_base_de_datos(self):
+        self._calentar()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(), 404)
+        self.token.refresh_from_db()
+        self.assertIsNotNone(self.token.ultimo_uso)
+
+    def test_revocar_el_token(self):
+        self._calentar()
+        self.token.activo = False
+        self.token.save()
+        self.assertEqual(self._get(), 401)
+
+    def test_eliminar_el_token(self):
+        self._calentar()
+        self.token.delete()
+        self.assertEqual(self._get(), 401)
+
+    def test_desactivar_el_usuario(self):
+        self._calentar()
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self._get(), 401)
+
+    def test_clave_invalida(self):
+        self._calentar()
+        self.cabeceras['HTTP_AUTHORIZATION'] = 'Token otra'
+        self.assertEqual(self._get(), 401)
+
+
+class ApiSinHojasTests(TestCase):
+    """La API responde 503 con Retry-After si no se pueden leer las hojas."""
+
+    def setUp(self):
+        usuario = User.objects.create_user('integracion')
+        _, clave = TokenAPI.crear(usuario, 'nómina')
+        self.cabeceras = {'HTTP_AUTHORIZATION': f'Token {clave}'}
+
+    def _get(self, nombre, error, **kwargs):
+        url = reverse(f'formatos_eps:{nombre}', args=['1000000001'])
+        with mock.patch('formatos_eps.api.find_row_by_cedula', side_effect=error):
+            return self.client.get(url, **self.cabeceras, **kwargs)
+
+    def test_cuota_agotada(self):
+        response = self._get('api_empleado', cuota.CuotaAgotada('sin cuota', reintentar_en=4.2))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertIn('error', response.json())
+
+    def test_circuito_abierto(self):
+        response = self._get('api_empleado', CircuitoAbierto('caído', reintentar_en=12))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '12')
+
+    def test_error_de_conexion_sin_tiempo(self):
+        response = self._get('api_empleado', ConnectionError('timeout'))
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+
+    def test_etag_del_pdf(self):
+        # El ETag se calcula antes de la vista; If-None-Match lo fuerza
+        response = self._get('api_empleado_pdf', ConnectionError('timeout'), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_lote(self):
+        with mock.patch('formatos_eps.api.get_snapshot', side_effect=cuota.CuotaAgotada('sin cuota')):
+            response = self.client.post(
+                reverse('formatos_eps:api_empleados'), {'cedulas': ['1000000001']},
+                content_type='application/json', **self.cabeceras,
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+
+
+class PreviewSinHojasTests(TestCase):
+    """La vista previa responde 503 con Retry-After si no se pueden leer las hojas."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('consulta'))
+        self.url = reverse('formatos_eps:preview_pdf', args=['1000000001'])
+
+    def _get(self, error):
+        with mock.patch('formatos_eps.views.find_row_by_cedula', side_effect=error):
+            return self.client.get(self.url)
+
+    def test_circuito_abierto(self):
+        response = self._get(CircuitoAbierto('caído', reintentar_en=12))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '12')
+
+    def test_cuota_agotada(self):
+        response = self._get(cuota.CuotaAgotada('sin cuota', reintentar_en=0.2))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_error_de_conexion_sin_tiempo(self):
+        response = self._get(ConnectionError('timeout'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
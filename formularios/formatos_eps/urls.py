@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views, webhook
 
 app_name = 'formatos_eps'
 
@@ -8,5 +8,16 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('search/', views.search_view, name='search'),
     path('search/results/', views.search_results_view, name='search_results'),
+    path('search/sugerencias/', views.sugerencias_view, name='sugerencias'),
     path('generar-pdf/<str:cedula>/', views.generar_pdf_view, name='generar_pdf'),
+    path('generar-pdf/<str:cedula>/preview/', views.preview_pdf_view, name='preview_pdf'),
+    path('lotes/', views.lotes_view, name='lotes'),
+    path('lotes/<uuid:trabajo_id>/estado/', views.lote_estado_view, name='lote_estado'),
+    path('lotes/<uuid:trabajo_id>/descargar/', views.lote_descargar_view, name='lote_descargar'),
+    path('estado/', views.estado_view, name='estado'),
+    path('calidad/', views.calidad_view, name='calidad'),
+    path('api/empleados/', api.empleados_lote_view, name='api_empleados'),
+    path('api/empleados/<str:cedula>/', api.empleado_view, name='api_empleado'),
+    path('api/empleados/<str:cedula>/pdf/', api.empleado_pdf_view, name='api_empleado_pdf'),
+    path('webhook/hojas/', webhook.cambios_hojas_view, name='webhook_hojas'),
 ]
\ No newline at end of file
@@ -1,12 +1,33 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404
-from .google_sheets import find_row_by_cedula
-from .pdf_generator import rellenar_pdf_empleado, generar_nombre_archivo_pdf
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .api import REINTENTAR_S
+from .auditoria import estadisticas as estadisticas_auditoria, registrar_descarga
+from .calidad import TIPOS_PROBLEMA, escribir_csv, filtrar_problemas
+from .circuito import get_circuito
+from .cuota import CuotaAgotada, estadisticas as estadisticas_cuota
+from . import google_sheets
+from .google_sheets import HOJAS, fecha_modificacion, find_row_by_cedula, get_snapshot, snapshot_desactualizado
+from .lotes import get_almacenamiento, parsear_cedulas, crear_trabajo
+from .models import RegistroGeneracion, TrabajoLote
+from .descargas import respuesta_descarga
+from .pdf_cache import clave_preview, get_cache_pdf, get_cache_previews, obtener_pdf, obtener_preview
+from .pdf_generator import generar_nombre_archivo_pdf, calcular_hash_datos
+from .sugerencias import buscar as buscar_sugerencias, estadisticas as estadisticas_sugerencias, registrar_consulta
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+import math
 import os
-import tempfile
+import time
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -25,33 +46,32 @@ def login_view(request):
 
     return render(request, 'formatos_eps/login.html')
 
+def _datos_al():
+    """Fecha de los datos si Google no responde (aviso "datos al ..."), o None."""
+    fecha = snapshot_desactualizado()
+    return datetime.fromtimestamp(fecha, tz=timezone.utc) if fecha else None
+
 @login_required(login_url='formatos_eps:login')
 def search_view(request):
-    return render(request, 'formatos_eps/search.html')
+    return render(request, 'formatos_eps/search.html', {'datos_al': _datos_al()})
 
 @login_required(login_url='formatos_eps:login')
 def search_results_view(request):
     cedula = request.GET.get('cedula')
     results = None
+    problemas = []
     error_message = None
 
     if cedula:
         try:
-            result_data = find_row_by_cedula(cedula)
-            if result_data:
-                # Normalizar las claves del diccionario (reemplazar espacios con guiones bajos)
-                normalized_result = {
-                    'CEDULA': result_data.get('CEDULA', ''),
-                    'PRIMER_APELLIDO': result_data.get('PRIMER APELLIDO', ''),
-                    'SEGUNDO_APELLIDO': result_data.get('SEGUNDO APELLIDO', ''),
-                    'NOMBRES': result_data.get('NOMBRES', ''),
-                    'FECHA_NACIMIENTO': result_data.get('FECHA DE NACIMIENTO', ''),
-                    'PAIS_NACIMIENTO': result_data.get('PAIS DE NACIMIENTO', ''),
-                    'CODIGO_SEXO': result_data.get('CODIGO SEXO', ''),
-                    'DEPARTAMENTO_NACIMIENTO': result_data.get('DEPARTAMENTO NACIMIENTO', ''),
-                    'CIUDAD_NACIMIENTO': result_data.get('CIUDAD DE NACIMIENTO', ''),
-                }
-                results = normalized_result
+            # El snapshot ya guarda los registros normalizados
+            results = find_row_by_cedula(cedula)
+            if results:
+                # Problemas de datos ya detectados al cargar el snapshot
+                problemas = get_snapshot()['calidad']['por_cedula'].get(results['CEDULA'], [])
+        except CuotaAgotada:
+            error_message = "Google Sheets está recibiendo demasiadas consultas. Intente de nuevo en unos segundos."
+            messages.error(request, error_message)
         except ConnectionError as e:
             error_message = "Error de conexión con Google Sheets. Por favor, verifique la configuración de credenciales."
             messages.error(request, error_message)
@@ -61,20 +81,92 @@ def search_results_view(request):
 
     return render(request, 'formatos_eps/search_results.html', {
         'results': [results] if results else [],
+        'problemas': problemas,
         'cedula': cedula,
-        'error_message': error_message
+        'error_message': error_message,
+        'datos_al': _datos_al(),
     })
 
+@login_required(login_url='formatos_eps:login')
+def sugerencias_view(request):
+    """
+    Sugerencias para la búsqueda mientras se escribe (JSON).
+
+    Se resuelven con el índice en memoria del snapshot, sin acceder a las
+    hojas. La cabecera Server-Timing informa el costo de cada consulta.
+
+    Las sugerencias son opcionales: si el worker todavía no tiene snapshot
+    (arranque en frío) o Google Sheets no está disponible, se responde una
+    lista vacía en vez de esperar la descarga de las hojas.
+    """
+    inicio = time.perf_counter()
+    disponibles = google_sheets._snapshot is not None
+    resultados = []
+    if disponibles:
+        try:
+            resultados = buscar_sugerencias(
+                get_snapshot()['sugerencias'],
+                request.GET.get('q', ''),
+                limite=getattr(settings, 'SUGERENCIAS_MAX', 10),
+            )
+        except ConnectionError:
+            disponibles = False
+    duracion = (time.perf_counter() - inicio) * 1000
+    if disponibles:
+        registrar_consulta(duracion)
+
+    response = JsonResponse({'resultados': resultados}, json_dumps_params={'ensure_ascii': False})
+    response['Server-Timing'] = f'sugerencias;dur={duracion:.2f}'
+    # La lista vacía de respaldo no se guarda en el navegador
+    if disponibles:
+        patch_cache_control(response, private=True, max_age=60)
+    else:
+        add_never_cache_headers(response)
+    return response
+
 @login_required(login_url='formatos_eps:login')
 def logout_view(request):
     logout(request)
     messages.success(request, 'Sesión cerrada correctamente')
     return redirect('formatos_eps:login')
 
+def _etag_pdf(request, cedula):
+    """
+    ETag del PDF: hash de los datos normalizados y de la versión del template.
+
+    Se calcula con el snapshot en memoria, así un If-None-Match que coincide
+    se responde con 304 sin generar el PDF.
+    """
+    try:
+        datos_empleado = find_row_by_cedula(cedula)
+    except Exception:
+        # La vista mostrará el error
+        return None
+    if not datos_empleado:
+        return None
+    return calcular_hash_datos(datos_empleado)
+
+def _last_modified_pdf(request, cedula):
+    """Última modificación del snapshot de datos con que se genera el PDF."""
+    try:
+        return datetime.fromtimestamp(fecha_modificacion(get_snapshot()), tz=timezone.utc)
+    except Exception:
+        return None
+
 @login_required(login_url='formatos_eps:login')
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@condition(etag_func=_etag_pdf, last_modified_func=_last_modified_pdf)
 def generar_pdf_view(request, cedula):
     """
     Vista para generar y descargar el PDF del formulario EPS con los datos del empleado.
+
+    La respuesta lleva ETag y Last-Modified; el navegador la guarda como
+    privada y la revalida en cada descarga (304 si los datos no cambiaron).
+    Soporta peticiones Range para reanudar descargas interrumpidas: el PDF
+    generado es idéntico byte a byte mientras no cambie el ETag.
+
+    Con ``?inline=1`` el PDF se abre en el visor del navegador en lugar de
+    descargarse.
     """
     try:
         # Buscar datos del empleado
@@ -82,40 +174,26 @@ def generar_pdf_view(request, cedula):
 
         if not datos_empleado:
             messages.error(request, f'No se encontró empleado con cédula {cedula}')
-            return redirect('formatos_eps:search_results') + f'?cedula={cedula}'
-
-        # Normalizar datos (igual que en search_results_view)
-        datos_normalizados = {
-            'CEDULA': datos_empleado.get('CEDULA', ''),
-            'PRIMER_APELLIDO': datos_empleado.get('PRIMER APELLIDO', ''),
-            'SEGUNDO_APELLIDO': datos_empleado.get('SEGUNDO APELLIDO', ''),
-            'NOMBRES': datos_empleado.get('NOMBRES', ''),
-            'FECHA_NACIMIENTO': datos_empleado.get('FECHA DE NACIMIENTO', ''),
-            'PAIS_NACIMIENTO': datos_empleado.get('PAIS DE NACIMIENTO', ''),
-            'CODIGO_SEXO': datos_empleado.get('CODIGO SEXO', ''),
-            'DEPARTAMENTO_NACIMIENTO': datos_empleado.get('DEPARTAMENTO NACIMIENTO', ''),
-            'CIUDAD_NACIMIENTO': datos_empleado.get('CIUDAD DE NACIMIENTO', ''),
-        }
+            return redirect(f"{reverse('formatos_eps:search_results')}?cedula={cedula}")
 
         # Generar nombre del archivo
         nombre_archivo = generar_nombre_archivo_pdf(cedula)
 
-        # Crear archivo temporal para el PDF
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, nombre_archivo)
-
-        # Generar PDF
-        rellenar_pdf_empleado(datos_normalizados, output_path)
+        # Obtener el PDF de la caché o generarlo en memoria
+        contenido, hash_datos = obtener_pdf(datos_empleado)
 
-        # Retornar el PDF como descarga
-        response = FileResponse(
-            open(output_path, 'rb'),
+        # Retornar el PDF como descarga (completa o por rangos)
+        respuesta = respuesta_descarga(
+            request,
             content_type='application/pdf',
-            as_attachment=True,
-            filename=nombre_archivo
+            filename=nombre_archivo,
+            contenido=contenido,
+            etag=hash_datos,
+            last_modified=fecha_modificacion(get_snapshot()),
+            as_attachment=request.GET.get('inline') != '1',
         )
-
-        return response
+        registrar_descarga(request, respuesta, cedula, hash_datos, RegistroGeneracion.WEB)
+        return respuesta
 
     except ConnectionError as e:
         messages.error(request, 'Error de conexión con Google Sheets')
@@ -126,3 +204,172 @@ def generar_pdf_view(request, cedula):
     except Exception as e:
         messages.error(request, f'Error al generar el PDF: {str(e)}')
         return redirect('formatos_eps:search')
+
+def _etag_preview(request, cedula):
+    try:
+        datos_empleado = find_row_by_cedula(cedula)
+    except Exception:
+        return None
+    if not datos_empleado:
+        return None
+    return clave_preview(datos_empleado)
+
+@login_required(login_url='formatos_eps:login')
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@condition(etag_func=_etag_preview, last_modified_func=_last_modified_pdf)
+def preview_pdf_view(request, cedula):
+    """
+    Vista previa en PNG, a baja resolución, del formulario del empleado.
+
+    Sirve para revisar que los datos caen en sus casillas sin descargar el
+    PDF; cuesta una fracción del render y de la transferencia del PDF.
+
+    Si no se pueden leer las hojas (cuota agotada, circuito abierto o error
+    de conexión) responde 503 con Retry-After, como la API.
+    """
+    try:
+        datos_empleado = find_row_by_cedula(cedula)
+        if not datos_empleado:
+            raise Http404(f'No se encontró empleado con cédula {cedula}')
+        imagen, _ = obtener_preview(datos_empleado)
+    except ConnectionError as e:
+        # Es una imagen: sin mensajes ni redirección a la búsqueda
+        response = HttpResponse(
+            'Google Sheets no está disponible; intente de nuevo más tarde',
+            status=503, content_type='text/plain; charset=utf-8',
+        )
+        reintentar_en = getattr(e, 'reintentar_en', None) or REINTENTAR_S
+        response['Retry-After'] = str(max(math.ceil(reintentar_en), 1))
+        return response
+
+    return HttpResponse(imagen, content_type='image/png')
+
+@login_required(login_url='formatos_eps:login')
+def lotes_view(request):
+    """
+    Lista los lotes del usuario y encola uno nuevo (POST con las cédulas).
+    """
+    if request.method == 'POST':
+        cedulas = parsear_cedulas(request.POST.get('cedulas', ''))
+        try:
+            trabajo = crear_trabajo(request.user, cedulas)
+            messages.success(request, f'Lote encolado con {trabajo.total} cédulas (trabajo {trabajo.pk})')
+        except ValueError as e:
+            messages.error(request, str(e))
+        return redirect('formatos_eps:lotes')
+
+    trabajos = TrabajoLote.objects.filter(usuario=request.user)[:20]
+    return render(request, 'formatos_eps/lotes.html', {'trabajos': trabajos})
+
+def _trabajo_del_usuario(request, trabajo_id):
+    """El trabajo solicitado, si pertenece al usuario (o el usuario es staff)."""
+    trabajos = TrabajoLote.objects.all() if request.user.is_staff else request.user.trabajos_lote.all()
+    return get_object_or_404(trabajos, pk=trabajo_id)
+
+@login_required(login_url='formatos_eps:login')
+def lote_estado_view(request, trabajo_id):
+    """
+    Progreso de un lote en JSON, para consultarlo periódicamente.
+    """
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    return JsonResponse({
+        'id': str(trabajo.pk),
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'procesados': trabajo.procesados,
+        'total': trabajo.total,
+        'porcentaje': trabajo.porcentaje,
+        'no_encontradas': trabajo.no_encontradas,
+        'error': trabajo.error,
+        'url_descarga': (
+            reverse('formatos_eps:lote_descargar', args=[trabajo.pk])
+            if trabajo.estado == TrabajoLote.COMPLETADO else None
+        ),
+    })
+
+@login_required(login_url='formatos_eps:login')
+def lote_descargar_view(request, trabajo_id):
+    """
+    Descarga el ZIP de un lote completado (soporta reanudar con Range).
+    """
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    almacenamiento = get_almacenamiento()
+    if (
+        trabajo.estado != TrabajoLote.COMPLETADO
+        or not trabajo.archivo
+        or not almacenamiento.exists(trabajo.archivo)
+    ):
+        raise Http404("El lote no está disponible para descarga")
+
+    try:
+        ruta = almacenamiento.path(trabajo.archivo)
+    except NotImplementedError:
+        # Almacenamiento remoto: la descarga (y el Range) la sirve él
+        return redirect(almacenamiento.url(trabajo.archivo))
+
+    return respuesta_descarga(
+        request,
+        content_type='application/zip',
+        filename=f"formularios_eps_lote_{str(trabajo.pk)[:8]}.zip",
+        ruta=ruta,
+        # El ZIP de un trabajo no cambia una vez completado
+        etag=str(trabajo.pk),
+        last_modified=trabajo.actualizado.timestamp(),
+    )
+
+@staff_member_required
+def estado_view(request):
+    """
+    Métricas internas del worker que atiende la petición (solo staff).
+    """
+    return JsonResponse({
+        'pid': os.getpid(),
+        'cache_pdf': get_cache_pdf().estadisticas(),
+        'cache_previews': get_cache_previews().estadisticas(),
+        'sugerencias': estadisticas_sugerencias(),
+        'cuota_sheets': estadisticas_cuota(),
+        'circuito_sheets': get_circuito().estadisticas(),
+        'auditoria': estadisticas_auditoria(),
+        'datos_desactualizados': snapshot_desactualizado() is not None,
+    })
+
+@staff_member_required
+def calidad_view(request):
+    """
+    Problemas de datos del snapshot actual (solo staff), con filtros y CSV.
+
+    La revisión se hace una vez al cargar cada snapshot; esta vista solo
+    filtra el índice ya construido.
+    """
+    snapshot = get_snapshot()
+    calidad = snapshot['calidad']
+    filtros = {
+        'tipo': request.GET.get('tipo', ''),
+        'hoja': request.GET.get('hoja', ''),
+        'cedula': request.GET.get('cedula', '').strip(),
+    }
+    problemas = filtrar_problemas(calidad, **filtros)
+    query_filtros = urlencode({k: v for k, v in filtros.items() if v})
+
+    if request.GET.get('formato') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="calidad_datos.csv"'
+        # BOM para que Excel reconozca las tildes
+        response.write('\ufeff')
+        escribir_csv(problemas, response)
+        return response
+
+    resumen = [
+        {'tipo': tipo, 'descripcion': TIPOS_PROBLEMA[tipo], 'cantidad': cantidad}
+        for tipo, cantidad in sorted(calidad['resumen'].items(), key=lambda item: -item[1])
+    ]
+    return render(request, 'formatos_eps/calidad.html', {
+        'resumen': resumen,
+        'filas_revisadas': calidad['filas_revisadas'],
+        'fecha_snapshot': datetime.fromtimestamp(snapshot['fecha'], tz=timezone.utc),
+        'hojas': HOJAS,
+        'filtros': filtros,
+        'pagina': Paginator(problemas, 100).get_page(request.GET.get('page')),
+        'query_filtros': query_filtros,
+        'query_csv': f"{query_filtros}&formato=csv" if query_filtros else 'formato=csv',
+    })
@@ -0,0 +1,108 @@
+"""
+Warm-up de los workers: hace por adelantado el trabajo que, de otro modo,
+pagaría la primera petición de cada worker.
+
+Se divide en dos fases:
+
+- ``calentar_compartido``: solo lectura y sin red (importaciones, PDF
+  template, fuentes y snapshot en disco). Con ``preload_app`` se ejecuta en
+  el proceso maestro de gunicorn y los workers comparten esa memoria por
+  copy-on-write.
+- ``calentar_worker``: lo que no se puede compartir entre procesos
+  (credenciales, cliente de gspread con sus conexiones y la revalidación del
+  snapshot en un hilo). Se ejecuta en cada worker después del fork.
+"""
+import importlib
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Datos de prueba para el render de calentamiento
+DATOS_CALENTAMIENTO = {
+    'CEDULA': '1234567890',
+    'PRIMER_APELLIDO': 'GARCIA',
+    'SEGUNDO_APELLIDO': 'LOPEZ',
+    'NOMBRES': 'JUAN CARLOS',
+    'FECHA_NACIMIENTO': '19900315',
+    'PAIS_NACIMIENTO': 'COLOMBIA',
+    'CODIGO_SEXO': '1',
+    'DEPARTAMENTO_NACIMIENTO': 'VALLE DEL CAUCA',
+    'CIUDAD_NACIMIENTO': 'CALI',
+}
+
+# Módulos pesados que se importan perezosamente durante las peticiones
+MODULOS_PESADOS = ['fitz', 'gspread', 'google.oauth2.service_account']
+
+_compartido_listo = False
+
+
+def _medir(tiempos, paso, funcion):
+    """Ejecuta un paso del warm-up y registra su duración en ms."""
+    inicio = time.perf_counter()
+    try:
+        funcion()
+    except Exception as e:
+        # El warm-up nunca debe impedir que el worker arranque
+        logger.warning(f"Warm-up: falló el paso '{paso}': {str(e)}")
+    tiempos[paso] = (time.perf_counter() - inicio) * 1000
+
+
+def _reportar(fase, tiempos):
+    total = sum(tiempos.values())
+    detalle = ', '.join(f"{paso}={ms:.0f}ms" for paso, ms in tiempos.items())
+    logger.info(f"Warm-up {fase} completado en {total:.0f} ms ({detalle})")
+
+
+def calentar_compartido():
+    """
+    Fase sin red ni hilos, segura antes del fork.
+
+    Returns:
+        dict: Duración de cada paso en ms (vacío si ya se había ejecutado)
+    """
+    global _compartido_listo
+    if _compartido_listo:
+        return {}
+
+    from . import google_sheets, pdf_generator
+
+    tiempos = {}
+    _medir(tiempos, 'importaciones', lambda: [importlib.import_module(m) for m in MODULOS_PESADOS])
+    _medir(tiempos, 'plantilla', pdf_generator.cargar_plantilla)
+    # Un render completo en memoria carga las fuentes y el parser de PyMuPDF
+    _medir(tiempos, 'render_prueba', lambda: pdf_generator.generar_pdf_bytes(DATOS_CALENTAMIENTO))
+    _medir(tiempos, 'snapshot_disco', google_sheets.cargar_snapshot_de_disco)
+
+    _compartido_listo = True
+    _reportar('compartido', tiempos)
+    return tiempos
+
+
+def calentar_worker():
+    """
+    Fase por worker: credenciales, cliente de Google y snapshot.
+
+    Returns:
+        dict: Duración de cada paso en ms
+    """
+    from . import google_sheets
+
+    tiempos = calentar_compartido()
+
+    if getattr(settings, 'SHEETS_BACKEND', 'gspread') == 'gspread':
+        _medir(tiempos, 'cliente_google', google_sheets.get_client)
+
+    def _snapshot():
+        if google_sheets._snapshot is None:
+            # Sin snapshot en disco: se descarga antes de recibir tráfico
+            google_sheets.get_snapshot()
+        else:
+            google_sheets.revalidar_en_segundo_plano()
+
+    _medir(tiempos, 'snapshot', _snapshot)
+
+    _reportar('worker', tiempos)
+    return tiempos
@@ -0,0 +1,143 @@
+"""
+Webhook de cambios en las hojas: actualiza el snapshot en segundos sin
+esperar a SHEETS_CACHE_TTL ni descargar las hojas completas.
+
+Lo llama un trigger instalable ``onEdit`` de Apps Script (o
+``enviar_webhook.py`` en local) con un cuerpo JSON firmado con HMAC-SHA256
+(SHEETS_WEBHOOK_SECRETO) en la cabecera ``X-Webhook-Firma: sha256=<hex>``::
+
+    {"hoja": "Planta", "fila_inicio": 120, "fila_fin": 122, "ts": 1760000000}
+
+Con ``"completo": true`` (filas insertadas o eliminadas, cambios de
+encabezados) se lanza un refresco completo en segundo plano. Ejemplo de
+Apps Script::
+
+    function alEditar(e) {
+      var cuerpo = JSON.stringify({
+        hoja: e.range.getSheet().getName(),
+        fila_inicio: e.range.getRow(),
+        fila_fin: e.range.getLastRow(),
+        ts: Math.floor(Date.now() / 1000)
+      });
+      var firma = Utilities.computeHmacSha256Signature(cuerpo, SECRETO)
+        .map(function (b) { return ('0' + (b & 0xff).toString(16)).slice(-2); })
+        .join('');
+      UrlFetchApp.fetch(URL_WEBHOOK, {
+        method: 'post', contentType: 'application/json', payload: cuerpo,
+        headers: {'X-Webhook-Firma': 'sha256=' + firma}
+      });
+    }
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .api import respuesta_json
+from .cuota import con_prioridad
+from .google_sheets import HOJAS, aplicar_cambios, revalidar_en_segundo_plano
+from .pdf_cache import clave_preview, get_cache_pdf, get_cache_previews
+from .pdf_generator import calcular_hash_datos
+
+logger = logging.getLogger(__name__)
+
+# Segundos de diferencia aceptados entre ``ts`` y el reloj del servidor
+MAX_DESFASE = 300
+
+
+def firmar(cuerpo, secreto):
+    """Firma HMAC-SHA256 (hex) del cuerpo de la petición."""
+    return hmac.new(secreto.encode('utf-8'), cuerpo, hashlib.sha256).hexdigest()
+
+
+def _firma_valida(request, secreto):
+    recibida = request.META.get('HTTP_X_WEBHOOK_FIRMA', '')
+    if recibida.startswith('sha256='):
+        recibida = recibida[len('sha256='):]
+    return hmac.compare_digest(recibida, firmar(request.body, secreto))
+
+
+def _invalidar_caches(anteriores, nuevos):
+    """
+    Quita de las cachés del PDF y de las vistas previas los registros que
+    cambiaron. Las claves dependen de los datos, así que nunca se serviría
+    un PDF viejo; esto solo libera el espacio.
+
+    Returns:
+        list: Cédulas cuyos datos cambiaron
+    """
+    cambiadas = []
+    for anterior, nuevo in zip(anteriores, nuevos):
+        if anterior == nuevo:
+            continue
+        cambiadas.append(nuevo['CEDULA'] or anterior['CEDULA'])
+        get_cache_pdf().eliminar(calcular_hash_datos(anterior))
+        get_cache_previews().eliminar(clave_preview(anterior))
+    # Filas nuevas al final de la hoja
+    cambiadas.extend(nuevo['CEDULA'] for nuevo in nuevos[len(anteriores):] if nuevo['CEDULA'])
+    return cambiadas
+
+
+@csrf_exempt
+@require_POST
+def cambios_hojas_view(request):
+    """
+    Aplica los cambios de un rango de filas de una hoja (ver el docstring
+    del módulo).
+
+    Returns:
+        JsonResponse: {'accion': 'parche', 'hoja', 'filas', 'cedulas', 'ms'}
+            o {'accion': 'refresco'} (202) si se recarga todo
+    """
+    secreto = getattr(settings, 'SHEETS_WEBHOOK_SECRETO', '')
+    if not secreto:
+        raise Http404("Webhook desactivado")
+    if not _firma_valida(request, secreto):
+        return respuesta_json({'error': 'Firma inválida'}, status=403)
+
+    try:
+        cuerpo = json.loads(request.body)
+        hoja = cuerpo['hoja']
+        ts = float(cuerpo['ts'])
+    except (ValueError, KeyError, TypeError):
+        return respuesta_json({'error': 'Se esperaba JSON con "hoja" y "ts"'}, status=400)
+    # La firma cubre "ts": una petición capturada no se puede repetir después
+    if abs(time.time() - ts) > MAX_DESFASE:
+        return respuesta_json({'error': 'Petición vencida'}, status=403)
+    if hoja not in HOJAS:
+        return respuesta_json({'error': f"Hoja desconocida: '{hoja}'"}, status=400)
+
+    try:
+        fila_inicio = int(cuerpo.get('fila_inicio', 0))
+        fila_fin = int(cuerpo.get('fila_fin', fila_inicio))
+    except (TypeError, ValueError):
+        return respuesta_json({'error': 'Rango de filas inválido'}, status=400)
+
+    max_filas = getattr(settings, 'SHEETS_WEBHOOK_MAX_FILAS', 500)
+    if cuerpo.get('completo') or fila_inicio <= 1 or fila_fin - fila_inicio + 1 > max_filas:
+        revalidar_en_segundo_plano()
+        return respuesta_json({'accion': 'refresco'}, status=202)
+    if fila_fin < fila_inicio:
+        return respuesta_json({'error': 'Rango de filas inválido'}, status=400)
+
+    inicio = time.perf_counter()
+    try:
+        with con_prioridad('sincronizacion'):
+            cambios = aplicar_cambios(hoja, fila_inicio, fila_fin)
+    except ConnectionError as e:
+        logger.error(f"Webhook: no se pudieron leer las filas {fila_inicio}-{fila_fin} de '{hoja}': {str(e)}")
+        return respuesta_json({'error': 'No se pudo leer la hoja'}, status=503)
+
+    return respuesta_json({
+        'accion': 'parche',
+        'hoja': hoja,
+        'filas': fila_fin - fila_inicio + 1,
+        'cedulas': _invalidar_caches(cambios['anteriores'], cambios['nuevos']),
+        'ms': round((time.perf_counter() - inicio) * 1000, 1),
+    })
@@ -79,11 +79,21 @@ import dj_database_url
 
 # Usar PostgreSQL si DATABASE_URL está definida (producción), sino SQLite (desarrollo)
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Conexiones persistentes: segundos que cada hilo reutiliza su conexión (0 =
+# una conexión por petición). Hay una por hilo: workers * threads de gunicorn
+# deben caber en max_connections de PostgreSQL. Con health checks una
+# conexión caída se detecta y se reabre al inicio de la petición
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
 
 if DATABASE_URL:
     # Producción: PostgreSQL desde Railway
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL)
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        )
     }
 else:
     # Desarrollo: SQLite local
@@ -95,6 +105,29 @@ else:
     }
 
 
+# Caché de sesiones y usuarios autenticados. Es de archivos y no de memoria
+# para que la compartan todos los workers de la máquina: un logout o un
+# cambio de usuario (desactivarlo, cambiar la clave) se ve enseguida en
+# todos. Con varias réplicas CACHE_DIR debe ser un volumen compartido o,
+# si no lo hay, SESSION_ENGINE=django.contrib.sessions.backends.db
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / 'cache_sesiones')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRADAS', '5000'))},
+    }
+}
+
+# Sesiones leídas de la caché; la base de datos solo se consulta si la
+# sesión no está en la caché y se escribe cuando la sesión cambia
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Usuario de la sesión y tokens de la API en caché (formatos_eps/autenticacion.py)
+# y segundos que duran allí (0 desactiva)
+AUTHENTICATION_BACKENDS = ['formatos_eps.autenticacion.BackendCacheado']
+AUTH_USUARIO_CACHE_TTL = int(os.environ.get('AUTH_USUARIO_CACHE_TTL', '60'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -144,3 +177,85 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # CSRF trusted origins for Railway
 CSRF_TRUSTED_ORIGINS_VAR = os.environ.get('CSRF_TRUSTED_ORIGINS')
 CSRF_TRUSTED_ORIGINS = CSRF_TRUSTED_ORIGINS_VAR.split(',') if CSRF_TRUSTED_ORIGINS_VAR else []
+
+# Google Sheets: backend de datos
+# 'gspread' (Google real), 'archivo' (CSV/XLSX local), 'csv_http' (CSV por HTTP)
+# o 'fake' (pruebas de carga)
+SHEETS_BACKEND = os.environ.get('SHEETS_BACKEND', 'gspread')
+# Directorio con un CSV por hoja o archivo .xlsx (backend 'archivo')
+SHEETS_ARCHIVO = os.environ.get('SHEETS_ARCHIVO', '')
+# URL de un CSV por hoja, con '{hoja}' en lugar del nombre (backend 'csv_http')
+SHEETS_CSV_URL = os.environ.get('SHEETS_CSV_URL', '')
+# Ingesta de las hojas: 'completa' (todas las filas en memoria) o 'streaming'
+# (fila a fila, memoria acotada; para hojas muy grandes)
+SHEETS_INGESTA = os.environ.get('SHEETS_INGESTA', 'completa')
+# Parámetros del backend 'fake'
+SHEETS_FAKE_FILAS = int(os.environ.get('SHEETS_FAKE_FILAS', '1000'))
+SHEETS_FAKE_LATENCIA_MS = float(os.environ.get('SHEETS_FAKE_LATENCIA_MS', '0'))
+SHEETS_FAKE_TASA_ERROR = float(os.environ.get('SHEETS_FAKE_TASA_ERROR', '0'))
+# Lecturas por minuto a Google Sheets compartidas por todos los procesos (0
+# desactiva el límite) y espera máxima de una búsqueda antes de fallar
+SHEETS_CUOTA_POR_MINUTO = int(os.environ.get('SHEETS_CUOTA_POR_MINUTO', '60'))
+SHEETS_CUOTA_ESPERA_MAX = float(os.environ.get('SHEETS_CUOTA_ESPERA_MAX', '10'))
+# Timeout (s) de cada llamada a Google Sheets, y circuito: se abre tras
+# SHEETS_CIRCUITO_FALLOS fallos seguidos (una llamada de más de
+# SHEETS_CIRCUITO_LENTO_S cuenta como fallo) durante SHEETS_CIRCUITO_ABIERTO_S
+SHEETS_TIMEOUT = float(os.environ.get('SHEETS_TIMEOUT', '15'))
+SHEETS_CIRCUITO_FALLOS = int(os.environ.get('SHEETS_CIRCUITO_FALLOS', '3'))
+SHEETS_CIRCUITO_LENTO_S = float(os.environ.get('SHEETS_CIRCUITO_LENTO_S', '5'))
+SHEETS_CIRCUITO_ABIERTO_S = float(os.environ.get('SHEETS_CIRCUITO_ABIERTO_S', '30'))
+# Segundos que se sirve el snapshot de hojas antes de revalidarlo en segundo plano
+SHEETS_CACHE_TTL = int(os.environ.get('SHEETS_CACHE_TTL', '300'))
+# Directorio donde se guarda el último snapshot bueno ('' para desactivar)
+SHEETS_SNAPSHOT_DIR = os.environ.get('SHEETS_SNAPSHOT_DIR', str(BASE_DIR / 'snapshot'))
+# Segundos entre revisiones del snapshot en disco para tomar los cambios
+# guardados por otros workers (webhook o refresco); 0 desactiva
+SHEETS_SNAPSHOT_VERIFICAR = float(os.environ.get('SHEETS_SNAPSHOT_VERIFICAR', '2'))
+# Secreto HMAC del webhook de cambios en las hojas ('' lo desactiva) y
+# máximo de filas que se parchan; rangos mayores recargan todo
+SHEETS_WEBHOOK_SECRETO = os.environ.get('SHEETS_WEBHOOK_SECRETO', '')
+SHEETS_WEBHOOK_MAX_FILAS = int(os.environ.get('SHEETS_WEBHOOK_MAX_FILAS', '500'))
+# Ejecutar el warm-up completo en AppConfig.ready() (servidores sin gunicorn.conf.py)
+WARMUP_EN_READY = os.environ.get('WARMUP', 'False') == 'True'
+# Esquema (encabezados) de las hojas guardado por buscar_columnas.py --guardar
+SHEETS_ESQUEMA_ARCHIVO = os.environ.get('SHEETS_ESQUEMA_ARCHIVO', str(BASE_DIR / 'snapshot' / 'esquema.json'))
+# Caché de PDFs generados: memoria por worker y disco compartido ('' desactiva el disco)
+PDF_CACHE_MEMORIA_MB = int(os.environ.get('PDF_CACHE_MEMORIA_MB', '64'))
+PDF_CACHE_DISCO_MB = int(os.environ.get('PDF_CACHE_DISCO_MB', '512'))
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', str(BASE_DIR / 'cache_pdf'))
+# Posición de los campos en el PDF (manage.py calibrar_formulario --guardar)
+PDF_LAYOUT_ARCHIVO = os.environ.get(
+    'PDF_LAYOUT_ARCHIVO', str(BASE_DIR.parent / 'formatos' / 'layout_formulario.json')
+)
+# Llenar los campos de formulario (widgets) del template si los tiene, y
+# aplanarlos para que el PDF generado no sea editable
+PDF_USAR_WIDGETS = os.environ.get('PDF_USAR_WIDGETS', 'True') == 'True'
+PDF_APLANAR_WIDGETS = os.environ.get('PDF_APLANAR_WIDGETS', 'False') == 'True'
+# Vistas previas en PNG de los formularios: resolución y caché en memoria por worker
+PDF_PREVIEW_DPI = int(os.environ.get('PDF_PREVIEW_DPI', '72'))
+PDF_PREVIEW_CACHE_MB = int(os.environ.get('PDF_PREVIEW_CACHE_MB', '16'))
+# Serialización de los PDFs generados: 'estandar' (template tal cual) o
+# 'compacta' (template recomprimido una vez por proceso: PDFs apenas un 0,4 %
+# más pequeños a cambio de ~0,5 s por worker y de invalidar las cachés)
+PDF_SALIDA = os.environ.get('PDF_SALIDA', 'estandar')
+# Sugerencias devueltas por consulta en la búsqueda mientras se escribe
+SUGERENCIAS_MAX = int(os.environ.get('SUGERENCIAS_MAX', '10'))
+# API JSON: cédulas por consulta y registros por página
+API_MAX_CEDULAS = int(os.environ.get('API_MAX_CEDULAS', '5000'))
+API_TAMANO_PAGINA = int(os.environ.get('API_TAMANO_PAGINA', '200'))
+# Lotes de PDFs (comando procesar_lotes)
+LOTES_DIR = os.environ.get('LOTES_DIR', str(BASE_DIR / 'lotes'))
+# Dónde quedan los ZIP terminados. Los escribe el proceso worker y los
+# descarga el web, así que ambos deben verlos: con FileSystemStorage (por
+# defecto, en LOTES_DIR) LOTES_DIR tiene que ser un volumen compartido; si
+# no lo hay, un almacenamiento remoto de Django, p. ej.
+# 'storages.backends.s3.S3Storage' de django-storages con sus variables AWS_*
+LOTES_STORAGE = os.environ.get('LOTES_STORAGE', 'django.core.files.storage.FileSystemStorage')
+LOTES_MAX_CEDULAS = int(os.environ.get('LOTES_MAX_CEDULAS', '2000'))
+# Segundos sin latido tras los cuales un lote en proceso se considera abandonado
+LOTES_LATIDO_SEGUNDOS = int(os.environ.get('LOTES_LATIDO_SEGUNDOS', '120'))
+# Auditoría de formularios generados: registros por guardado en bloque,
+# segundos máximos en el buffer y tope del buffer si la base de datos falla
+AUDITORIA_LOTE = int(os.environ.get('AUDITORIA_LOTE', '200'))
+AUDITORIA_INTERVALO_S = float(os.environ.get('AUDITORIA_INTERVALO_S', '5'))
+AUDITORIA_MAX_PENDIENTES = int(os.environ.get('AUDITORIA_MAX_PENDIENTES', '10000'))
@@ -0,0 +1,66 @@
+"""
+Configuración de gunicorn.
+
+Con preload_app la aplicación se carga en el proceso maestro y el warm-up
+compartido (importaciones, PDF template, snapshot en disco) queda en memoria
+compartida copy-on-write con todos los workers. Cada worker completa luego su
+propio warm-up (cliente de Google, revalidación del snapshot) antes de
+recibir tráfico.
+
+Los workers son gthread: las consultas pasan la mayor parte del tiempo
+esperando a Google Sheets o a la red, así que varios hilos por worker
+atienden muchas más peticiones concurrentes con la misma memoria. El estado
+compartido entre hilos (cliente de gspread, snapshot, cachés) está protegido
+con locks en cada módulo.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Procesos e hilos. WEB_CONCURRENCY es la variable que usan Railway/Heroku
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+# Tiempos: la descarga inicial de las hojas puede tardar varios segundos
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers periódicamente (con jitter para que no se reinicien todos a la vez)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = 100
+
+
+def _resumen(tiempos):
+    detalle = ', '.join(f"{paso}={ms:.0f}ms" for paso, ms in tiempos.items())
+    return f"{sum(tiempos.values()):.0f} ms ({detalle})"
+
+
+def when_ready(server):
+    # Se ejecuta en el maestro antes de crear los workers
+    if preload_app:
+        from formatos_eps.warmup import calentar_compartido
+        tiempos = calentar_compartido()
+        server.log.info(f"Warm-up compartido: {_resumen(tiempos)}")
+
+
+def post_worker_init(worker):
+    # Se ejecuta en cada worker con la aplicación ya cargada
+    from formatos_eps.warmup import calentar_worker
+    tiempos = calentar_worker()
+    # Con conexiones persistentes, la que abrió el warm-up (cuota de Google
+    # Sheets) quedaría abierta en el hilo principal: ninguna petición la cierra
+    from django.db import connections
+    connections.close_all()
+    worker.log.info(f"Warm-up del worker {worker.pid}: {_resumen(tiempos)}")
+
+
+def worker_exit(server, worker):
+    # Guarda los registros de auditoría que quedan en el buffer del worker
+    from formatos_eps.auditoria import vaciar
+    guardados = vaciar()
+    if guardados:
+        worker.log.info(f"Auditoría: {guardados} registros guardados al salir el worker {worker.pid}")
@@ -1 +1,169 @@
-// Future JavaScript code can go here
\ No newline at end of file
+// ========== Lotes de PDF: progreso ==========
+// Consulta periódicamente el estado de los lotes pendientes o en proceso
+// (filas con data-lote-estado-url) y actualiza la barra de progreso.
+(function () {
+    const INTERVALO_MS = 2000;
+    const TERMINADOS = ['completado', 'error'];
+
+    function actualizarFila(fila, datos) {
+        fila.dataset.loteEstado = datos.estado;
+        fila.querySelector('[data-lote-barra]').style.width = datos.porcentaje + '%';
+        fila.querySelector('[data-lote-progreso]').textContent = datos.procesados + ' / ' + datos.total;
+        fila.querySelector('[data-lote-texto]').textContent = datos.estado_display;
+
+        const accion = fila.querySelector('[data-lote-accion]');
+        if (datos.url_descarga && !accion.querySelector('a')) {
+            const enlace = document.createElement('a');
+            enlace.href = datos.url_descarga;
+            enlace.className = 'btn-secondary';
+            enlace.textContent = 'Descargar ZIP';
+            accion.appendChild(enlace);
+        }
+    }
+
+    function consultar(fila) {
+        fetch(fila.dataset.loteEstadoUrl, { headers: { 'Accept': 'application/json' } })
+            .then(function (respuesta) { return respuesta.ok ? respuesta.json() : null; })
+            .then(function (datos) {
+                if (!datos) {
+                    return;
+                }
+                actualizarFila(fila, datos);
+                if (TERMINADOS.indexOf(datos.estado) === -1) {
+                    setTimeout(function () { consultar(fila); }, INTERVALO_MS);
+                }
+            })
+            .catch(function () {
+                setTimeout(function () { consultar(fila); }, INTERVALO_MS * 2);
+            });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('[data-lote-estado-url]').forEach(function (fila) {
+            if (TERMINADOS.indexOf(fila.dataset.loteEstado) === -1) {
+                consultar(fila);
+            }
+        });
+    });
+})();
+
+// ========== Búsqueda: sugerencias mientras se escribe ==========
+// Consulta las sugerencias cuando se deja de escribir por un momento
+// (debounce) y cancela la consulta anterior si todavía no terminó
+// (AbortController), así cada pausa cuesta como mucho una petición.
+(function () {
+    const ESPERA_MS = 200;
+    const MIN_CARACTERES = 2;
+
+    function iniciar(input) {
+        const lista = document.createElement('ul');
+        lista.id = input.id + '-sugerencias';
+        lista.className = 'sugerencias';
+        lista.setAttribute('role', 'listbox');
+        lista.hidden = true;
+        input.parentNode.appendChild(lista);
+        input.setAttribute('aria-controls', lista.id);
+        input.setAttribute('aria-autocomplete', 'list');
+
+        let temporizador = null;
+        let controlador = null;
+        let seleccion = -1;
+
+        function cerrar() {
+            lista.hidden = true;
+            lista.innerHTML = '';
+            seleccion = -1;
+        }
+
+        function irA(cedula) {
+            window.location.href = input.form.action + '?cedula=' + encodeURIComponent(cedula);
+        }
+
+        function marcar(indice) {
+            Array.prototype.forEach.call(lista.children, function (item, i) {
+                item.setAttribute('aria-selected', i === indice ? 'true' : 'false');
+            });
+            seleccion = indice;
+        }
+
+        function mostrar(resultados) {
+            lista.innerHTML = '';
+            seleccion = -1;
+            resultados.forEach(function (resultado) {
+                const item = document.createElement('li');
+                item.setAttribute('role', 'option');
+                item.dataset.cedula = resultado.cedula;
+                const cedula = document.createElement('strong');
+                cedula.textContent = resultado.cedula;
+                item.appendChild(cedula);
+                item.appendChild(document.createTextNode(' ' + resultado.nombre));
+                // mousedown: antes de que el blur del input cierre la lista
+                item.addEventListener('mousedown', function (evento) {
+                    evento.preventDefault();
+                    irA(resultado.cedula);
+                });
+                lista.appendChild(item);
+            });
+            lista.hidden = resultados.length === 0;
+        }
+
+        function consultar(texto) {
+            if (controlador) {
+                controlador.abort();
+            }
+            controlador = new AbortController();
+            fetch(input.dataset.sugerenciasUrl + '?q=' + encodeURIComponent(texto), {
+                headers: { 'Accept': 'application/json' },
+                signal: controlador.signal,
+            })
+                // Una redirección es la página de login (sesión vencida)
+                .then(function (respuesta) { return respuesta.ok && !respuesta.redirected ? respuesta.json() : null; })
+                .then(function (datos) {
+                    if (datos) {
+                        mostrar(datos.resultados);
+                    }
+                })
+                .catch(function (error) {
+                    if (error.name !== 'AbortError') {
+                        cerrar();
+                    }
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(temporizador);
+            const texto = input.value.trim();
+            if (texto.length < MIN_CARACTERES) {
+                if (controlador) {
+                    controlador.abort();
+                }
+                cerrar();
+                return;
+            }
+            temporizador = setTimeout(function () { consultar(texto); }, ESPERA_MS);
+        });
+
+        input.addEventListener('keydown', function (evento) {
+            const total = lista.children.length;
+            if (lista.hidden || !total) {
+                return;
+            }
+            if (evento.key === 'ArrowDown' || evento.key === 'ArrowUp') {
+                evento.preventDefault();
+                const paso = evento.key === 'ArrowDown' ? 1 : -1;
+                marcar((seleccion + paso + total) % total);
+            } else if (evento.key === 'Enter' && seleccion >= 0) {
+                evento.preventDefault();
+                irA(lista.children[seleccion].dataset.cedula);
+            } else if (evento.key === 'Escape') {
+                cerrar();
+            }
+        });
+
+        input.addEventListener('blur', cerrar);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('[data-sugerencias-url]').forEach(iniciar);
+    });
+})();
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de la búsqueda y la generación de PDF.
+
+Levante el servidor con el backend simulado para no consumir la cuota de
+Google Sheets, por ejemplo:
+
+    cd formularios
+    SHEETS_BACKEND=fake SHEETS_FAKE_LATENCIA_MS=300 python manage.py runserver
+
+y luego, desde la raíz del repositorio:
+
+    python load_test.py --usuario admin --clave secreto --concurrencia 20 --peticiones 500
+
+Reporta throughput, latencias (p50/p95/p99) y errores por tipo de petición.
+"""
+import argparse
+import http.cookiejar
+import random
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, 'formularios')
+from formatos_eps.sheets_backends import cedula_fake
+
+
+def crear_sesion(base_url, usuario, clave):
+    """Inicia sesión y devuelve un opener con la cookie de sesión."""
+    cookies = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies))
+
+    login_url = f"{base_url}/formatos/login/"
+    html = opener.open(login_url).read().decode('utf-8')
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', html).group(1)
+
+    datos = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': token,
+        'username': usuario,
+        'password': clave,
+    }).encode('utf-8')
+    request = urllib.request.Request(login_url, data=datos, headers={'Referer': login_url})
+    respuesta = opener.open(request)
+
+    if '/login/' in respuesta.geturl():
+        raise SystemExit("[ERROR] No se pudo iniciar sesión: usuario o contraseña incorrectos")
+
+    return opener
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def ejecutar_peticion(opener, base_url, tipo, filas):
+    hoja = random.choice(['Planta', 'Manipuladoras'])
+    cedula = cedula_fake(hoja, random.randrange(filas))
+
+    if tipo == 'busqueda':
+        url = f"{base_url}/formatos/search/results/?cedula={cedula}"
+    else:
+        url = f"{base_url}/formatos/generar-pdf/{cedula}/"
+
+    inicio = time.perf_counter()
+    try:
+        with opener.open(url, timeout=120) as respuesta:
+            respuesta.read()
+            estado = respuesta.status
+            # Las vistas redirigen con un mensaje cuando falla la generación
+            if tipo == 'pdf' and respuesta.headers.get('Content-Type') != 'application/pdf':
+                estado = 'sin_pdf'
+    except urllib.error.HTTPError as e:
+        estado = e.code
+    except Exception as e:
+        estado = type(e).__name__
+
+    return tipo, estado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de búsqueda y PDF")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--usuario', required=True)
+    parser.add_argument('--clave', required=True)
+    parser.add_argument('--concurrencia', type=int, default=10)
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--proporcion-pdf', type=float, default=0.3,
+                        help="Fracción de peticiones que generan PDF (0-1)")
+    parser.add_argument('--filas', type=int, default=1000,
+                        help="Debe coincidir con SHEETS_FAKE_FILAS del servidor")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PRUEBA DE CARGA")
+    print("=" * 60)
+    print(f"   - URL: {args.url}")
+    print(f"   - Concurrencia: {args.concurrencia}")
+    print(f"   - Peticiones: {args.peticiones} ({args.proporcion_pdf:.0%} PDF)")
+
+    # Una sesión por hilo, como usuarios distintos
+    sesiones = [crear_sesion(args.url, args.usuario, args.clave) for _ in range(args.concurrencia)]
+    tipos = ['pdf' if random.random() < args.proporcion_pdf else 'busqueda' for _ in range(args.peticiones)]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as executor:
+        resultados = list(executor.map(
+            lambda par: ejecutar_peticion(sesiones[par[0] % len(sesiones)], args.url, par[1], args.filas),
+            enumerate(tipos),
+        ))
+    duracion = time.perf_counter() - inicio
+
+    print(f"\nDuración total: {duracion:.2f} s - {len(resultados) / duracion:.1f} peticiones/s")
+
+    for tipo in ('busqueda', 'pdf'):
+        del_tipo = [r for r in resultados if r[0] == tipo]
+        if not del_tipo:
+            continue
+        latencias = [r[2] * 1000 for r in del_tipo if r[1] == 200]
+        errores = {}
+        for _, estado, _ in del_tipo:
+            if estado != 200:
+                errores[estado] = errores.get(estado, 0) + 1
+
+        print(f"\n{tipo.upper()}: {len(del_tipo)} peticiones")
+        print(f"   - p50: {percentil(latencias, 50):.0f} ms")
+        print(f"   - p95: {percentil(latencias, 95):.0f} ms")
+        print(f"   - p99: {percentil(latencias, 99):.0f} ms")
+        print(f"   - Errores: {errores if errores else 'ninguno'}")
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == '__main__':
+    main()